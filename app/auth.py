@@ -1,25 +1,32 @@
 # app/auth.py
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional, Generator
+import time
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 import os
 from dotenv import load_dotenv
 
-from . import models, schemas, database
+from . import models, schemas, database, memstore, metrics, passwords
 
 load_dotenv()
 
 SECRET_KEY = os.getenv("JWT_SECRET", "your_secret_key")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# Principal cache: bounds how long another worker may keep serving a changed/deleted user
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+# Read-only routes accept the signed claims as-is, without checking the user still exists
+AUTH_TRUST_CLAIMS_FOR_READS = os.getenv("AUTH_TRUST_CLAIMS_FOR_READS", "false").lower() in ("1", "true", "yes")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 router = APIRouter()
@@ -31,12 +38,6 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -44,40 +45,152 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    token = credentials.credentials
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated admin user, detached from any session so it can be cached and shared."""
+    id: int
+    email: Optional[str] = None
+
+# Verified tokens (token -> (payload, expires_at)) and users (id -> Principal)
+_token_cache = memstore.TTLCache(max_entries=AUTH_CACHE_MAX_ENTRIES, sweep_interval=AUTH_CACHE_TTL_SECONDS)
+_principal_cache = memstore.TTLCache(max_entries=AUTH_CACHE_MAX_ENTRIES, sweep_interval=AUTH_CACHE_TTL_SECONDS)
+
+def invalidate_principal(user_id: int) -> None:
+    _principal_cache.delete(user_id)
+
+@event.listens_for(Session, "after_flush")
+def _collect_user_changes(session, flush_context):
+    changed = {obj.id for obj in session.dirty | session.deleted if isinstance(obj, models.AdminUser)}
+    if changed:
+        session.info.setdefault("admin_users_changed", set()).update(changed)
+        for user_id in changed:
+            invalidate_principal(user_id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_user_changes(session):
+    # Again after commit, in case a concurrent request re-cached the pre-commit row
+    for user_id in session.info.pop("admin_users_changed", ()):
+        invalidate_principal(user_id)
+
+def _decode_token(token: str) -> dict:
+    cached = _token_cache.get(token)
+    if cached is not None and cached["exp"] > time.time():
+        return cached
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("id")
-        if user_id is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    user = db.query(models.AdminUser).filter(models.AdminUser.id == user_id).first()
+    if payload.get("id") is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    exp = payload.get("exp") or time.time() + AUTH_CACHE_TTL_SECONDS
+    _token_cache.set(token, payload, min(AUTH_CACHE_TTL_SECONDS, max(exp - time.time(), 0.001)))
+    return payload
+
+def _load_principal(user_id: int) -> Principal:
+    principal = _principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    db = database.SessionLocal()
+    try:
+        user = db.query(models.AdminUser.id, models.AdminUser.email).filter(models.AdminUser.id == user_id).first()
+    finally:
+        db.close()
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
+    principal = Principal(id=user.id, email=user.email)
+    _principal_cache.set(user_id, principal, AUTH_CACHE_TTL_SECONDS)
+    return principal
+
+async def _load_principal_async(user_id: int) -> Principal:
+    principal = _principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    async with database.AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.AdminUser.id, models.AdminUser.email).where(models.AdminUser.id == user_id)
+        )
+        user = result.first()
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    principal = Principal(id=user.id, email=user.email)
+    _principal_cache.set(user_id, principal, AUTH_CACHE_TTL_SECONDS)
+    return principal
+
+@metrics.timed_phase("auth")
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    payload = _decode_token(credentials.credentials)
+    return _load_principal(payload["id"])
+
+@metrics.timed_phase("auth")
+def get_current_user_readonly(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    """get_current_user for read-only routes; skips the user lookup when AUTH_TRUST_CLAIMS_FOR_READS is set."""
+    payload = _decode_token(credentials.credentials)
+    if AUTH_TRUST_CLAIMS_FOR_READS:
+        return Principal(id=payload["id"], email=payload.get("email"))
+    return _load_principal(payload["id"])
+
+# Async twins of the dependencies above: a cache hit never leaves the event loop
+@metrics.timed_phase("auth")
+async def get_current_user_async(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    payload = _decode_token(credentials.credentials)
+    return await _load_principal_async(payload["id"])
+
+@metrics.timed_phase("auth")
+async def get_current_user_readonly_async(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    payload = _decode_token(credentials.credentials)
+    if AUTH_TRUST_CLAIMS_FOR_READS:
+        return Principal(id=payload["id"], email=payload.get("email"))
+    return await _load_principal_async(payload["id"])
+
+def _saturated():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent password operations, retry shortly",
+        headers={"Retry-After": "1"},
+    )
 
 # Routes
+# Async so that while bcrypt runs in the password pool no threadpool worker is held;
+# the short DB steps go through the threadpool explicitly.
 @router.post("/signup")
-def signup(user: schemas.AdminUserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.AdminUser).filter(models.AdminUser.email == user.email).first()
+async def signup(user: schemas.AdminUserCreate, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(
+        lambda: db.query(models.AdminUser).filter(models.AdminUser.email == user.email).first()
+    )
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = get_password_hash(user.password)
-    new_user = models.AdminUser(email=user.email, hashed_password=hashed_password)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    try:
+        hashed_password = await passwords.pool.hash(user.password)
+    except passwords.PoolSaturated:
+        raise _saturated()
+
+    def create():
+        new_user = models.AdminUser(email=user.email, hashed_password=hashed_password)
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+
+    await run_in_threadpool(create)
     return {"message": "User created"}
 
 @router.post("/login")
-def login(user: schemas.AdminUserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(models.AdminUser).filter(models.AdminUser.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login(user: schemas.AdminUserLogin, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(
+        lambda: db.query(models.AdminUser).filter(models.AdminUser.email == user.email).first()
+    )
+    if not db_user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    try:
+        valid = await passwords.pool.verify(user.password, db_user.hashed_password)
+    except passwords.PoolSaturated:
+        raise _saturated()
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
-    token = create_access_token({"id": db_user.id})
+    token = create_access_token({"id": db_user.id, "email": db_user.email})
     return {"token": token}
+
+@router.get("/password-pool/stats")
+def get_password_pool_stats(current_user: Principal = Depends(get_current_user_readonly)):
+    return passwords.pool.stats()
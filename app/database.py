@@ -1,18 +1,158 @@
 # app/database.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.sql.ddl import ExecutableDDLElement
+from sqlalchemy.sql.dml import UpdateBase
 import os
+from . import metrics
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./media.db")
+# "sync" serves the media router from the threadpool with SessionLocal,
+# "async" serves it from the event loop with AsyncSessionLocal (see app/media_async.py)
+APP_IO_MODE = os.getenv("APP_IO_MODE", "sync")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+
+# Rollups, sketches and the partitioned view log rely on INSERT .. ON CONFLICT and
+# dialect-specific SQL written for these two; anything else is refused up front
+# rather than failing on the first write
+SUPPORTED_DIALECTS = ("sqlite", "postgresql")
+
+def check_dialect(url: str = DATABASE_URL) -> str:
+    dialect = make_url(url).get_backend_name()
+    if dialect not in SUPPORTED_DIALECTS:
+        raise ValueError(f"Unsupported database {dialect!r} in DATABASE_URL; use SQLite or PostgreSQL")
+    return dialect
+
+check_dialect()
 
 # For SQLite we must pass check_same_thread
 connect_args = {}
 if DATABASE_URL.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# SQLite profile for file databases: WAL lets readers run alongside the writer,
+# synchronous=NORMAL fsyncs at checkpoints instead of every commit (a power loss
+# can drop the last commits but never corrupts the file), and every write goes
+# through one serialized writer connection so writers queue in the pool instead
+# of failing with "database is locked". Disable with SQLITE_TUNING=false.
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "true").lower() in ("1", "true", "yes")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+SQLITE_WRITE_TIMEOUT = float(os.getenv("SQLITE_WRITE_TIMEOUT", 30))
+
+_tuned_sqlite = SQLITE_TUNING and DATABASE_URL.startswith("sqlite") and ":memory:" not in DATABASE_URL
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in (
+        "journal_mode=WAL",
+        "synchronous=NORMAL",
+        f"busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"mmap_size={SQLITE_MMAP_SIZE}",
+        # negative: size in KiB rather than pages
+        f"cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        "temp_store=MEMORY",
+    ):
+        cursor.execute(f"PRAGMA {pragma}")
+    cursor.close()
+
+def _routing_session_class(reader, writer):
+    """
+    Session that reads through `reader` and sends every flush, INSERT/UPDATE/DELETE and
+    DDL statement, and everything after them until the transaction ends, to `writer`.
+    """
+    class RoutingSession(Session):
+        def get_bind(self, mapper=None, clause=None, **kw):
+            if self._flushing or isinstance(clause, (UpdateBase, ExecutableDDLElement)) or self.info.get("writing"):
+                self.info["writing"] = True
+                return writer
+            return reader
+
+    @event.listens_for(RoutingSession, "after_transaction_end")
+    def _end_write(session, transaction):
+        if transaction.parent is None:
+            session.info.pop("writing", None)
+
+    return RoutingSession
+
+# Both engines get the same pool bounds; a sync pool smaller than the threadpool lets
+# requests holding threads wait on connections only a free thread could release
+_pool_args = {} if ":memory:" in DATABASE_URL else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+_writer_pool_args = {"pool_size": 1, "max_overflow": 0, "pool_timeout": SQLITE_WRITE_TIMEOUT}
+
+engine = create_engine(DATABASE_URL, connect_args=connect_args, **_pool_args)
+metrics.instrument_engine(engine, "reader")
+writer_engine = None
+if _tuned_sqlite:
+    writer_engine = create_engine(DATABASE_URL, connect_args=connect_args, **_writer_pool_args)
+    metrics.instrument_engine(writer_engine, "writer")
+    for _engine in (engine, writer_engine):
+        event.listen(_engine, "connect", _apply_sqlite_pragmas)
+    SessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=engine, class_=_routing_session_class(engine, writer_engine)
+    )
+else:
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+# Async drivers for the URLs we support; only imported when async mode is used
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def async_database_url(url: str = DATABASE_URL) -> str:
+    scheme, sep, rest = url.partition("://")
+    base = scheme.split("+", 1)[0]
+    if base not in _ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {scheme}")
+    return _ASYNC_DRIVERS[base] + sep + rest
+
+_async_engine = None
+_async_writer_engine = None
+_async_sessionmaker = None
+
+def get_async_engine():
+    global _async_engine, _async_writer_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        url = async_database_url()
+        _async_engine = create_async_engine(url, pool_pre_ping=True, **_pool_args)
+        metrics.instrument_engine(_async_engine.sync_engine, "reader")
+        if _tuned_sqlite:
+            _async_writer_engine = create_async_engine(url, **_writer_pool_args)
+            metrics.instrument_engine(_async_writer_engine.sync_engine, "writer")
+            for _engine in (_async_engine, _async_writer_engine):
+                event.listen(_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return _async_engine
+
+def AsyncSessionLocal():
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        reader = get_async_engine()
+        routing = {}
+        if _async_writer_engine is not None:
+            routing["sync_session_class"] = _routing_session_class(reader.sync_engine, _async_writer_engine.sync_engine)
+        _async_sessionmaker = async_sessionmaker(reader, autoflush=False, expire_on_commit=False, **routing)
+    return _async_sessionmaker()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_async_engine():
+    global _async_engine, _async_writer_engine, _async_sessionmaker
+    for async_engine in (_async_engine, _async_writer_engine):
+        if async_engine is not None:
+            await async_engine.dispose()
+    _async_engine = None
+    _async_writer_engine = None
+    _async_sessionmaker = None
@@ -0,0 +1,238 @@
+# app/export.py
+"""
+Bulk export of raw view rows for offline analytics, as CSV or Parquet.
+
+Rows are read table by table (media_view_logs, then the monthly partitions
+oldest first, see app/viewlog.py) in id order with `yield_per`, so the driver
+streams them (a server-side cursor on PostgreSQL) and memory holds one chunk of
+EXPORT_CHUNK_ROWS rows whatever the size of the export. Each chunk becomes a
+block of CSV lines or one Parquet row group.
+
+Every row carries its `partition` ("" for media_view_logs, else "YYYY_MM") and
+`id`; together they form the cursor an interrupted export resumes after:
+"<id>", or "<YYYY_MM>:<id>" for a partitioned row.
+
+    python -m app.export --from 2025-08-01 --to 2025-08-31 [--ids 1,2] [--format parquet] -o views.parquet
+    python -m app.export --format csv -o views.csv --resume
+
+Parquet needs pyarrow (`pip install pyarrow`).
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+from datetime import date
+from typing import Iterator, List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import database, viewlog
+from .auth import Principal, get_current_user_readonly
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 50000))
+
+COLUMNS = ("partition", "id", "media_id", "viewed_by_ip", "timestamp")
+MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+router = APIRouter()
+
+def parse_cursor(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """"<id>" or "<YYYY_MM>:<id>" -> (partition, id); raises ValueError on anything else."""
+    if value is None or value == "":
+        return None
+    partition, _, last_id = value.rpartition(":")
+    if partition and viewlog.partition_month(f"{viewlog.LEGACY_TABLE}_{partition}") is None:
+        raise ValueError(f"Unknown partition in cursor {value!r}")
+    return partition, int(last_id)
+
+def format_cursor(partition: str, last_id: int) -> str:
+    return f"{partition}:{last_id}" if partition else str(last_id)
+
+def _partition_of(table) -> str:
+    return table.name[len(viewlog.LEGACY_TABLE) + 1:]
+
+def iter_rows(
+    db: Session,
+    media_ids: Optional[List[int]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    after: Optional[Tuple[str, int]] = None,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> Iterator[List[tuple]]:
+    """
+    Chunks of (partition, id, media_id, viewed_by_ip, timestamp) for the given media
+    and inclusive day range, in cursor order, starting after `after`.
+    """
+    for table in viewlog.tables(db, start, end):
+        partition = _partition_of(table)
+        if after is not None and partition < after[0]:
+            continue
+        raw = viewlog.raw_views(db, media_ids, start, end, sources=[table])
+        query = select(raw.c.id, raw.c.media_id, raw.c.viewed_by_ip, raw.c.timestamp).order_by(raw.c.id)
+        if after is not None and partition == after[0]:
+            query = query.where(raw.c.id > after[1])
+        for chunk in db.execute(query.execution_options(yield_per=chunk_rows)).partitions():
+            yield [(partition, *row) for row in chunk]
+
+def write_csv(chunks: Iterator[List[tuple]], header: bool = True) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(COLUMNS)
+    for chunk in chunks:
+        writer.writerows((p, i, m, ip, ts.isoformat() if ts else "") for p, i, m, ip, ts in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+def write_parquet(chunks: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """One zstd-compressed row group per chunk, handed out as soon as it is written."""
+    pa = _arrow()
+    schema = pa.schema([
+        ("partition", pa.dictionary(pa.int16(), pa.string())),
+        ("id", pa.int64()),
+        ("media_id", pa.int64()),
+        ("viewed_by_ip", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+    ])
+    sink = io.BytesIO()
+    with pa.parquet.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema,
+            ))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # The footer is written on close
+    yield sink.getvalue()
+
+def stream(chunks: Iterator[List[tuple]], fmt: str, header: bool = True) -> Iterator[bytes]:
+    if fmt == "parquet":
+        return write_parquet(chunks)
+    if fmt == "csv":
+        return write_csv(chunks, header)
+    raise ValueError(f"Unknown export format {fmt!r}")
+
+def _stream_with_session(fmt, **filters) -> Iterator[bytes]:
+    # Its own session: the response body is produced after the request's dependencies are gone
+    db = database.SessionLocal()
+    try:
+        yield from stream(iter_rows(db, **filters), fmt)
+    finally:
+        db.close()
+
+# Export raw views (JWT-protected), streamed; resume with ?after=<cursor of the last row received>
+@router.get("/views/export")
+def export_views(
+    ids: Optional[List[int]] = Query(None),
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    format: Literal["csv", "parquet"] = "csv",
+    after: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user_readonly),
+):
+    try:
+        cursor = parse_cursor(after)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid cursor")
+    if format == "parquet":
+        try:
+            _arrow()
+        except RuntimeError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    body = _stream_with_session(format, media_ids=ids, start=start, end=end, after=cursor)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="media_views.{format}"'},
+    )
+
+def _resume_csv(path: str) -> Optional[Tuple[str, int]]:
+    """
+    Cut a CSV export back to its last complete line (an interrupted write can leave
+    half a row) and return the cursor of that row, or None if it has no rows.
+    """
+    with open(path, "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 64 * 1024))
+        tail = f.read()
+        f.truncate(size - len(tail) + tail.rfind(b"\n") + 1)
+    for line in reversed(tail.decode().splitlines()):
+        fields = next(csv.reader([line]))
+        if len(fields) == len(COLUMNS) and fields[1].isdigit():
+            return fields[0], int(fields[1])
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export raw view rows as CSV or Parquet")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=None, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=None, help="Last day (YYYY-MM-DD)")
+    parser.add_argument("--ids", type=lambda v: [int(i) for i in v.split(",")], default=None, help="Comma-separated media ids")
+    parser.add_argument("--format", choices=sorted(MEDIA_TYPES), default="csv")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--after", default=None, help="Cursor to resume after (\"<id>\" or \"<YYYY_MM>:<id>\")")
+    parser.add_argument("--resume", action="store_true", help="Append to an existing CSV export after its last row")
+    parser.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    after = parse_cursor(args.after)
+    append = False
+    if args.resume:
+        if args.format != "csv":
+            parser.error("--resume appends to CSV; for Parquet write a new file with --after")
+        if os.path.exists(args.output):
+            after = _resume_csv(args.output) or after
+            append = os.path.getsize(args.output) > 0
+    if args.format == "parquet":
+        try:
+            _arrow()
+        except RuntimeError as exc:
+            parser.error(str(exc))
+
+    db = database.SessionLocal()
+    exported, last = 0, after
+
+    def tracked(chunks):
+        # A chunk only counts once the writer asks for the next one, i.e. after its bytes hit the file
+        nonlocal exported, last
+        previous = None
+        for chunk in chunks:
+            if previous:
+                exported, last = exported + len(previous), previous[-1][:2]
+            previous = chunk
+            yield chunk
+        if previous:
+            exported, last = exported + len(previous), previous[-1][:2]
+
+    rows = tracked(iter_rows(db, args.ids, args.start, args.end, after, args.chunk_rows))
+    try:
+        with open(args.output, "ab" if append else "wb") as f:
+            for data in stream(rows, args.format, header=not append):
+                f.write(data)
+    finally:
+        db.close()
+        cursor = format_cursor(*last) if last else "none"
+        print(f"Exported {exported} views to {args.output}, last cursor {cursor}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+# app/hll.py
+"""
+Approximate unique-viewer counts with HyperLogLog sketches.
+
+One sketch per media (lifetime) and one per media per day. Sketches merge by
+taking the register-wise max, so the unique count over any set of days is the
+count of their merged sketches. With Redis the sketches are native HLL keys
+(PFADD/PFCOUNT, which merges on the fly); otherwise they are pure-Python
+sketches held in an in-process LRU bounded by bytes (HLL_MAX_MB).
+
+Like Redis, a sketch starts sparse (only its set registers, 3 bytes each) and
+switches to the dense 2^14-byte register array once more than 1/8 of the
+registers are set, so the typical day of a media with a few dozen viewers
+costs a few hundred bytes instead of 16 KB. Both forms give the same estimate.
+
+Day sketches cover the last HLL_DAY_RETENTION_DAYS days (the raw-log retention
+window, or a year when raw views are kept forever); their Redis keys expire
+when the day leaves that window. A count over older days is answered exactly
+from the raw and compacted views instead.
+
+Sketches that do not exist yet (fresh process, flushed Redis) are hydrated
+once on first read from the distinct (IP, day) pairs of the raw log plus the
+per-day rows retention compacted it into (`rollups.viewer_days`), hashing each
+IP once. Adding an IP twice is a no-op, so hydration racing with live
+ingestion cannot double count.
+"""
+import asyncio
+import calendar
+import hashlib
+import math
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import rollups
+
+# 2^14 registers: ~0.81% standard error, the same precision Redis uses
+PRECISION = 14
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "little")
+
+def position(value: str, p: int = PRECISION) -> Tuple[int, int]:
+    """(register index, rank) that adding `value` touches."""
+    h = _hash64(value)
+    # Force a stop bit so the rank is bounded by 64 - p + 1
+    w = (h >> p) | (1 << (64 - p))
+    return h & ((1 << p) - 1), (w & -w).bit_length()
+
+def _sigma(x: float) -> float:
+    if x == 1.0:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        prev = z
+        z += x * y
+        y += y
+        if z == prev:
+            return z
+
+def _tau(x: float) -> float:
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y, z = 1.0, 1.0 - x
+    while True:
+        x = math.sqrt(x)
+        prev = z
+        y *= 0.5
+        z -= (1.0 - x) ** 2 * y
+        if z == prev:
+            return z / 3.0
+
+# Rough size of the objects behind one sketch, counted towards HLL_MAX_MB
+_SKETCH_OVERHEAD = 200
+
+class HyperLogLog:
+    """
+    Sparse while at most m/8 registers are set: sorted register indexes and their
+    ranks. Past that, `registers` holds all m registers, one byte each.
+    """
+
+    __slots__ = ("p", "m", "registers", "_indexes", "_ranks")
+
+    def __init__(self, precision: int = PRECISION, registers: Optional[bytes] = None):
+        self.p = precision
+        self.m = 1 << precision
+        if registers is None:
+            self.registers = None
+            self._indexes = array("H")
+            self._ranks = bytearray()
+        else:
+            self.registers = bytearray(registers)
+            self._indexes = self._ranks = None
+
+    @property
+    def sparse(self) -> bool:
+        return self.registers is None
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the sketch."""
+        stored = 3 * len(self._indexes) if self.registers is None else self.m
+        return _SKETCH_OVERHEAD + stored
+
+    def add(self, value: str) -> None:
+        self.add_position(*position(value, self.p))
+
+    def add_position(self, index: int, rank: int) -> None:
+        if self.registers is not None:
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+            return
+        i = bisect_left(self._indexes, index)
+        if i < len(self._indexes) and self._indexes[i] == index:
+            if rank > self._ranks[i]:
+                self._ranks[i] = rank
+            return
+        self._indexes.insert(i, index)
+        self._ranks.insert(i, rank)
+        if len(self._indexes) > self.m >> 3:
+            self._densify()
+
+    def add_positions(self, positions: List[Tuple[int, int]]) -> None:
+        if self.registers is None and len(positions) > 16:
+            # Bulk: merge into a dict and rebuild once instead of inserting one by one
+            merged = dict(zip(self._indexes, self._ranks))
+            for index, rank in positions:
+                if rank > merged.get(index, 0):
+                    merged[index] = rank
+            if len(merged) > self.m >> 3:
+                self.registers, self._indexes, self._ranks = bytearray(self.m), None, None
+            else:
+                indexes = sorted(merged)
+                self._indexes = array("H", indexes)
+                self._ranks = bytearray(merged[i] for i in indexes)
+                return
+            positions = merged.items()
+        if self.registers is None:
+            for index, rank in positions:
+                self.add_position(index, rank)
+            return
+        registers = self.registers
+        for index, rank in positions:
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def _densify(self) -> None:
+        registers = bytearray(self.m)
+        for index, rank in zip(self._indexes, self._ranks):
+            registers[index] = rank
+        self.registers, self._indexes, self._ranks = registers, None, None
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.p != self.p:
+            raise ValueError("Cannot merge sketches of different precision")
+        if other.registers is None:
+            for index, rank in zip(other._indexes, other._ranks):
+                self.add_position(index, rank)
+            return
+        if self.registers is None:
+            self._densify()
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def copy(self) -> "HyperLogLog":
+        if self.registers is not None:
+            return HyperLogLog(self.p, self.registers)
+        clone = HyperLogLog(self.p)
+        clone._indexes = array("H", self._indexes)
+        clone._ranks = bytearray(self._ranks)
+        return clone
+
+    def count(self) -> int:
+        # Ertl's improved raw estimator (the one Redis uses); no empirical bias tables needed
+        q = 64 - self.p
+        if self.registers is not None:
+            hist = [self.registers.count(k) for k in range(q + 2)]
+        else:
+            hist = [self.m - len(self._indexes)] + [self._ranks.count(k) for k in range(1, q + 2)]
+        z = self.m * _tau(1.0 - hist[q + 1] / self.m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + hist[k])
+        z += self.m * _sigma(hist[0] / self.m)
+        alpha = 0.5 / math.log(2)
+        return int(round(alpha * self.m * self.m / z))
+
+    def to_bytes(self) -> bytes:
+        if self.registers is None:
+            dense = self.copy()
+            dense._densify()
+            return bytes(dense.registers)
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(int(math.log2(len(data))), data)
+
+def union(sketches: List[HyperLogLog]) -> HyperLogLog:
+    """A new sketch merging `sketches`; dense ones are combined in one C-level pass."""
+    dense = [s.registers for s in sketches if s.registers is not None]
+    if len(dense) > 1:
+        merged = HyperLogLog(registers=bytes(map(max, *dense)))
+    elif dense:
+        merged = HyperLogLog(registers=dense[0])
+    else:
+        merged = HyperLogLog()
+    for sketch in sketches:
+        if sketch.registers is None:
+            merged.merge(sketch)
+    return merged
+
+def sketch_key(media_id: int, day: Optional[date] = None) -> str:
+    return f"hll:media:{media_id}" if day is None else f"hll:media:{media_id}:{day.isoformat()}"
+
+HLL_MAX_MB = float(os.getenv("HLL_MAX_MB", 64))
+HLL_DAY_RETENTION_DAYS = int(os.getenv("HLL_DAY_RETENTION_DAYS", rollups.VIEW_LOG_RETENTION_DAYS or 365))
+
+def _oldest_sketched_day() -> date:
+    return datetime.utcnow().date() - timedelta(days=HLL_DAY_RETENTION_DAYS)
+
+def _day_expiry(day: date) -> int:
+    """Unix time at which the Redis sketch of `day` leaves the window."""
+    return calendar.timegm((day + timedelta(days=HLL_DAY_RETENTION_DAYS + 1)).timetuple())
+
+class _MediaSketches:
+    def __init__(self):
+        self.hydrated = False
+        # None -> lifetime sketch, date -> day sketch
+        self.by_day: Dict[Optional[date], HyperLogLog] = {}
+        self.nbytes = 0
+
+    def add(self, day: Optional[date], positions: List[Tuple[int, int]], lifetime: Optional[List[Tuple[int, int]]] = None) -> int:
+        """
+        Fold (index, rank) positions into the day sketch (none for day=None) and into the lifetime
+        sketch (`lifetime` instead, when the caller knows only those are new). Returns the growth in bytes.
+        """
+        before = self.nbytes
+        updates = [(None, positions if lifetime is None else lifetime)]
+        if day is not None:
+            updates.append((day, positions))
+        for key, added in updates:
+            sketch = self.by_day.get(key)
+            if sketch is None:
+                sketch = self.by_day[key] = HyperLogLog()
+                self.nbytes += sketch.nbytes
+            size = sketch.nbytes
+            sketch.add_positions(added)
+            self.nbytes += sketch.nbytes - size
+        return self.nbytes - before
+
+    def merge(self, other: "_MediaSketches") -> None:
+        for key, sketch in other.by_day.items():
+            target = self.by_day.get(key)
+            if target is None:
+                self.by_day[key] = target = HyperLogLog()
+                self.nbytes += target.nbytes
+            size = target.nbytes
+            target.merge(sketch)
+            self.nbytes += target.nbytes - size
+
+class _SketchStore:
+    """LRU of per-media sketches bounded by their total size; callers hold _lock."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.evictions = 0
+        self._data: "OrderedDict[int, _MediaSketches]" = OrderedDict()
+
+    def get(self, media_id: int) -> Optional[_MediaSketches]:
+        entry = self._data.get(media_id)
+        if entry is not None:
+            self._data.move_to_end(media_id)
+        return entry
+
+    def set(self, media_id: int, entry: _MediaSketches) -> None:
+        old = self._data.pop(media_id, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self._data[media_id] = entry
+        self.nbytes += entry.nbytes
+        self._evict()
+
+    def grew(self, delta: int) -> None:
+        self.nbytes += delta
+        self._evict()
+
+    def _evict(self) -> None:
+        # The most recently used media stays even if it alone is over the budget
+        while self.nbytes > self.max_bytes and len(self._data) > 1:
+            _, entry = self._data.popitem(last=False)
+            self.nbytes -= entry.nbytes
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.nbytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"media": len(self._data), "bytes": self.nbytes, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+# In-memory fallback; an evicted media is rehydrated on next read
+_sketches = _SketchStore(int(HLL_MAX_MB * 1024 * 1024))
+_lock = threading.Lock()
+
+def _local(media_id: int) -> _MediaSketches:
+    """Sketches for media_id, created if missing (caller holds _lock)."""
+    entry = _sketches.get(media_id)
+    if entry is None:
+        entry = _MediaSketches()
+        _sketches.set(media_id, entry)
+    return entry
+
+def _group(rows: List[Dict]) -> Dict[tuple, set]:
+    groups: Dict[tuple, set] = {}
+    for r in rows:
+        groups.setdefault((r["media_id"], r["timestamp"].date()), set()).add(r["viewed_by_ip"])
+    return groups
+
+def _group_days(media_id: int, pairs) -> Dict[tuple, set]:
+    groups: Dict[tuple, set] = {}
+    for ip, day in pairs:
+        groups.setdefault((media_id, day), set()).add(ip)
+    return groups
+
+def add_views(redis_client, rows: List[Dict]) -> None:
+    """Fold committed view rows into the lifetime and per-day sketches."""
+    _add_groups(redis_client, _group(rows))
+
+def _queue_pfadds(pipe, groups: Dict[tuple, set]) -> None:
+    oldest = _oldest_sketched_day()
+    for (media_id, day), ips in groups.items():
+        pipe.pfadd(sketch_key(media_id), *ips)
+        if day >= oldest:
+            pipe.pfadd(sketch_key(media_id, day), *ips)
+            pipe.expireat(sketch_key(media_id, day), _day_expiry(day))
+
+def _add_groups(redis_client, groups: Dict[tuple, set]) -> None:
+    if redis_client is not None:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_pfadds(pipe, groups)
+        pipe.execute()
+    else:
+        oldest = _oldest_sketched_day()
+        # Hash outside the lock
+        hashed = [
+            (media_id, day if day >= oldest else None, [position(ip) for ip in ips]) for (media_id, day), ips in groups.items()
+        ]
+        with _lock:
+            for media_id, day, positions in hashed:
+                _sketches.grew(_local(media_id).add(day, positions))
+
+def _hydration_query(db: Session, media_id: int):
+    """Distinct (viewed_by_ip, day) pairs over every view of a media, raw or compacted, by day."""
+    src = rollups.viewer_days(db, [media_id])
+    return select(src.c.viewed_by_ip, src.c.day).group_by(src.c.day, src.c.viewed_by_ip).order_by(src.c.day)
+
+def _hydrate(redis_client, db: Session, media_id: int) -> None:
+    result = db.execute(_hydration_query(db, media_id).execution_options(yield_per=5000))
+    if redis_client is not None:
+        for partition in result.partitions():
+            _add_groups(redis_client, _group_days(media_id, partition))
+        redis_client.set(f"{sketch_key(media_id)}:hydrated", 1)
+        return
+
+    # Build off to the side, then fold in whatever live adds arrived meanwhile and swap it in
+    fresh = _MediaSketches()
+    oldest = _oldest_sketched_day()
+    hashed: Dict[str, Tuple[int, int]] = {}  # each IP is hashed once, however many days it appears on
+    for partition in result.partitions():
+        for (_, day), ips in _group_days(media_id, partition).items():
+            positions, first_seen = [], []
+            for ip in ips:
+                pos = hashed.get(ip)
+                if pos is None:
+                    pos = hashed[ip] = position(ip)
+                    first_seen.append(pos)
+                positions.append(pos)
+            fresh.add(day if day >= oldest else None, positions, first_seen)
+    with _lock:
+        live = _sketches.get(media_id)
+        if live is not None:
+            fresh.merge(live)
+        fresh.hydrated = True
+        _sketches.set(media_id, fresh)
+
+def _is_hydrated_locally(media_id: int) -> bool:
+    with _lock:
+        entry = _sketches.get(media_id)
+        return entry is not None and entry.hydrated
+
+def _ensure_hydrated(redis_client, db: Session, media_id: int) -> None:
+    if redis_client is not None:
+        if not redis_client.exists(f"{sketch_key(media_id)}:hydrated"):
+            _hydrate(redis_client, db, media_id)
+        return
+    if not _is_hydrated_locally(media_id):
+        _hydrate(redis_client, db, media_id)
+
+def count(redis_client, db: Session, media_id: int, days: Optional[List[date]] = None) -> int:
+    """
+    Estimated unique IPs for a media, lifetime when `days` is None,
+    otherwise over the union of the given days (its active days in a range).
+    """
+    if days is not None and not days:
+        return 0
+    if days is not None and min(days) < _oldest_sketched_day():
+        # Those days have no sketches any more
+        return rollups.count_unique_ips(db, media_id, min(days), max(days))
+    _ensure_hydrated(redis_client, db, media_id)
+    if redis_client is not None:
+        keys = [sketch_key(media_id)] if days is None else [sketch_key(media_id, d) for d in days]
+        return int(redis_client.pfcount(*keys))
+    return _count_local(media_id, days)
+
+def _count_local(media_id: int, days: Optional[List[date]]) -> int:
+    with _lock:
+        entry = _sketches.get(media_id)
+        sketches = entry.by_day if entry is not None else {}
+        if days is None:
+            lifetime = sketches.get(None)
+            return lifetime.count() if lifetime else 0
+        selected = [sketches[d] for d in days if d in sketches]
+        if not selected:
+            return 0
+        merged = union(selected)
+    return merged.count()
+
+async def add_views_async(redis_client, rows: List[Dict]) -> None:
+    """add_views for a redis.asyncio client."""
+    await _add_groups_async(redis_client, _group(rows))
+
+async def _add_groups_async(redis_client, groups: Dict[tuple, set]) -> None:
+    if redis_client is None:
+        _add_groups(None, groups)
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    _queue_pfadds(pipe, groups)
+    await pipe.execute()
+
+async def count_async(redis_client, db, media_id: int, days: Optional[List[date]] = None) -> int:
+    """count for a redis.asyncio client and an AsyncSession."""
+    if days is not None and not days:
+        return 0
+    if days is not None and min(days) < _oldest_sketched_day():
+        return await db.run_sync(lambda sync_db: rollups.count_unique_ips(sync_db, media_id, min(days), max(days)))
+    if redis_client is None:
+        if not _is_hydrated_locally(media_id):
+            # Building the sketches is CPU-bound Python: keep it off the event loop, on a sync session
+            await asyncio.to_thread(_hydrate_local_with_own_session, media_id)
+        return _count_local(media_id, days)
+    if not await redis_client.exists(f"{sketch_key(media_id)}:hydrated"):
+        query = await db.run_sync(lambda sync_db: _hydration_query(sync_db, media_id))
+        result = await db.stream(query)
+        async for partition in result.partitions(5000):
+            await _add_groups_async(redis_client, _group_days(media_id, partition))
+        await redis_client.set(f"{sketch_key(media_id)}:hydrated", 1)
+    keys = [sketch_key(media_id)] if days is None else [sketch_key(media_id, d) for d in days]
+    return int(await redis_client.pfcount(*keys))
+
+def _hydrate_local_with_own_session(media_id: int) -> None:
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        _hydrate(None, db, media_id)
+    finally:
+        db.close()
+
+def count_local(media_id: int) -> Optional[int]:
+    """Lifetime estimate from the in-memory sketch, or None if it has not been hydrated yet."""
+    with _lock:
+        entry = _sketches.get(media_id)
+        if entry is None or not entry.hydrated:
+            return None
+        lifetime = entry.by_day.get(None)
+        return lifetime.count() if lifetime else 0
+
+def local_stats() -> Dict[str, int]:
+    """Size of the in-memory sketches (media held, bytes, budget, LRU evictions)."""
+    with _lock:
+        return _sketches.stats()
+
+def reset_local() -> None:
+    """Drop the in-memory sketches; they are rehydrated from the database on next read."""
+    with _lock:
+        _sketches.clear()
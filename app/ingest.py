@@ -0,0 +1,210 @@
+# app/ingest.py
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty, Full
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from . import database, rollups, viewlog
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "sync" commits every view inside the request, "buffered" hands views to a background writer
+VIEW_INGEST_MODE = os.getenv("VIEW_INGEST_MODE", "sync")
+# Durability knob for buffered mode: "flush" acks after the batch is committed, "enqueue" acks immediately
+VIEW_INGEST_ACK = os.getenv("VIEW_INGEST_ACK", "flush")
+VIEW_INGEST_BATCH_SIZE = int(os.getenv("VIEW_INGEST_BATCH_SIZE", 500))
+VIEW_INGEST_FLUSH_MS = int(os.getenv("VIEW_INGEST_FLUSH_MS", 50))
+VIEW_INGEST_MAX_QUEUE = int(os.getenv("VIEW_INGEST_MAX_QUEUE", 100000))
+VIEW_INGEST_ACK_TIMEOUT = float(os.getenv("VIEW_INGEST_ACK_TIMEOUT", 10))
+
+_STOP = object()
+
+class BufferFull(Exception):
+    pass
+
+_listeners: List[Callable[[List[Dict], Dict[int, Dict]], None]] = []
+
+def add_listener(fn: Callable[[List[Dict], Dict[int, Dict]], None]) -> None:
+    """
+    Register a callback run after every batch of view rows commits. It receives the
+    rows and the post-commit rollup counters returned by `rollups.apply_views`.
+    """
+    _listeners.append(fn)
+
+def notify_listeners(rows: List[Dict], counts: Dict[int, Dict], exclude=()) -> None:
+    for fn in _listeners:
+        if fn in exclude:
+            continue
+        try:
+            fn(rows, counts)
+        except Exception:
+            logger.exception("View listener %r failed", fn)
+
+def write_views(db: Session, rows: List[Dict], notify: bool = True) -> Dict[int, Dict]:
+    """
+    Insert view rows ({media_id, viewed_by_ip, timestamp}) as one executemany, fold
+    them into the analytics rollups and commit. Every write path (per-request and
+    batched) goes through here. Returns the post-commit rollup counters; with
+    notify=False the caller is responsible for running the listeners.
+    """
+    if not rows:
+        return {}
+    viewlog.insert_views(db, rows)
+    counts = rollups.apply_views(db, rows)
+    db.commit()
+    if notify:
+        notify_listeners(rows, counts)
+    return counts
+
+class ViewBuffer:
+    """
+    In-process queue of pending views drained by a single writer thread.
+
+    A batch is flushed when it reaches `batch_size` rows or when `flush_interval`
+    seconds have passed since its first row, whichever comes first. Each submitted
+    row gets a Future that resolves once its batch is committed. Rows submitted with
+    `wait=True` have a caller blocked on them, so the writer stops lingering as soon
+    as the queue runs dry (group commit) instead of holding them for the full interval.
+    """
+
+    def __init__(
+        self,
+        session_factory=None,
+        batch_size: int = VIEW_INGEST_BATCH_SIZE,
+        flush_interval: float = VIEW_INGEST_FLUSH_MS / 1000.0,
+        max_queue: int = VIEW_INGEST_MAX_QUEUE,
+    ):
+        self.session_factory = session_factory or database.SessionLocal
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Queue = Queue(maxsize=max_queue)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+
+    def start(self) -> None:
+        with self._lock:
+            self._start()
+
+    def _start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="view-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, row: Dict, wait: bool = False) -> Future:
+        fut: Future = Future()
+        # Checked and queued under the lock stop() closes with, so every accepted row
+        # is ahead of the stop sentinel and gets flushed
+        with self._lock:
+            if self._closed:
+                raise BufferFull("View buffer is shut down")
+            self._start()
+            try:
+                self._queue.put_nowait((row, fut, wait))
+            except Full:
+                raise BufferFull("View buffer is full")
+        return fut
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            awaited = item[2]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    if awaited:
+                        item = self._queue.get_nowait()
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        item = self._queue.get(timeout=remaining)
+                except Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                awaited = awaited or item[2]
+            self._flush(batch)
+            if stopping:
+                break
+
+    def _flush(self, batch) -> None:
+        rows = [row for row, _, _ in batch]
+        db = self.session_factory()
+        try:
+            write_views(db, rows)
+        except Exception as exc:
+            db.rollback()
+            logger.exception("Failed to flush %d buffered views", len(rows))
+            for _, fut, _ in batch:
+                fut.set_exception(exc)
+            return
+        finally:
+            db.close()
+        self.flushed_rows += len(rows)
+        self.flushed_batches += 1
+        for _, fut, _ in batch:
+            fut.set_result(None)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop accepting views, flush everything queued and join the writer."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is None:
+                return
+            # Blocks while the queue is full; the writer drains it without the lock
+            self._queue.put(_STOP)
+        thread.join(timeout)
+
+_view_buffer: Optional[ViewBuffer] = None
+_view_buffer_lock = threading.Lock()
+# Cleared by shutdown(): a buffer created after the final drain would never be flushed
+_accepting = True
+
+def get_view_buffer() -> ViewBuffer:
+    global _view_buffer
+    if _view_buffer is None:
+        with _view_buffer_lock:
+            if not _accepting:
+                raise BufferFull("View ingestion is shut down")
+            if _view_buffer is None:
+                _view_buffer = ViewBuffer()
+                _view_buffer.start()
+    return _view_buffer
+
+def start() -> None:
+    """Accept buffered views (again, when an app is started after a shutdown in the same process)."""
+    global _accepting
+    with _view_buffer_lock:
+        _accepting = True
+
+def shutdown(timeout: Optional[float] = None) -> None:
+    """Flush and stop the writer; views submitted from now on are refused with BufferFull."""
+    global _view_buffer, _accepting
+    with _view_buffer_lock:
+        _accepting = False
+        buffer, _view_buffer = _view_buffer, None
+    if buffer is not None:
+        buffer.stop(timeout)
@@ -1,31 +1,68 @@
 # app/main.py
-from fastapi import FastAPI
-from . import models, database, auth, media
-import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from . import models, database, auth, export, media, ingest, metrics, passwords, redisconn
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Create tables
-models.Base.metadata.create_all(bind=database.engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup work lives here rather than at import, so importing the app (tests,
+    # tooling) never touches the database or Redis
+    await run_in_threadpool(models.Base.metadata.create_all, bind=database.engine)
+    # Waits at most REDIS_CONNECT_TIMEOUT; an unreachable Redis is picked up by the background probe
+    await run_in_threadpool(redisconn.connection.start)
+    app.state.redis = redisconn.connection
+    ingest.start()
+    yield
+    # Drain buffered view ingestion before the process exits
+    ingest.shutdown()
+    passwords.pool.shutdown()
+    await redisconn.connection.close_async()
+    redisconn.connection.stop()
+    if database.APP_IO_MODE == "async":
+        await database.dispose_async_engine()
 
-app = FastAPI(title="Media Access & Analytics Platform")
+app = FastAPI(title="Media Access & Analytics Platform", lifespan=lifespan)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
 
-# Check Redis availability
+# A request that finds Redis gone switches the process to the in-memory stores at
+# once instead of waiting for the next health probe
 try:
     import redis as redis_py
-    REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-    REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
-    REDIS_DB = int(os.getenv("REDIS_DB", 0))
-    rclient = redis_py.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
-    rclient.ping()
-    app.state.redis_available = True
-except Exception:
-    app.state.redis_available = False
+except ImportError:
+    redis_py = None
+
+if redis_py is not None:
+    @app.exception_handler(redis_py.exceptions.ConnectionError)
+    @app.exception_handler(redis_py.exceptions.TimeoutError)
+    async def redis_unavailable(request: Request, exc: Exception):
+        redisconn.connection.mark_down(f"{type(exc).__name__}: {exc}")
+        return JSONResponse(
+            {"detail": "Redis is unavailable, retry shortly"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
 
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
-app.include_router(media.router, prefix="/media", tags=["Media"])
+if database.APP_IO_MODE == "async":
+    from . import media_async
+    app.include_router(media_async.router, prefix="/media", tags=["Media"])
+else:
+    app.include_router(media.router, prefix="/media", tags=["Media"])
+# Streams from a sync session in the threadpool in either mode
+app.include_router(export.router, prefix="/media", tags=["Export"])
+
+# Prometheus scrape target, unauthenticated like most exporters; keep it off public ingress
+if metrics.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 # ✅ Root route for testing
 @app.get("/")
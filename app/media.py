@@ -1,36 +1,26 @@
 # app/media.py
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from pydantic import ValidationError
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Literal, Optional, Tuple
+import hashlib
 import json
 import os
+import threading
 import time
 
-from . import models, schemas, database
-from .auth import get_current_user
+from . import models, schemas, database, hll, ingest, memstore, metrics, ratelimit, redisconn, rollups
+from .auth import Principal, get_current_user, get_current_user_readonly
 from dotenv import load_dotenv
 
 load_dotenv()
 
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
-REDIS_DB = int(os.getenv("REDIS_DB", 0))
-
-# attempt to import redis; if not available or connection fails, fallback to in-memory
-try:
-    import redis as redis_py
-    _redis_client = redis_py.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
-    try:
-        _redis_client.ping()
-        redis_client = _redis_client
-        _USING_REDIS = True
-    except Exception:
-        redis_client = None
-        _USING_REDIS = False
-except Exception:
-    redis_client = None
-    _USING_REDIS = False
+# Backend switch, flipped at runtime by _use_redis as app/redisconn.py's health
+# probe sees Redis come and go; in-memory until the app lifespan starts probing
+redis_client = None
+_USING_REDIS = False
 
 router = APIRouter()
 
@@ -41,64 +31,305 @@ def get_db():
     finally:
         db.close()
 
-# In-memory fallback cache + rate limiter (only for dev / tests)
-_inmemory_cache = {}
-_inmemory_rate = {}
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+MEMSTORE_SWEEP_SECONDS = float(os.getenv("MEMSTORE_SWEEP_SECONDS", 30))
+
+# In-memory fallback cache (used when Redis is unavailable), bounded; the fallback
+# rate limiter lives in app/ratelimit.py
+_inmemory_cache = memstore.TTLCache(max_entries=CACHE_MAX_ENTRIES, sweep_interval=MEMSTORE_SWEEP_SECONDS)
 
 def _cache_get(key):
+    started = time.perf_counter()
     if _USING_REDIS:
         val = redis_client.get(key)
-        return json.loads(val) if val else None
+        value = json.loads(val) if val else None
     else:
-        entry = _inmemory_cache.get(key)
-        if not entry:
-            return None
-        value, expires_at = entry
-        if expires_at and time.time() > expires_at:
-            del _inmemory_cache[key]
-            return None
-        return value
+        value = _inmemory_cache.get(key)
+    metrics.observe_cache("redis" if _USING_REDIS else "memory", "get", started, hit=value is not None)
+    return value
 
 def _cache_setex(key, ttl_seconds, value):
+    started = time.perf_counter()
     if _USING_REDIS:
         redis_client.setex(key, ttl_seconds, json.dumps(value))
     else:
-        expires_at = time.time() + ttl_seconds if ttl_seconds else None
-        _inmemory_cache[key] = (value, expires_at)
+        _inmemory_cache.set(key, value, ttl_seconds)
+    metrics.observe_cache("redis" if _USING_REDIS else "memory", "setex", started)
 
 def _cache_delete(key):
     if _USING_REDIS:
         redis_client.delete(key)
     else:
-        _inmemory_cache.pop(key, None)
+        _inmemory_cache.delete(key)
 
-def _rate_limit_check(key: str, limit: int, window_seconds: int) -> bool:
-    """
-    Returns True if allowed (not rate limited), False if limited.
-    key should include identity (e.g. f"rl:{media_id}:{ip}")
-    """
+# Analytics cache: written through on every committed view instead of invalidated.
+# Writers merge the absolute rollup counters into the cached entry with max(), so
+# updates are idempotent and order-independent. Every write also bumps a per-media
+# version; a reader that recomputed while the version moved may have missed a write
+# whose cached entry did not exist yet, so it caches with a short TTL and that
+# media gets exactly one more recompute instead of serving a stale entry for an hour.
+ANALYTICS_CACHE_TTL = 3600
+ANALYTICS_CACHE_RETRY_TTL = 5
+
+_inmemory_versions = memstore.TTLCache(max_entries=CACHE_MAX_ENTRIES, sweep_interval=MEMSTORE_SWEEP_SECONDS)
+_cache_lock = threading.Lock()
+
+_APPLY_VIEWS_LUA = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+local raw = redis.call('GET', KEYS[1])
+if not raw then return 0 end
+local data = cjson.decode(raw)
+data.total_views = math.max(data.total_views, tonumber(ARGV[1]))
+for day, n in pairs(cjson.decode(ARGV[2])) do
+    if n > (data.views_per_day[day] or 0) then data.views_per_day[day] = n end
+end
+data.unique_ips = redis.call('PFCOUNT', KEYS[3])
+redis.call('SET', KEYS[1], cjson.encode(data), 'KEEPTTL')
+return 1
+"""
+
+_SET_IF_VERSION_LUA = """
+local current = redis.call('GET', KEYS[2]) or ''
+if current == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[4])
+return 0
+"""
+
+def _analytics_version(media_id):
     if _USING_REDIS:
-        # Using Redis INCR with expiry
-        current = redis_client.incr(key)
-        if current == 1:
-            redis_client.expire(key, window_seconds)
-        return current <= limit
-    else:
-        now = int(time.time())
-        window_key = f"{key}:{now // window_seconds}"
-        count = _inmemory_rate.get(window_key, 0) + 1
-        _inmemory_rate[window_key] = count
-        # Clean up old keys occasionally (simple)
-        if len(_inmemory_rate) > 10000:
-            _inmemory_rate.clear()
-        return count <= limit
+        return redis_client.get(f"media_analytics_ver:{media_id}") or ""
+    return _inmemory_versions.get(media_id, 0)
+
+def _cache_set_analytics(media_id, value, version):
+    """Cache a freshly computed entry; fall back to the retry TTL if a write raced the computation."""
+    cache_key = f"media_analytics:{media_id}"
+    if _USING_REDIS:
+        redis_client.eval(
+            _SET_IF_VERSION_LUA, 2, cache_key, f"media_analytics_ver:{media_id}",
+            version, json.dumps(value), ANALYTICS_CACHE_TTL, ANALYTICS_CACHE_RETRY_TTL,
+        )
+        return
+    # A writer bumps the version under the same lock, so it lands either before the
+    # compare (retry TTL) or after the set (and merges into this entry)
+    with _cache_lock:
+        raced = _inmemory_versions.get(media_id, 0) != version
+        _cache_setex(cache_key, ANALYTICS_CACHE_RETRY_TTL if raced else ANALYTICS_CACHE_TTL, value)
+
+def _cache_apply_views(media_id, counts):
+    cache_key = f"media_analytics:{media_id}"
+    if _USING_REDIS:
+        redis_client.eval(
+            _APPLY_VIEWS_LUA, 3, cache_key, f"media_analytics_ver:{media_id}", hll.sketch_key(media_id),
+            counts["total_views"], json.dumps(counts["views_per_day"]), 2 * ANALYTICS_CACHE_TTL,
+        )
+        return
+    unique_ips = hll.count_local(media_id)
+    with _cache_lock:
+        _inmemory_versions.set(media_id, _inmemory_versions.get(media_id, 0) + 1, 2 * ANALYTICS_CACHE_TTL)
+
+    def merge(cached):
+        updated = {
+            "total_views": max(cached["total_views"], counts["total_views"]),
+            "unique_ips": cached["unique_ips"] if unique_ips is None else unique_ips,
+            "views_per_day": dict(cached["views_per_day"]),
+        }
+        for day, views in counts["views_per_day"].items():
+            updated["views_per_day"][day] = max(updated["views_per_day"].get(day, 0), views)
+        return updated
+
+    _inmemory_cache.update(cache_key, merge)
+
+def _on_views_written(rows, counts):
+    using_redis = _USING_REDIS
+    if not using_redis and redisconn.connection.degraded:
+        with _cache_lock:
+            _written_while_degraded.update(counts)
+    try:
+        hll.add_views(redis_client if using_redis else None, rows)
+    except Exception as exc:
+        if not using_redis:
+            raise
+        # Redis went away under this batch: stop using it and repair these media when it is back
+        with _cache_lock:
+            _written_while_degraded.update(counts)
+        redisconn.connection.mark_down(f"{type(exc).__name__}: {exc}")
+        return
+    for media_id, media_counts in counts.items():
+        try:
+            _cache_apply_views(media_id, media_counts)
+        except Exception as exc:
+            # Lost update: drop the entry so the next read recomputes it once
+            try:
+                _cache_delete(f"media_analytics:{media_id}")
+            except Exception:
+                if using_redis:
+                    with _cache_lock:
+                        _written_while_degraded.add(media_id)
+                    redisconn.connection.mark_down(f"{type(exc).__name__}: {exc}")
+
+ingest.add_listener(_on_views_written)
+
+# Media whose views were committed while Redis was down: their Redis cache entries
+# and sketches missed those writes and are dropped when Redis comes back
+_written_while_degraded = set()
+
+def _use_redis(client) -> None:
+    """Switch the cache, limiter and sketches to `client`, or to the in-memory stores for None."""
+    global redis_client, _USING_REDIS
+    if client is None:
+        # Whatever the in-memory stores hold predates the time on Redis
+        _inmemory_cache.clear()
+        _inmemory_versions.clear()
+        hll.reset_local()
+        # redis_client stays set: a request that already chose Redis fails on it
+        # instead of finding None
+        _USING_REDIS = False
+        return
+    with _cache_lock:
+        stale = set(_written_while_degraded)
+        _written_while_degraded.clear()
+    try:
+        if stale:
+            keys = [key for media_id in stale for key in (f"media_analytics:{media_id}", f"{hll.sketch_key(media_id)}:hydrated")]
+            client.delete(*keys)
+            for key in client.scan_iter("media_analytics_batch:*", count=1000):
+                client.delete(key)
+    except Exception:
+        # Still flaky: stay in memory and retry on the next probe
+        with _cache_lock:
+            _written_while_degraded.update(stale)
+        raise
+    redis_client, _USING_REDIS = client, True
+
+redisconn.connection.on_change(_use_redis)
+
+# Single-flight: concurrent cache misses for the same key share one computation.
+# In-process waiters block on the leader; with Redis, other processes wait briefly
+# on a short lock key and re-check the cache before computing themselves.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+def _single_flight(key, compute, timeout=10.0):
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+    if not leader:
+        if flight.done.wait(timeout) and flight.error is None:
+            return flight.value
+        return compute()
+    try:
+        flight.value = _compute_once_across_processes(key, compute)
+        return flight.value
+    except Exception as exc:
+        flight.error = exc
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        flight.done.set()
+
+def _compute_once_across_processes(key, compute, wait_seconds=2.0):
+    if not _USING_REDIS:
+        return compute()
+    lock_key = f"lock:{key}"
+    if redis_client.set(lock_key, 1, nx=True, px=int(wait_seconds * 1000)):
+        try:
+            return compute()
+        finally:
+            redis_client.delete(lock_key)
+    deadline = time.monotonic() + wait_seconds
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        cached = _cache_get(key)
+        if cached:
+            return cached
+    return compute()
+
+# Batch analytics: one grouped query for many media, cached per (ids, range, granularity,
+# exact). Entries are not written through; a range that reaches today is cached briefly,
+# an older one for the full hour since only late or backfilled views can change it.
+ANALYTICS_BATCH_MAX_IDS = int(os.getenv("ANALYTICS_BATCH_MAX_IDS", 200))
+ANALYTICS_BATCH_CACHE_TTL = int(os.getenv("ANALYTICS_BATCH_CACHE_TTL", 60))
+
+def _batch_ids(ids: List[int]) -> List[int]:
+    media_ids = sorted(set(ids))
+    if len(media_ids) > ANALYTICS_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {ANALYTICS_BATCH_MAX_IDS} media ids per request",
+        )
+    return media_ids
+
+def _missing_media_error(missing) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Media not found: {', '.join(map(str, sorted(missing)))}",
+    )
+
+def _batch_cache_key(media_ids, start, end, granularity, exact) -> str:
+    digest = hashlib.sha1(",".join(map(str, media_ids)).encode()).hexdigest()
+    return f"media_analytics_batch:{granularity}:{start or ''}:{end or ''}:{int(exact)}:{digest}"
+
+def _batch_cache_ttl(end: Optional[date]) -> int:
+    return ANALYTICS_CACHE_TTL if end is not None and end < datetime.utcnow().date() else ANALYTICS_BATCH_CACHE_TTL
+
+def _batch_payload(media_ids, start, end, granularity, buckets, unique_ips) -> dict:
+    return {
+        "granularity": granularity,
+        "from": start.isoformat() if start else None,
+        "to": end.isoformat() if end else None,
+        "media": [
+            {
+                "media_id": media_id,
+                "total_views": sum(buckets[media_id].values()),
+                "unique_ips": unique_ips[media_id],
+                "views": buckets[media_id],
+            }
+            for media_id in media_ids
+        ],
+    }
+
+# Cache / rate-limiter counters (JWT-protected)
+@router.get("/cache/stats")
+def get_cache_stats(current_user: Principal = Depends(get_current_user_readonly)):
+    if _USING_REDIS:
+        info = redis_client.info("stats")
+        return {
+            "backend": "redis",
+            "cache": {
+                "hits": info.get("keyspace_hits", 0),
+                "misses": info.get("keyspace_misses", 0),
+                "evictions": info.get("evicted_keys", 0),
+                "expirations": info.get("expired_keys", 0),
+            },
+            "redis": redisconn.connection.status(),
+        }
+    return {
+        "backend": "memory",
+        "cache": _inmemory_cache.stats(),
+        "rate_limiter": ratelimit.memory_limiter.stats(),
+        "sketches": hll.local_stats(),
+        "redis": redisconn.connection.status(),
+    }
 
 # Add Media (JWT-protected)
 @router.post("/", response_model=schemas.MediaAssetResponse)
 def add_media(
     media: schemas.MediaAssetCreate,
     db: Session = Depends(get_db),
-    current_user: models.AdminUser = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     new_media = models.MediaAsset(
         title=media.title,
@@ -111,12 +342,49 @@ def add_media(
     db.refresh(new_media)
     return new_media
 
+# Batch analytics for dashboards (JWT-protected):
+# GET /media/analytics?ids=1&ids=2&from=2025-08-01&to=2025-08-31&granularity=week
+@router.get("/analytics", response_model=schemas.BatchAnalyticsResponse)
+def get_batch_analytics(
+    ids: List[int] = Query(..., min_length=1),
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    granularity: Literal["hour", "day", "week"] = "day",
+    exact: bool = False,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user_readonly),
+):
+    media_ids = _batch_ids(ids)
+    found = {row.id for row in db.query(models.MediaAsset.id).filter(models.MediaAsset.id.in_(media_ids))}
+    if len(found) != len(media_ids):
+        raise _missing_media_error(set(media_ids) - found)
+
+    cache_key = _batch_cache_key(media_ids, start, end, granularity, exact)
+    cached = _cache_get(cache_key)
+    if cached:
+        return cached
+
+    def compute_and_cache():
+        buckets = rollups.read_buckets(db, media_ids, start, end, granularity)
+        if exact:
+            unique_ips = rollups.count_unique_ips_many(db, media_ids, start, end)
+        else:
+            ranged = start is not None or end is not None
+            days = rollups.active_days(db, media_ids, start, end) if ranged else dict.fromkeys(media_ids)
+            client = redis_client if _USING_REDIS else None
+            unique_ips = {media_id: hll.count(client, db, media_id, days[media_id]) for media_id in media_ids}
+        payload = _batch_payload(media_ids, start, end, granularity, buckets, unique_ips)
+        _cache_setex(cache_key, _batch_cache_ttl(end), payload)
+        return payload
+
+    return _single_flight(cache_key, compute_and_cache)
+
 # Get Secure Stream URL (JWT-protected) — 10-minute signed link (simple query param)
 @router.get("/{id}/stream-url")
 def get_stream_url(
     id: int,
     db: Session = Depends(get_db),
-    current_user: models.AdminUser = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user_readonly),
 ):
     media_item = db.query(models.MediaAsset).filter(models.MediaAsset.id == id).first()
     if not media_item:
@@ -126,13 +394,106 @@ def get_stream_url(
     stream_url = f"{media_item.file_url}?{('expires=' + expires)}"
     return {"stream_url": stream_url}
 
-# Log a Media View (JWT-protected) with per-IP rate limit (5/min)
+VIEW_BATCH_MAX_RECORDS = int(os.getenv("VIEW_BATCH_MAX_RECORDS", 10000))
+# Accepted record timestamps: every distinct month is a partition under monthly partitioning
+VIEW_BATCH_MAX_FUTURE_SECONDS = int(os.getenv("VIEW_BATCH_MAX_FUTURE_SECONDS", 300))
+VIEW_BATCH_MAX_AGE_DAYS = int(os.getenv("VIEW_BATCH_MAX_AGE_DAYS", rollups.VIEW_LOG_RETENTION_DAYS or 365))
+
+def _parse_view_records(body: bytes) -> Tuple[List[Tuple[int, schemas.ViewRecord]], Dict[int, dict]]:
+    """
+    Parse an NDJSON body into [(line number, record)], skipping blank lines. Lines that
+    are not a valid record, or whose timestamp is more than VIEW_BATCH_MAX_FUTURE_SECONDS
+    ahead or VIEW_BATCH_MAX_AGE_DAYS behind the server clock, get an "invalid" result
+    instead: {line: result}.
+    """
+    lines = [(n, line) for n, line in enumerate(body.splitlines(), 1) if line.strip()]
+    if len(lines) > VIEW_BATCH_MAX_RECORDS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {VIEW_BATCH_MAX_RECORDS} records per request",
+        )
+    now = datetime.utcnow()
+    earliest = now - timedelta(days=VIEW_BATCH_MAX_AGE_DAYS)
+    latest = now + timedelta(seconds=VIEW_BATCH_MAX_FUTURE_SECONDS)
+    records, results = [], {}
+    for n, line in lines:
+        try:
+            record = schemas.ViewRecord.model_validate_json(line)
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            location = ".".join(map(str, error["loc"]))
+            results[n] = {"line": n, "status": "invalid", "detail": f"{location}: {error['msg']}" if location else error["msg"]}
+            continue
+        ts = _utc(record.timestamp) if record.timestamp else None
+        if ts is not None and ts > latest:
+            results[n] = {"line": n, "status": "invalid", "detail": f"timestamp: more than {VIEW_BATCH_MAX_FUTURE_SECONDS}s in the future"}
+            continue
+        if ts is not None and ts < earliest:
+            results[n] = {"line": n, "status": "invalid", "detail": f"timestamp: older than {VIEW_BATCH_MAX_AGE_DAYS} days"}
+            continue
+        records.append((n, record))
+    return records, results
+
+def _utc(ts: datetime) -> datetime:
+    """Naive UTC, as the view log stores it."""
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo is not None else ts
+
+def _view_row(record: schemas.ViewRecord, now: datetime) -> dict:
+    return {"media_id": record.media_id, "viewed_by_ip": record.ip, "timestamp": _utc(record.timestamp or now)}
+
+def _rate_limit_requests(records, known_ids, results, user_id):
+    """
+    Mark records for unknown media in `results`; return the rest and, per record, the
+    (identities, resource) to rate-limit it with, as if it were its own POST /{id}/view.
+    """
+    candidates = []
+    for n, record in records:
+        if record.media_id in known_ids:
+            candidates.append((n, record))
+        else:
+            results[n] = {"line": n, "status": "unknown_media", "detail": f"Media {record.media_id} not found"}
+    return candidates, [({"ip": record.ip, "user": user_id}, record.media_id) for _, record in candidates]
+
+def _accepted_rows(candidates, rejected_by, results) -> List[dict]:
+    """Record each candidate's verdict in `results` and return the view rows to insert."""
+    now, rows = datetime.utcnow(), []
+    for (n, record), rule in zip(candidates, rejected_by):
+        if rule is not None:
+            results[n] = {"line": n, "status": "rate_limited", "detail": f"Retry after {rule.window_seconds}s"}
+            continue
+        results[n] = {"line": n, "status": "accepted"}
+        rows.append(_view_row(record, now))
+    return rows
+
+def _view_batch_payload(results: Dict[int, dict]) -> dict:
+    ordered = [results[n] for n in sorted(results)]
+    accepted = sum(1 for r in ordered if r["status"] == "accepted")
+    return {"accepted": accepted, "rejected": len(ordered) - accepted, "results": ordered}
+
+# Log many views in one call (JWT-protected): NDJSON {media_id, ip, timestamp} records,
+# each validated and rate-limited like a single view, inserted as one executemany
+@router.post("/views/batch", response_model=schemas.ViewBatchResponse)
+def log_media_views_batch(
+    body: bytes = Body(..., media_type="application/x-ndjson"),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    records, results = _parse_view_records(body)
+    media_ids = {record.media_id for _, record in records}
+    known_ids = set(db.scalars(select(models.MediaAsset.id).where(models.MediaAsset.id.in_(media_ids)))) if media_ids else set()
+
+    candidates, requests = _rate_limit_requests(records, known_ids, results, current_user.id)
+    rejected_by = ratelimit.check_many(redis_client if _USING_REDIS else None, "media_view", requests)
+    ingest.write_views(db, _accepted_rows(candidates, rejected_by, results))
+    return _view_batch_payload(results)
+
+# Log a Media View (JWT-protected) with sliding-window rate limits (default 5/min per IP)
 @router.post("/{id}/view")
 def log_media_view(
     id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.AdminUser = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     media_item = db.query(models.MediaAsset).filter(models.MediaAsset.id == id).first()
     if not media_item:
@@ -140,54 +501,86 @@ def log_media_view(
 
     client_host = request.client.host if request.client else "unknown"
 
-    # Rate-limit per IP per media: 5 requests per 60 seconds
-    rl_key = f"rl:media:{id}:ip:{client_host}"
-    allowed = _rate_limit_check(rl_key, limit=5, window_seconds=60)
-    if not allowed:
-        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Rate limit exceeded")
-
-    view_log = models.MediaViewLog(
-        media_id=id, viewed_by_ip=client_host, timestamp=datetime.utcnow()
+    # Rate-limit per media per IP (default 5 per 60 seconds) and per user, see RATE_LIMITS
+    rejected_by = ratelimit.check(
+        redis_client if _USING_REDIS else None,
+        "media_view",
+        {"ip": client_host, "user": current_user.id},
+        resource=id,
     )
-    db.add(view_log)
-    db.commit()
+    if rejected_by is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(rejected_by.window_seconds)},
+        )
 
-    # Invalidate analytics cache after each view
-    _cache_delete(f"media_analytics:{id}")
+    row = {"media_id": id, "viewed_by_ip": client_host, "timestamp": datetime.utcnow()}
+    if ingest.VIEW_INGEST_MODE == "buffered":
+        try:
+            pending = ingest.get_view_buffer().submit(row, wait=ingest.VIEW_INGEST_ACK == "flush")
+        except ingest.BufferFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="View ingestion is saturated",
+                headers={"Retry-After": "1"},
+            )
+        if ingest.VIEW_INGEST_ACK == "enqueue":
+            return {"message": f"View queued for media {id} from IP {client_host}"}
+        try:
+            pending.result(timeout=ingest.VIEW_INGEST_ACK_TIMEOUT)
+        except Exception:
+            # Timed out or the batch failed (logged by the writer); the client retries
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="View was not committed in time",
+                headers={"Retry-After": "1"},
+            )
+    else:
+        ingest.write_views(db, [row])
 
     return {"message": f"View logged for media {id} from IP {client_host}"}
 
 # Get Media Analytics (JWT-protected) with Redis caching (TTL 1h)
+# unique_ips is a HyperLogLog estimate (~0.8% error) unless ?exact=true
 @router.get("/{id}/analytics", response_model=schemas.MediaAnalyticsResponse)
 def get_media_analytics(
     id: int,
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    exact: bool = False,
     db: Session = Depends(get_db),
-    current_user: models.AdminUser = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user_readonly),
 ):
     media_item = db.query(models.MediaAsset).filter(models.MediaAsset.id == id).first()
     if not media_item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
 
+    # Only the default lifetime view is cached; ranged and exact reads are O(days) against the rollups
+    cacheable = start is None and end is None and not exact
     cache_key = f"media_analytics:{id}"
-    cached = _cache_get(cache_key)
-    if cached:
-        return cached
+    if cacheable:
+        cached = _cache_get(cache_key)
+        if cached:
+            return cached
 
-    views = db.query(models.MediaViewLog).filter(models.MediaViewLog.media_id == id).all()
-    total_views = len(views)
-    unique_ips = len(set(v.viewed_by_ip for v in views))
+    def compute():
+        analytics = rollups.read_views(db, id, start, end)
+        if exact:
+            analytics["unique_ips"] = rollups.count_unique_ips(db, id, start, end)
+        else:
+            days = None if cacheable else [date.fromisoformat(d) for d in analytics["views_per_day"]]
+            analytics["unique_ips"] = hll.count(redis_client if _USING_REDIS else None, db, id, days)
+        return analytics
 
-    views_per_day = defaultdict(int)
-    for v in views:
-        # v.timestamp may be naive datetime
-        views_per_day[v.timestamp.date().isoformat()] += 1
+    if not cacheable:
+        return compute()
 
-    analytics = {
-        "total_views": total_views,
-        "unique_ips": unique_ips,
-        "views_per_day": dict(views_per_day),
-    }
+    def compute_and_cache():
+        version = _analytics_version(id)
+        analytics = compute()
+        # Cache for 1 hour (3600 seconds)
+        _cache_set_analytics(id, analytics, version)
+        return analytics
 
-    # Cache for 1 hour (3600 seconds)
-    _cache_setex(cache_key, 3600, analytics)
-    return analytics
+    return _single_flight(cache_key, compute_and_cache)
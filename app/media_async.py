@@ -0,0 +1,347 @@
+# app/media_async.py
+"""
+The media router served from the event loop (APP_IO_MODE=async).
+
+Same routes, responses and cache keys as app/media.py, but database work goes
+through AsyncSession (aiosqlite / asyncpg) and Redis through a pooled
+redis.asyncio client, so concurrency is no longer capped by the threadpool.
+Both modes can run side by side against one database and one Redis.
+
+Without Redis the in-memory cache, limiter and sketches from app/media.py are
+shared as-is; they never block, so they are called directly on the loop.
+"""
+import asyncio
+import json
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas, database, hll, ingest, media, metrics, ratelimit, redisconn, rollups
+from .auth import Principal, get_current_user_async, get_current_user_readonly_async
+from dotenv import load_dotenv
+
+load_dotenv()
+
+router = APIRouter()
+
+get_db = database.get_async_db
+
+def get_redis():
+    """The shared redis.asyncio client, or None while app/media.py is on the in-memory stores."""
+    if not media._USING_REDIS:
+        return None
+    return redisconn.connection.async_client()
+
+async def _cache_get(key):
+    started = time.perf_counter()
+    client = get_redis()
+    if client is None:
+        value = media._inmemory_cache.get(key)
+    else:
+        val = await client.get(key)
+        value = json.loads(val) if val else None
+    metrics.observe_cache("memory" if client is None else "redis", "get", started, hit=value is not None)
+    return value
+
+async def _cache_setex(key, ttl_seconds, value):
+    started = time.perf_counter()
+    client = get_redis()
+    if client is None:
+        media._inmemory_cache.set(key, value, ttl_seconds)
+    else:
+        await client.setex(key, ttl_seconds, json.dumps(value))
+    metrics.observe_cache("memory" if client is None else "redis", "setex", started)
+
+async def _cache_delete(key):
+    client = get_redis()
+    if client is None:
+        media._inmemory_cache.delete(key)
+    else:
+        await client.delete(key)
+
+async def _analytics_version(media_id):
+    client = get_redis()
+    if client is None:
+        return media._analytics_version(media_id)
+    return await client.get(f"media_analytics_ver:{media_id}") or ""
+
+async def _cache_set_analytics(media_id, value, version):
+    client = get_redis()
+    if client is None:
+        media._cache_set_analytics(media_id, value, version)
+        return
+    await client.eval(
+        media._SET_IF_VERSION_LUA, 2, f"media_analytics:{media_id}", f"media_analytics_ver:{media_id}",
+        version, json.dumps(value), media.ANALYTICS_CACHE_TTL, media.ANALYTICS_CACHE_RETRY_TTL,
+    )
+
+async def _on_views_written(rows, counts):
+    """media._on_views_written for the async client; other listeners run as usual."""
+    client = get_redis()
+    if client is None:
+        ingest.notify_listeners(rows, counts)
+        return
+    ingest.notify_listeners(rows, counts, exclude=(media._on_views_written,))
+    # The rows are committed: a Redis failure from here on must not fail the request
+    try:
+        await hll.add_views_async(client, rows)
+    except Exception as exc:
+        _redis_lost_writes(counts, exc)
+        return
+    for media_id, media_counts in counts.items():
+        try:
+            await client.eval(
+                media._APPLY_VIEWS_LUA, 3, f"media_analytics:{media_id}", f"media_analytics_ver:{media_id}",
+                hll.sketch_key(media_id), media_counts["total_views"],
+                json.dumps(media_counts["views_per_day"]), 2 * media.ANALYTICS_CACHE_TTL,
+            )
+        except Exception as exc:
+            # Lost update: drop the entry so the next read recomputes it once
+            try:
+                await client.delete(f"media_analytics:{media_id}")
+            except Exception:
+                _redis_lost_writes([media_id], exc)
+
+def _redis_lost_writes(media_ids, exc):
+    """Same as media._on_views_written: switch to memory and repair these media when Redis is back."""
+    with media._cache_lock:
+        media._written_while_degraded.update(media_ids)
+    redisconn.connection.mark_down(f"{type(exc).__name__}: {exc}")
+
+# Single-flight on the loop: concurrent misses for a key await one shared task
+_inflight = {}
+
+async def _single_flight(key, compute):
+    task = _inflight.get(key)
+    if task is None:
+        task = _inflight[key] = asyncio.ensure_future(_compute_once_across_processes(key, compute))
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: a waiter that disconnects must not cancel the computation for the others
+    return await asyncio.shield(task)
+
+async def _compute_once_across_processes(key, compute, wait_seconds=2.0):
+    client = get_redis()
+    if client is None:
+        return await compute()
+    lock_key = f"lock:{key}"
+    if await client.set(lock_key, 1, nx=True, px=int(wait_seconds * 1000)):
+        try:
+            return await compute()
+        finally:
+            await client.delete(lock_key)
+    deadline = asyncio.get_running_loop().time() + wait_seconds
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.02)
+        cached = await _cache_get(key)
+        if cached:
+            return cached
+    return await compute()
+
+async def _get_media_or_404(db: AsyncSession, id: int) -> models.MediaAsset:
+    media_item = await db.get(models.MediaAsset, id)
+    if not media_item:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
+    return media_item
+
+# Cache / rate-limiter counters (JWT-protected)
+@router.get("/cache/stats")
+async def get_cache_stats(current_user: Principal = Depends(get_current_user_readonly_async)):
+    client = get_redis()
+    if client is None:
+        return {
+            "backend": "memory",
+            "cache": media._inmemory_cache.stats(),
+            "rate_limiter": ratelimit.memory_limiter.stats(),
+            "sketches": hll.local_stats(),
+            "redis": redisconn.connection.status(),
+        }
+    info = await client.info("stats")
+    return {
+        "backend": "redis",
+        "cache": {
+            "hits": info.get("keyspace_hits", 0),
+            "misses": info.get("keyspace_misses", 0),
+            "evictions": info.get("evicted_keys", 0),
+            "expirations": info.get("expired_keys", 0),
+        },
+        "redis": redisconn.connection.status(),
+    }
+
+# Add Media (JWT-protected)
+@router.post("/", response_model=schemas.MediaAssetResponse)
+async def add_media(
+    media_in: schemas.MediaAssetCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user_async),
+):
+    new_media = models.MediaAsset(
+        title=media_in.title,
+        type=media_in.type,
+        file_url=media_in.file_url,
+        created_at=datetime.utcnow(),
+    )
+    db.add(new_media)
+    await db.commit()
+    await db.refresh(new_media)
+    return new_media
+
+# Batch analytics for dashboards (JWT-protected), see app/media.py
+@router.get("/analytics", response_model=schemas.BatchAnalyticsResponse)
+async def get_batch_analytics(
+    ids: List[int] = Query(..., min_length=1),
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    granularity: Literal["hour", "day", "week"] = "day",
+    exact: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user_readonly_async),
+):
+    media_ids = media._batch_ids(ids)
+    found = set((await db.execute(select(models.MediaAsset.id).where(models.MediaAsset.id.in_(media_ids)))).scalars())
+    if len(found) != len(media_ids):
+        raise media._missing_media_error(set(media_ids) - found)
+
+    cache_key = media._batch_cache_key(media_ids, start, end, granularity, exact)
+    cached = await _cache_get(cache_key)
+    if cached:
+        return cached
+
+    async def compute_and_cache():
+        buckets = await db.run_sync(lambda sync_db: rollups.read_buckets(sync_db, media_ids, start, end, granularity))
+        if exact:
+            unique_ips = await db.run_sync(lambda sync_db: rollups.count_unique_ips_many(sync_db, media_ids, start, end))
+        else:
+            ranged = start is not None or end is not None
+            days = (
+                await db.run_sync(lambda sync_db: rollups.active_days(sync_db, media_ids, start, end))
+                if ranged else dict.fromkeys(media_ids)
+            )
+            unique_ips = {media_id: await hll.count_async(get_redis(), db, media_id, days[media_id]) for media_id in media_ids}
+        payload = media._batch_payload(media_ids, start, end, granularity, buckets, unique_ips)
+        await _cache_setex(cache_key, media._batch_cache_ttl(end), payload)
+        return payload
+
+    return await _single_flight(cache_key, compute_and_cache)
+
+# Get Secure Stream URL (JWT-protected) — 10-minute signed link (simple query param)
+@router.get("/{id}/stream-url")
+async def get_stream_url(
+    id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user_readonly_async),
+):
+    media_item = await _get_media_or_404(db, id)
+    expires = (datetime.utcnow() + timedelta(minutes=10)).isoformat()
+    return {"stream_url": f"{media_item.file_url}?{('expires=' + expires)}"}
+
+# Log many views in one call (JWT-protected), see app/media.py
+@router.post("/views/batch", response_model=schemas.ViewBatchResponse)
+async def log_media_views_batch(
+    body: bytes = Body(..., media_type="application/x-ndjson"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user_async),
+):
+    records, results = media._parse_view_records(body)
+    media_ids = {record.media_id for _, record in records}
+    known_ids = set(
+        (await db.execute(select(models.MediaAsset.id).where(models.MediaAsset.id.in_(media_ids)))).scalars()
+    ) if media_ids else set()
+
+    candidates, requests = media._rate_limit_requests(records, known_ids, results, current_user.id)
+    rejected_by = await ratelimit.check_many_async(get_redis(), "media_view", requests)
+    rows = media._accepted_rows(candidates, rejected_by, results)
+    if rows:
+        counts = await db.run_sync(lambda sync_db: ingest.write_views(sync_db, rows, notify=False))
+        await _on_views_written(rows, counts)
+    return media._view_batch_payload(results)
+
+# Log a Media View (JWT-protected) with sliding-window rate limits (default 5/min per IP)
+@router.post("/{id}/view")
+async def log_media_view(
+    id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user_async),
+):
+    await _get_media_or_404(db, id)
+    client_host = request.client.host if request.client else "unknown"
+
+    rejected_by = await ratelimit.check_async(
+        get_redis(), "media_view", {"ip": client_host, "user": current_user.id}, resource=id,
+    )
+    if rejected_by is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(rejected_by.window_seconds)},
+        )
+
+    row = {"media_id": id, "viewed_by_ip": client_host, "timestamp": datetime.utcnow()}
+    if ingest.VIEW_INGEST_MODE == "buffered":
+        try:
+            pending = ingest.get_view_buffer().submit(row, wait=ingest.VIEW_INGEST_ACK == "flush")
+        except ingest.BufferFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="View ingestion is saturated",
+                headers={"Retry-After": "1"},
+            )
+        if ingest.VIEW_INGEST_ACK == "enqueue":
+            return {"message": f"View queued for media {id} from IP {client_host}"}
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(pending), ingest.VIEW_INGEST_ACK_TIMEOUT)
+        except Exception:
+            # Timed out or the batch failed (logged by the writer); the client retries
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="View was not committed in time",
+                headers={"Retry-After": "1"},
+            )
+    else:
+        counts = await db.run_sync(lambda sync_db: ingest.write_views(sync_db, [row], notify=False))
+        await _on_views_written([row], counts)
+
+    return {"message": f"View logged for media {id} from IP {client_host}"}
+
+# Get Media Analytics (JWT-protected) with Redis caching (TTL 1h)
+# unique_ips is a HyperLogLog estimate (~0.8% error) unless ?exact=true
+@router.get("/{id}/analytics", response_model=schemas.MediaAnalyticsResponse)
+async def get_media_analytics(
+    id: int,
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    exact: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user_readonly_async),
+):
+    await _get_media_or_404(db, id)
+
+    cacheable = start is None and end is None and not exact
+    cache_key = f"media_analytics:{id}"
+    if cacheable:
+        cached = await _cache_get(cache_key)
+        if cached:
+            return cached
+
+    async def compute():
+        if exact:
+            return await db.run_sync(lambda sync_db: rollups.read_analytics(sync_db, id, start, end))
+        analytics = await db.run_sync(lambda sync_db: rollups.read_views(sync_db, id, start, end))
+        days = None if cacheable else [date.fromisoformat(d) for d in analytics["views_per_day"]]
+        analytics["unique_ips"] = await hll.count_async(get_redis(), db, id, days)
+        return analytics
+
+    if not cacheable:
+        return await compute()
+
+    async def compute_and_cache():
+        version = await _analytics_version(id)
+        analytics = await compute()
+        await _cache_set_analytics(id, analytics, version)
+        return analytics
+
+    return await _single_flight(cache_key, compute_and_cache)
@@ -0,0 +1,224 @@
+# app/memstore.py
+"""
+Bounded in-process structures used when Redis is not available.
+
+TTLCache is an LRU map with per-entry expiry: reads drop expired entries,
+a background thread sweeps the rest, and inserts past `max_entries` evict
+the least recently used key.
+
+SlidingWindowLimiter approximates a sliding window with two fixed-window
+counters per key (current and previous window, the latter weighted by how
+much of it still overlaps the sliding window). That is O(1) memory per
+active key and avoids the 2x burst a fixed window allows at its edges.
+Keys are spread over lock stripes so concurrent checks rarely contend, and
+each stripe evicts its least recently seen key when full instead of
+resetting every client at once.
+"""
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class _Swept:
+    """Runs self.sweep() every `sweep_interval` seconds on a daemon thread, started on first write."""
+
+    _sweeper: Optional[threading.Thread] = None
+
+    def __init__(self, sweep_interval: float):
+        self.sweep_interval = sweep_interval
+        self._sweeper_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def sweep(self) -> int:
+        raise NotImplementedError
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is not None or not self.sweep_interval:
+            return
+        with self._sweeper_lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name=f"{type(self).__name__}-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while not self._stopped.wait(self.sweep_interval):
+            self.sweep()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+class TTLCache(_Swept):
+    def __init__(self, max_entries: int = 10000, sweep_interval: float = 30.0):
+        super().__init__(sweep_interval)
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _live(self, key, now):
+        """Entry for key if present and unexpired (caller holds the lock)."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and now > entry[1]:
+            del self._data[key]
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._live(key, time.time())
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        self._ensure_sweeper()
+
+    def update(self, key: str, fn: Callable[[Any], Any]) -> bool:
+        """Atomically replace a live entry with fn(value), keeping its expiry. Returns False if absent."""
+        with self._lock:
+            entry = self._live(key, time.time())
+            if entry is None:
+                return False
+            self._data[key] = (fn(entry[0]), entry[1])
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def ttl(self, key: str) -> Optional[float]:
+        """Seconds until key expires, None if it never does, -1 if it is absent."""
+        with self._lock:
+            entry = self._live(key, time.time())
+            if entry is None:
+                return -1
+            return None if entry[1] is None else entry[1] - time.time()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [k for k, (_, exp) in self._data.items() if exp is not None and now > exp]
+            for k in expired:
+                del self._data[k]
+            self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class SlidingWindowLimiter(_Swept):
+    def __init__(self, stripes: int = 64, max_keys: int = 100000, sweep_interval: float = 30.0):
+        super().__init__(sweep_interval)
+        self._stripes = [(threading.Lock(), OrderedDict()) for _ in range(stripes)]
+        self.max_keys_per_stripe = max(1, math.ceil(max_keys / stripes))
+        self.allowed = 0
+        self.rejected = 0
+        self.evictions = 0
+
+    def _stripe(self, key: str):
+        return self._stripes[zlib.crc32(key.encode()) % len(self._stripes)]
+
+    def hit(self, key: str, limit: int, window_seconds: float, now: Optional[float] = None) -> bool:
+        """Count one request for key; True if it is within `limit` per sliding `window_seconds`."""
+        return self.hit_many([(key, limit, window_seconds)], now) is None
+
+    def hit_many(self, checks: List[Tuple[str, int, float]], now: Optional[float] = None) -> Optional[int]:
+        """
+        Check several (key, limit, window_seconds) limits as one atomic step: either every key
+        is counted, or none is and the index of the first exceeded limit is returned.
+        """
+        now = time.time() if now is None else now
+        stripe_ids = sorted({zlib.crc32(key.encode()) % len(self._stripes) for key, _, _ in checks})
+        # Lock stripes in index order so overlapping multi-key checks cannot deadlock
+        locks = [self._stripes[i][0] for i in stripe_ids]
+        for lock in locks:
+            lock.acquire()
+        try:
+            states = [self._state(key, window_seconds, now) for key, _, window_seconds in checks]
+            for i, ((_, limit, window_seconds), state) in enumerate(zip(checks, states)):
+                overlap = 1.0 - (now % window_seconds) / window_seconds
+                if state[1] * overlap + state[2] + 1 > limit:
+                    self.rejected += 1
+                    return i
+            for state in states:
+                state[2] += 1
+            self.allowed += 1
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        self._ensure_sweeper()
+        return None
+
+    def _state(self, key: str, window_seconds: float, now: float) -> list:
+        """Counters for key rolled forward to the window containing now (caller holds its stripe lock)."""
+        window = int(now // window_seconds)
+        states = self._stripe(key)[1]
+        state = states.get(key)
+        if state is None:
+            # [window index, previous window count, current window count, window length]
+            state = states[key] = [window, 0, 0, window_seconds]
+            while len(states) > self.max_keys_per_stripe:
+                states.popitem(last=False)
+                self.evictions += 1
+        else:
+            states.move_to_end(key)
+        if window != state[0]:
+            state[1] = state[2] if window == state[0] + 1 else 0
+            state[2] = 0
+            state[0] = window
+        return state
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop keys idle for two full windows; their counters can no longer affect a decision."""
+        now = time.time() if now is None else now
+        removed = 0
+        for lock, states in self._stripes:
+            with lock:
+                idle = [k for k, (window, _, _, length) in states.items() if (window + 2) * length <= now]
+                for k in idle:
+                    del states[k]
+                removed += len(idle)
+        return removed
+
+    def __len__(self) -> int:
+        return sum(len(states) for _, states in self._stripes)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "keys": len(self),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,270 @@
+# app/metrics.py
+"""
+In-process instrumentation, exposed in the Prometheus text format at GET /metrics.
+
+    http_request_duration_seconds{method, route, status}   histogram, per route template
+    http_request_phase_seconds{route, phase}                histogram, time a request spent in
+                                                            "auth", "db", "cache" and "ratelimit"
+    db_query_duration_seconds{engine, operation}            histogram, from SQLAlchemy cursor events
+    cache_requests_total{backend, result}                   counter, analytics cache hits and misses
+    cache_operation_duration_seconds{backend, operation}    histogram, cache get / setex
+    rate_limit_rejections_total{route, scope}               counter, by the rule that rejected
+
+Phases are summed per request (a request running three queries observes their
+total once) through a context variable that follows the request into the
+threadpool, so they answer "where did this route's time go". They may overlap:
+the user lookup inside "auth" is also "db".
+
+Metrics are kept per process; with several workers, scrape each one. Recording
+is a dict lookup and a locked increment; the costlier part is SQLAlchemy
+dispatching the two cursor events on every statement (benchmarks/bench_metrics.py
+measures both). METRICS_ENABLED=false turns every hook into a no-op and removes
+the middleware and the endpoint.
+"""
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Fixed buckets; each series keeps a count per bucket (non-cumulative) plus sum and count."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = REQUEST_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # series: [count in bucket 0 .. n-1, count above the last bucket, sum]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labelvalues) -> int:
+        series = self._series.get(labelvalues)
+        return sum(series[:-1]) if series else 0
+
+    def sum(self, *labelvalues) -> float:
+        series = self._series.get(labelvalues)
+        return series[-1] if series else 0.0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((labelvalues, list(series)) for labelvalues, series in self._series.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, series in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += n
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time from receiving a request to the end of its response body.",
+    ("method", "route", "status"),
+)
+REQUEST_PHASES = Histogram(
+    "http_request_phase_seconds", "Time a request spent in one phase, summed over the phase's calls.",
+    ("route", "phase"), FAST_BUCKETS,
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time, from SQLAlchemy cursor events.",
+    ("engine", "operation"), FAST_BUCKETS,
+)
+CACHE_REQUESTS = Counter("cache_requests_total", "Analytics cache lookups by result.", ("backend", "result"))
+CACHE_DURATION = Histogram(
+    "cache_operation_duration_seconds", "Analytics cache operation time.", ("backend", "operation"), FAST_BUCKETS,
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total", "Requests rejected by a rate limit rule.", ("route", "scope"),
+)
+
+REGISTRY = (REQUEST_DURATION, REQUEST_PHASES, DB_QUERY_DURATION, CACHE_REQUESTS, CACHE_DURATION, RATE_LIMIT_REJECTIONS)
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+# Per-request phase totals: (seconds by phase, phases currently running)
+_phases: ContextVar[Optional[Tuple[Dict[str, float], set]]] = ContextVar("metrics_phases", default=None)
+
+def add_phase_time(phase: str, seconds: float) -> None:
+    state = _phases.get()
+    if state is not None and phase not in state[1]:
+        state[0][phase] = state[0].get(phase, 0.0) + seconds
+
+def timed_phase(phase: str):
+    """
+    Decorator adding a (sync or async) function's run time to the current request's
+    `phase`. Nested calls of the same phase are counted once, by the outermost.
+    """
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        def enter():
+            state = _phases.get()
+            if state is None or phase in state[1]:
+                return None
+            state[1].add(phase)
+            return state, time.perf_counter()
+
+        def leave(token):
+            if token is not None:
+                state, started = token
+                state[1].discard(phase)
+                state[0][phase] = state[0].get(phase, 0.0) + time.perf_counter() - started
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = enter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    leave(token)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = enter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                leave(token)
+        return wrapper
+    return decorator
+
+def observe_cache(backend: str, operation: str, started: float, hit: Optional[bool] = None) -> None:
+    """Record a cache operation that began at perf_counter() `started`; `hit` for lookups."""
+    if not METRICS_ENABLED:
+        return
+    elapsed = time.perf_counter() - started
+    CACHE_DURATION.observe(elapsed, backend, operation)
+    if hit is not None:
+        CACHE_REQUESTS.inc(backend, "hit" if hit else "miss")
+    add_phase_time("cache", elapsed)
+
+def observe_rate_limit_rejection(route: str, scope: str) -> None:
+    if METRICS_ENABLED:
+        RATE_LIMIT_REJECTIONS.inc(route, scope)
+
+_OPERATIONS = {"select": "select", "with": "select", "insert": "insert", "update": "update", "delete": "delete"}
+
+def _operation(statement: str) -> str:
+    words = statement[:16].split(None, 1)
+    return _OPERATIONS.get(words[0].lower(), "other") if words else "other"
+
+def instrument_engine(engine, name: str) -> None:
+    """Time every statement run on a (sync) engine; pass `.sync_engine` for an AsyncEngine."""
+    if not METRICS_ENABLED:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _started(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finished(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            DB_QUERY_DURATION.observe(elapsed, name, _operation(statement))
+            add_phase_time("db", elapsed)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request until its response body is sent, labelled
+    with the matched route template ("/media/{id}/analytics"), never the raw path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+        phases: Dict[str, float] = {}
+        token = _phases.set((phases, set()))
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _phases.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_DURATION.observe(time.perf_counter() - started, scope["method"], route, str(status_code))
+            for phase, seconds in phases.items():
+                REQUEST_PHASES.observe(seconds, route, phase)
@@ -0,0 +1,104 @@
+# app/migrations.py
+"""
+Schema changes for databases that already exist.
+
+`create_all` only creates missing tables; it never adds an index or column to
+a table that is already there. Every change to an existing table is therefore
+also a numbered migration here, applied once and in order, and recorded in
+schema_migrations. Migrations are idempotent, so running them against a
+database that create_all just built is a cheap no-op.
+
+    python -m app.migrations status
+    python -m app.migrations upgrade
+"""
+import argparse
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models, database, rollups
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def _create_indexes(engine: Engine, table) -> None:
+    existing = {ix["name"] for ix in inspect(engine).get_indexes(table.name)}
+    for index in sorted(table.indexes, key=lambda ix: ix.name):
+        if index.name in existing:
+            continue
+        if engine.dialect.name == "postgresql":
+            # CONCURRENTLY keeps media_view_logs writable while the index builds; it
+            # cannot run inside a transaction
+            columns = ", ".join(c.name for c in index.columns)
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.exec_driver_sql(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name} ON {table.name} ({columns})")
+        else:
+            with engine.begin() as conn:
+                index.create(conn)
+
+def _view_log_indexes(engine: Engine) -> None:
+    _create_indexes(engine, models.MediaViewLog.__table__)
+    if engine.dialect.name == "sqlite":
+        # Give the planner statistics for the new indexes
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE media_view_logs")
+
+def _backfill_rollups(engine: Engine) -> None:
+    # Databases that predate the rollup tables get them empty from create_all;
+    # without this, analytics would report 0 views for everything already logged
+    with Session(bind=engine) as db:
+        rollups.rebuild(db)
+
+# (version, name, fn(engine)); append only
+MIGRATIONS: List[Tuple[int, str, Callable[[Engine], None]]] = [
+    (1, "media_view_logs composite indexes", _view_log_indexes),
+    (2, "backfill analytics rollups from media_view_logs", _backfill_rollups),
+]
+
+def applied(engine: Engine) -> set:
+    _metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+def pending(engine: Engine) -> List[Tuple[int, str, Callable[[Engine], None]]]:
+    done = applied(engine)
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+def upgrade(engine: Engine) -> List[int]:
+    """Apply pending migrations in order; returns the versions applied."""
+    models.Base.metadata.create_all(bind=engine)
+    ran = []
+    for version, name, fn in pending(engine):
+        fn(engine)
+        with engine.begin() as conn:
+            conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+        ran.append(version)
+    return ran
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="List applied and pending migrations")
+    sub.add_parser("upgrade", help="Apply pending migrations")
+    args = parser.parse_args(argv)
+
+    engine = database.engine
+    if args.command == "status":
+        done = applied(engine)
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:>4}  {'applied' if version in done else 'pending':<8} {name}")
+        return
+    ran = upgrade(engine)
+    print(f"Applied migrations: {', '.join(map(str, ran))}" if ran else "Database is up to date")
+
+if __name__ == "__main__":
+    main()
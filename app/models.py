@@ -1,5 +1,5 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Index
 from datetime import datetime
 from .database import Base
 
@@ -24,3 +24,42 @@ class MediaViewLog(Base):
     media_id = Column(Integer, ForeignKey("media_assets.id"), nullable=False)
     viewed_by_ip = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
+
+    # Existing databases get these from app/migrations.py
+    __table_args__ = (
+        # per-media time ranges: day buckets, range counts, sketch hydration. The trailing
+        # viewed_by_ip makes it covering, so ranged DISTINCTs and hydration never touch the table
+        Index("ix_media_view_logs_media_id_timestamp", "media_id", "timestamp", "viewed_by_ip"),
+        # per-media distinct IPs, answered from the index alone
+        Index("ix_media_view_logs_media_id_viewed_by_ip", "media_id", "viewed_by_ip"),
+    )
+
+# Rollups maintained alongside media_view_logs (see app/rollups.py)
+class MediaViewTotal(Base):
+    __tablename__ = "media_view_totals"
+    media_id = Column(Integer, ForeignKey("media_assets.id"), primary_key=True)
+    total_views = Column(Integer, nullable=False, default=0)
+    unique_ips = Column(Integer, nullable=False, default=0)
+
+class MediaViewDaily(Base):
+    __tablename__ = "media_view_daily"
+    media_id = Column(Integer, ForeignKey("media_assets.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    views = Column(Integer, nullable=False, default=0)
+
+class MediaViewerIP(Base):
+    __tablename__ = "media_viewer_ips"
+    media_id = Column(Integer, ForeignKey("media_assets.id"), primary_key=True)
+    viewed_by_ip = Column(String, primary_key=True)
+
+# Raw views past the retention window, compacted to one row per media, day and IP
+# (see rollups.compact); together with media_view_logs they back exact ranged counts
+class MediaViewDailyIP(Base):
+    __tablename__ = "media_view_daily_ips"
+    media_id = Column(Integer, ForeignKey("media_assets.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    viewed_by_ip = Column(String, primary_key=True)
+    views = Column(Integer, nullable=False, default=0)
+
+    # Stored once, in primary-key order, instead of as a rowid table plus a key index
+    __table_args__ = {"sqlite_with_rowid": False}
@@ -0,0 +1,149 @@
+# app/passwords.py
+"""
+bcrypt hashing and verification off the request threadpool.
+
+Password work runs in a dedicated process pool (bcrypt is CPU-bound, so
+threads would still contend on the GIL) of PASSWORD_WORKERS processes. At
+most PASSWORD_MAX_PENDING calls may be queued or running; beyond that
+callers get PoolSaturated straight away, which the auth routes turn into
+503, instead of piling up behind a login burst. A worker that dies (OOM
+kill, crash) breaks the whole executor; it is replaced and the call retried
+once, and if that fails too the caller gets PoolUnavailable (also a 503).
+PASSWORD_WORKERS=0 runs the work on the AnyIO threadpool instead (dev/tests).
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", 8 * max(1, PASSWORD_WORKERS)))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+class PoolSaturated(Exception):
+    pass
+
+class PoolUnavailable(PoolSaturated):
+    """The worker pool broke again right after being replaced."""
+
+# Run inside the worker processes; they return when they started so the
+# parent can split queue wait from hashing time
+def _hash(password: str):
+    started = time.time()
+    return pwd_context.hash(password), started
+
+def _verify(password: str, hashed: str):
+    started = time.time()
+    return pwd_context.verify(password, hashed), started
+
+class PasswordPool:
+    def __init__(self, workers: int = PASSWORD_WORKERS, max_pending: int = PASSWORD_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._wait_ms = deque(maxlen=1024)
+        self._run_ms = deque(maxlen=1024)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: forking a process that already runs threads is not safe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a broken executor so the next call starts a fresh one."""
+        with self._lock:
+            if self._executor is not executor:
+                return  # another caller already replaced it
+            self._executor = None
+            self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(self, fn, *args):
+        for _ in range(2):
+            executor = self._get_executor()
+            try:
+                return await asyncio.wrap_future(executor.submit(fn, *args))
+            except BrokenProcessPool:
+                self._discard(executor)
+        raise PoolUnavailable("Password worker pool is failing")
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated("Password hashing queue is full")
+            self.pending += 1
+        submitted = time.time()
+        try:
+            if self.workers > 0:
+                result, started = await self._submit(fn, *args)
+            else:
+                result, started = await run_in_threadpool(fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+        finished = time.time()
+        with self._lock:
+            self.completed += 1
+            self._wait_ms.append((started - submitted) * 1000)
+            self._run_ms.append((finished - started) * 1000)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(_verify, password, hashed)
+
+    def stats(self) -> Dict:
+        def percentile(samples, q):
+            if not samples:
+                return 0.0
+            ordered = sorted(samples)
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+        with self._lock:
+            wait, run = list(self._wait_ms), list(self._run_ms)
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "queued": max(0, self.pending - self.workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+                "wait_ms_p50": percentile(wait, 0.5),
+                "wait_ms_p99": percentile(wait, 0.99),
+                "run_ms_p50": percentile(run, 0.5),
+                "run_ms_p99": percentile(run, 0.99),
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+pool = PasswordPool()
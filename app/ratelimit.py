@@ -0,0 +1,214 @@
+# app/ratelimit.py
+"""
+Sliding-window rate limiting with per-route, per-identity rules.
+
+Rules come from RATE_LIMITS, a ";"-separated list of
+
+    <route>:<scope>=<limit>/<window_seconds>             default for a scope
+    <route>:<scope>:<identity>=<limit>/<window_seconds>  override for one identity
+
+where scope is "ip" or "user", e.g.
+
+    RATE_LIMITS="media_view:ip=5/60;media_view:user=100/60;media_view:user:1=1000/60"
+
+"ip" rules count per IP per resource (5 views a minute of each media from
+one IP); "user" rules count per user across every resource (100 views a
+minute in total).
+
+Every rule of a route is checked in one atomic step: one Lua script call
+(a single round trip) with Redis, one striped-lock section in memory. Both
+use the same two-counter sliding window approximation (see app/memstore.py)
+and count a request only if it passes every rule. In Redis each rule's
+counters are one hash, passed to the script in KEYS, and every key carries
+the route as a hash tag, so on Redis Cluster one request's keys share a slot.
+"""
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from . import memstore, metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_RATE_LIMITS = "media_view:ip=5/60"
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+MEMSTORE_SWEEP_SECONDS = float(os.getenv("MEMSTORE_SWEEP_SECONDS", 30))
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    route: str
+    scope: str
+    limit: int
+    window_seconds: int
+
+def parse_rules(spec: str) -> Dict[tuple, RateLimitRule]:
+    """{(route, scope, identity or None): rule} from a RATE_LIMITS string."""
+    rules = {}
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        target, _, value = item.partition("=")
+        parts = target.strip().split(":", 2)
+        if len(parts) < 2 or not value:
+            raise ValueError(f"Invalid rate limit rule: {item!r}")
+        route, scope = parts[0], parts[1]
+        identity = parts[2] if len(parts) == 3 else None
+        limit, _, window = value.partition("/")
+        rules[(route, scope, identity)] = RateLimitRule(route, scope, int(limit), int(window))
+    return rules
+
+RULES = parse_rules(os.getenv("RATE_LIMITS", DEFAULT_RATE_LIMITS))
+
+memory_limiter = memstore.SlidingWindowLimiter(max_keys=RATE_LIMIT_MAX_KEYS, sweep_interval=MEMSTORE_SWEEP_SECONDS)
+
+# KEYS[i]: hash of rule i, {idx: current window index, cur: its count, prev: the
+# previous window's count}; ARGV[2i-1], ARGV[2i]: its limit and window in ms.
+# Checks every rule before counting any, so a rejected request consumes nothing.
+_SLIDING_WINDOW_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local windows = {}
+for i = 1, #KEYS do
+    local limit = tonumber(ARGV[2 * i - 1])
+    local window = tonumber(ARGV[2 * i])
+    local index = math.floor(now / window)
+    local state = redis.call('HMGET', KEYS[i], 'idx', 'cur', 'prev')
+    local idx, cur, prev = tonumber(state[1]), tonumber(state[2]) or 0, tonumber(state[3]) or 0
+    if idx == index - 1 then
+        prev, cur = cur, 0
+    elseif idx ~= index then
+        prev, cur = 0, 0
+    end
+    local overlap = 1 - (now % window) / window
+    if prev * overlap + cur + 1 > limit then
+        return i
+    end
+    windows[i] = {index, cur, prev, window}
+end
+for i = 1, #KEYS do
+    local w = windows[i]
+    redis.call('HSET', KEYS[i], 'idx', string.format('%d', w[1]), 'cur', w[2] + 1, 'prev', w[3])
+    redis.call('PEXPIRE', KEYS[i], 2 * w[4])
+end
+return 0
+"""
+
+def _script(redis_client):
+    # Registered once per client object and kept on it, so it goes away with a
+    # replaced client. register_script caches the SHA and uses EVALSHA, falling
+    # back to EVAL on NOSCRIPT
+    script = getattr(redis_client, "_sliding_window_script", None)
+    if script is None:
+        script = redis_client._sliding_window_script = redis_client.register_script(_SLIDING_WINDOW_LUA)
+    return script
+
+def rules_for(route: str, identities: Dict[str, Optional[str]]) -> List[RateLimitRule]:
+    rules = []
+    for scope, identity in identities.items():
+        if identity is None:
+            continue
+        rule = RULES.get((route, scope, str(identity))) or RULES.get((route, scope, None))
+        if rule is not None:
+            rules.append(rule)
+    return rules
+
+# Scopes whose counters are kept per resource; the others span all resources
+PER_RESOURCE_SCOPES = frozenset({"ip"})
+
+def _key(rule: RateLimitRule, identity, resource) -> str:
+    per_resource = resource is not None and rule.scope in PER_RESOURCE_SCOPES
+    scoped = f"{{{rule.route}}}:{resource}" if per_resource else f"{{{rule.route}}}"
+    return f"rl:{scoped}:{rule.scope}:{identity}"
+
+def _rejected(rule: RateLimitRule) -> RateLimitRule:
+    metrics.observe_rate_limit_rejection(rule.route, rule.scope)
+    return rule
+
+def _script_args(checks: List[tuple]) -> dict:
+    args = []
+    for _, limit, window_seconds in checks:
+        args += [limit, int(window_seconds * 1000)]
+    return {"keys": [key for key, _, _ in checks], "args": args}
+
+def _rejected_index(result) -> Optional[int]:
+    rejected = int(result)
+    return rejected - 1 if rejected else None
+
+@metrics.timed_phase("ratelimit")
+def check_rules(redis_client, checks: List[tuple]) -> Optional[int]:
+    """
+    checks: [(key, limit, window_seconds)]. Counts the request against every key and
+    returns None, or returns the index of the first exceeded limit without counting it.
+    """
+    if not checks:
+        return None
+    if redis_client is not None:
+        return _rejected_index(_script(redis_client)(**_script_args(checks)))
+    return memory_limiter.hit_many(checks)
+
+@metrics.timed_phase("ratelimit")
+async def check_rules_async(redis_client, checks: List[tuple]) -> Optional[int]:
+    """check_rules for a redis.asyncio client."""
+    if not checks or redis_client is None:
+        return check_rules(None, checks)
+    return _rejected_index(await _script(redis_client)(**_script_args(checks)))
+
+def check(redis_client, route: str, identities: Dict[str, Optional[str]], resource=None) -> Optional[RateLimitRule]:
+    """
+    Apply every configured rule of `route` for the given identities (e.g. {"ip": ..., "user": ...}),
+    scoped to `resource` if given. Returns the rule that rejected the request, or None if allowed.
+    """
+    rules = rules_for(route, identities)
+    checks = [(_key(rule, identities[rule.scope], resource), rule.limit, rule.window_seconds) for rule in rules]
+    rejected = check_rules(redis_client, checks)
+    return None if rejected is None else _rejected(rules[rejected])
+
+def _plan(route: str, requests: List[Tuple[Dict[str, Optional[str]], object]]) -> List[tuple]:
+    plans = []
+    for identities, resource in requests:
+        rules = rules_for(route, identities)
+        plans.append((rules, [(_key(rule, identities[rule.scope], resource), rule.limit, rule.window_seconds) for rule in rules]))
+    return plans
+
+@metrics.timed_phase("ratelimit")
+def check_many(redis_client, route: str, requests: List[Tuple[Dict[str, Optional[str]], object]]) -> List[Optional[RateLimitRule]]:
+    """
+    `check` for a batch of requests, [(identities, resource)], applied in order as if they
+    arrived one after another. With Redis the script calls share one pipelined round trip.
+    Returns the rejecting rule (or None) per request.
+    """
+    plans = _plan(route, requests)
+    if redis_client is None:
+        rejected = [check_rules(None, checks) for _, checks in plans]
+    else:
+        pending = [i for i, (_, checks) in enumerate(plans) if checks]
+        pipe = redis_client.pipeline(transaction=False)
+        script = _script(redis_client)
+        for i in pending:
+            script(**_script_args(plans[i][1]), client=pipe)
+        rejected = [None] * len(plans)
+        for i, result in zip(pending, pipe.execute()):
+            rejected[i] = _rejected_index(result)
+    return [None if r is None else _rejected(plans[i][0][r]) for i, r in enumerate(rejected)]
+
+@metrics.timed_phase("ratelimit")
+async def check_many_async(redis_client, route: str, requests: List[Tuple[Dict[str, Optional[str]], object]]) -> List[Optional[RateLimitRule]]:
+    """check_many for a redis.asyncio client."""
+    if redis_client is None:
+        return check_many(None, route, requests)
+    plans = _plan(route, requests)
+    pending = [i for i, (_, checks) in enumerate(plans) if checks]
+    pipe = redis_client.pipeline(transaction=False)
+    script = _script(redis_client)
+    for i in pending:
+        await script(**_script_args(plans[i][1]), client=pipe)
+    rejected = [None] * len(plans)
+    for i, result in zip(pending, await pipe.execute()):
+        rejected[i] = _rejected_index(result)
+    return [None if r is None else _rejected(plans[i][0][r]) for i, r in enumerate(rejected)]
+
+async def check_async(redis_client, route: str, identities: Dict[str, Optional[str]], resource=None) -> Optional[RateLimitRule]:
+    """check for a redis.asyncio client."""
+    rules = rules_for(route, identities)
+    checks = [(_key(rule, identities[rule.scope], resource), rule.limit, rule.window_seconds) for rule in rules]
+    rejected = await check_rules_async(redis_client, checks)
+    return None if rejected is None else _rejected(rules[rejected])
@@ -0,0 +1,184 @@
+# app/redisconn.py
+"""
+The process's Redis connection, shared by the analytics cache, the rate
+limiter and the unique-viewer sketches.
+
+Nothing connects at import time. `connection.start()`, run from the app
+lifespan, builds one connection pool with bounded connect and socket timeouts
+and starts a daemon thread that pings Redis right away and then every
+REDIS_HEALTH_INTERVAL seconds. Startup waits for the first answer at most
+REDIS_CONNECT_TIMEOUT seconds; a Redis that is down or hung leaves the process
+on its in-memory backends, and the probe switches it over once Redis answers.
+
+Consumers register with `on_change`: the callback gets the client when Redis
+becomes usable and None when it stops being usable, and switches between the
+Redis and in-memory backends (see media._use_redis). A request that runs into
+a dead connection calls `mark_down()` so the switch does not wait for the next
+probe. In async mode `async_client()` hands out a redis.asyncio client over
+its own bounded pool with the same timeouts.
+
+REDIS_HOST="" turns Redis off: the in-memory backends are used and nothing is probed.
+"""
+import logging
+import os
+import threading
+from typing import Callable, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 0.5))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 2))
+REDIS_HEALTH_INTERVAL = float(os.getenv("REDIS_HEALTH_INTERVAL", 5))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 100))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
+
+logger = logging.getLogger(__name__)
+
+class RedisConnection:
+    def __init__(self, host: str = REDIS_HOST, port: int = REDIS_PORT, db: int = REDIS_DB, client=None):
+        self.host = host
+        self.port = port
+        self.db = db
+        # A ready-made client (tests) skips building the pool
+        self.client = client
+        self.available = False
+        self.started = False
+        self.switches = 0
+        self.last_error: Optional[str] = None
+        self._async_client = None
+        self._callbacks: List[Callable] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._first_probe = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.host) or self.client is not None
+
+    @property
+    def degraded(self) -> bool:
+        """Redis is configured and the process runs on the in-memory backends in its place."""
+        return self.started and self.enabled and not self.available
+
+    def _connection_kwargs(self) -> dict:
+        return {
+            "host": self.host, "port": self.port, "db": self.db, "decode_responses": True,
+            "socket_connect_timeout": REDIS_CONNECT_TIMEOUT, "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        }
+
+    def on_change(self, callback: Callable) -> None:
+        """callback(client or None), called from the probe thread on every switch."""
+        self._callbacks.append(callback)
+
+    def start(self, wait: float = REDIS_CONNECT_TIMEOUT):
+        """Build the pool and start probing; returns the client if Redis answered within `wait` seconds."""
+        if self.started:
+            return self.client if self.available else None
+        self.started = True
+        if not self.enabled:
+            return None
+        if self.client is None:
+            try:
+                import redis as redis_py
+            except ImportError:
+                logger.warning("redis is not installed; using the in-memory backends")
+                return None
+            self.client = redis_py.Redis(connection_pool=redis_py.ConnectionPool(**self._connection_kwargs()))
+        self._stopped.clear()
+        self._prober = threading.Thread(target=self._probe_loop, name="redis-health", daemon=True)
+        self._prober.start()
+        self._first_probe.wait(wait)
+        return self.client if self.available else None
+
+    def probe(self) -> bool:
+        """Ping Redis once and switch backends if its state changed."""
+        try:
+            self.client.ping()
+        except Exception as exc:
+            self._set_available(False, f"{type(exc).__name__}: {exc}")
+        else:
+            self._set_available(True)
+        return self.available
+
+    def _probe_loop(self) -> None:
+        while True:
+            self.probe()
+            self._first_probe.set()
+            if self._stopped.wait(REDIS_HEALTH_INTERVAL):
+                return
+
+    def mark_down(self, error: Optional[str] = None) -> None:
+        """Switch to the in-memory backends now; the probe switches back when Redis answers."""
+        if self.started and self.available:
+            self._set_available(False, error)
+
+    def _set_available(self, available: bool, error: Optional[str] = None) -> None:
+        with self._lock:
+            if error is not None:
+                self.last_error = error
+            if available == self.available:
+                return
+            self.available = available
+            self.switches += 1
+            if available:
+                logger.warning("Redis at %s:%s is reachable; switching to Redis", self.host, self.port)
+            else:
+                logger.warning("Redis at %s:%s is unavailable (%s); using the in-memory backends", self.host, self.port, error)
+            for callback in self._callbacks:
+                try:
+                    callback(self.client if available else None)
+                except Exception:
+                    logger.exception("Redis backend switch callback failed")
+                    if available:
+                        # Back everyone out to memory; the next probe tries again
+                        self.available = False
+                        for other in self._callbacks:
+                            try:
+                                other(None)
+                            except Exception:
+                                logger.exception("Redis backend switch callback failed")
+                        return
+
+    def async_client(self):
+        """Shared redis.asyncio client (created on first use, in the serving loop)."""
+        if self._async_client is None:
+            import redis.asyncio as aredis_py
+            # Blocking pool: past REDIS_MAX_CONNECTIONS callers wait for a free connection instead of failing
+            pool = aredis_py.BlockingConnectionPool(
+                max_connections=REDIS_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT, **self._connection_kwargs(),
+            )
+            self._async_client = aredis_py.Redis(connection_pool=pool)
+        return self._async_client
+
+    async def close_async(self) -> None:
+        client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.aclose()
+            await client.connection_pool.disconnect()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self._stopped.set()
+        # Disconnecting first also unblocks a probe stuck waiting on a hung server
+        if self.client is not None and hasattr(self.client, "connection_pool"):
+            self.client.connection_pool.disconnect()
+        if self._prober is not None:
+            self._prober.join(timeout)
+            self._prober = None
+        self.started = False
+        self._first_probe.clear()
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "available": self.available,
+            "switches": self.switches,
+            "last_error": self.last_error,
+        }
+
+connection = RedisConnection()
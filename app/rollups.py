@@ -0,0 +1,355 @@
+# app/rollups.py
+"""
+Pre-aggregated view counts so analytics never scan media_view_logs.
+
+- media_view_totals: lifetime views and unique IPs per media
+- media_view_daily: views per media per day
+- media_viewer_ips: the distinct (media, IP) pairs backing unique_ips
+- media_view_daily_ips: raw views past the retention window, one row per media, day and IP
+
+`apply_views` runs inside the same transaction as the raw insert, so the
+rollups commit (or roll back) together with the views they count.
+
+Rebuild from the raw log (and whatever retention compacted) with:
+
+    python -m app.rollups rebuild [--media-id ID]
+
+Apply the retention policy (VIEW_LOG_RETENTION_DAYS) with:
+
+    python -m app.rollups compact [--days N]
+"""
+import argparse
+import os
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from time import sleep
+from typing import Dict, List, Optional
+
+from sqlalchemy import Date, Integer, delete, func, literal_column, select, union_all, insert as sa_insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import DropTable
+
+from . import models, database, viewlog
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Raw views older than this many days are compacted by `compact`; 0 keeps them forever
+VIEW_LOG_RETENTION_DAYS = int(os.getenv("VIEW_LOG_RETENTION_DAYS", 0))
+# Log ids per compaction transaction; each holds the (SQLite) writer lock only that long
+VIEW_LOG_COMPACT_BATCH = int(os.getenv("VIEW_LOG_COMPACT_BATCH", 20000))
+VIEW_LOG_COMPACT_PAUSE = float(os.getenv("VIEW_LOG_COMPACT_PAUSE", 0.01))
+
+# Upsert-capable INSERT per dialect; database.check_dialect rejects any other at startup
+_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+def _insert(db: Session, model):
+    return _INSERTS[db.get_bind().dialect.name](model)
+
+def apply_views(db: Session, rows: List[Dict]) -> Dict[int, Dict]:
+    """
+    Fold freshly inserted view rows into the rollup tables (caller commits).
+
+    Returns the post-update counters for every touched media, read back with
+    RETURNING: {media_id: {"total_views": n, "views_per_day": {"YYYY-MM-DD": n}}}.
+    These are absolute values, so consumers can merge them with max() in any order.
+    """
+    if not rows:
+        return {}
+    pairs = {(r["media_id"], r["viewed_by_ip"]) for r in rows}
+    ips = _insert(db, models.MediaViewerIP).on_conflict_do_nothing()
+    inserted = db.execute(
+        ips.returning(models.MediaViewerIP.media_id),
+        [{"media_id": m, "viewed_by_ip": ip} for m, ip in pairs],
+    ).scalars().all()
+    new_ips = Counter(inserted)
+
+    totals = Counter(r["media_id"] for r in rows)
+    upsert = _insert(db, models.MediaViewTotal)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[models.MediaViewTotal.media_id],
+        set_={
+            "total_views": models.MediaViewTotal.total_views + upsert.excluded.total_views,
+            "unique_ips": models.MediaViewTotal.unique_ips + upsert.excluded.unique_ips,
+        },
+    )
+    counts = {
+        media_id: {"total_views": total, "views_per_day": {}}
+        for media_id, total in db.execute(
+            upsert.returning(models.MediaViewTotal.media_id, models.MediaViewTotal.total_views),
+            [{"media_id": m, "total_views": n, "unique_ips": new_ips.get(m, 0)} for m, n in totals.items()],
+        )
+    }
+
+    daily = Counter((r["media_id"], r["timestamp"].date()) for r in rows)
+    upsert = _insert(db, models.MediaViewDaily)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[models.MediaViewDaily.media_id, models.MediaViewDaily.day],
+        set_={"views": models.MediaViewDaily.views + upsert.excluded.views},
+    )
+    for media_id, day, views in db.execute(
+        upsert.returning(models.MediaViewDaily.media_id, models.MediaViewDaily.day, models.MediaViewDaily.views),
+        [{"media_id": m, "day": d, "views": n} for (m, d), n in daily.items()],
+    ):
+        counts[media_id]["views_per_day"][day.isoformat()] = views
+    return counts
+
+def read_views(db: Session, media_id: int, start: Optional[date] = None, end: Optional[date] = None) -> Dict:
+    """
+    total_views and views_per_day for one media from the rollups, optionally limited to
+    the inclusive day range [start, end]: one totals row plus one row per active day.
+    """
+    daily = models.MediaViewDaily
+    query = db.query(daily.day, daily.views).filter(daily.media_id == media_id)
+    if start is not None:
+        query = query.filter(daily.day >= start)
+    if end is not None:
+        query = query.filter(daily.day <= end)
+    views_per_day = {day.isoformat(): views for day, views in query.order_by(daily.day)}
+
+    if start is None and end is None:
+        total_views = (
+            db.query(models.MediaViewTotal.total_views)
+            .filter(models.MediaViewTotal.media_id == media_id)
+            .scalar()
+        ) or 0
+    else:
+        total_views = sum(views_per_day.values())
+    return {"total_views": total_views, "views_per_day": views_per_day}
+
+def viewer_days(db: Session, media_ids: Optional[List[int]] = None, start: Optional[date] = None, end: Optional[date] = None):
+    """
+    Subquery of (media_id, viewed_by_ip, day, views) over the inclusive day range
+    [start, end]: every raw view still in the log (views=1) plus the rows retention
+    compacted into media_view_daily_ips. Anything that needs per-IP detail reads this,
+    so compaction is invisible to it.
+    """
+    raw = viewlog.raw_views(db, media_ids, start, end)
+    compacted = models.MediaViewDailyIP
+    conditions = _day_range(compacted.day, start, end)
+    if media_ids is not None:
+        conditions.append(compacted.media_id.in_(media_ids))
+    return union_all(
+        select(
+            raw.c.media_id,
+            raw.c.viewed_by_ip,
+            func.date(raw.c.timestamp, type_=Date).label("day"),
+            literal_column("1", Integer).label("views"),
+        ),
+        select(compacted.media_id, compacted.viewed_by_ip, compacted.day, compacted.views).where(*conditions),
+    ).subquery("viewer_days")
+
+def _viewer_ips(db: Session, media_ids: List[int], start: Optional[date], end: Optional[date]):
+    """The (media_id, viewed_by_ip) columns of `viewer_days`, without computing the day of every raw row."""
+    raw = viewlog.raw_views(db, media_ids, start, end)
+    compacted = models.MediaViewDailyIP
+    return union_all(
+        select(raw.c.media_id, raw.c.viewed_by_ip),
+        select(compacted.media_id, compacted.viewed_by_ip)
+        .where(compacted.media_id.in_(media_ids), *_day_range(compacted.day, start, end)),
+    ).subquery("viewer_ips")
+
+def count_unique_ips(db: Session, media_id: int, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """Exact unique IPs: the maintained lifetime counter, or a DISTINCT over the raw and compacted views for a day range."""
+    if start is None and end is None:
+        return (
+            db.query(models.MediaViewTotal.unique_ips)
+            .filter(models.MediaViewTotal.media_id == media_id)
+            .scalar()
+        ) or 0
+    src = _viewer_ips(db, [media_id], start, end)
+    return db.execute(select(func.count(src.c.viewed_by_ip.distinct()))).scalar() or 0
+
+def read_analytics(db: Session, media_id: int, start: Optional[date] = None, end: Optional[date] = None) -> Dict:
+    """Analytics for one media with an exact unique-IP count."""
+    analytics = read_views(db, media_id, start, end)
+    analytics["unique_ips"] = count_unique_ips(db, media_id, start, end)
+    return analytics
+
+GRANULARITIES = ("hour", "day", "week")
+
+def _bucket(db: Session, granularity: str, ts=None):
+    """
+    SQL expression for the bucket a view falls in, rendered as hour "YYYY-MM-DDTHH:00"
+    (from the raw timestamp column `ts`) or day/week start "YYYY-MM-DD".
+    """
+    dialect = db.get_bind().dialect.name
+    if granularity == "hour":
+        if dialect == "postgresql":
+            return func.to_char(func.date_trunc("hour", ts), 'YYYY-MM-DD"T"HH24:00')
+        return func.strftime("%Y-%m-%dT%H:00", ts)
+    day = models.MediaViewDaily.day
+    if granularity == "day":
+        return day
+    # Weeks start on Monday (ISO 8601)
+    if dialect == "postgresql":
+        return func.date_trunc("week", day)
+    return func.date(day, "weekday 0", "-6 days")
+
+def _day_range(column, start: Optional[date], end: Optional[date]) -> list:
+    return ([column >= start] if start is not None else []) + ([column <= end] if end is not None else [])
+
+def read_buckets(
+    db: Session, media_ids: List[int], start: Optional[date] = None, end: Optional[date] = None, granularity: str = "day",
+) -> Dict[int, Dict[str, int]]:
+    """
+    Views per media per bucket over the inclusive day range [start, end], as one
+    GROUP BY media_id, bucket query: {media_id: {bucket: views}}, buckets in order.
+    Days and weeks come from media_view_daily; hours need the raw log (served by
+    its (media_id, timestamp) index), so days already compacted by retention have
+    no hour buckets.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}")
+    if granularity == "hour":
+        raw = viewlog.raw_views(db, media_ids, start, end)
+        bucket = _bucket(db, granularity, raw.c.timestamp).label("bucket")
+        media_col, views = raw.c.media_id, func.count()
+        conditions = []
+    else:
+        bucket = _bucket(db, granularity).label("bucket")
+        daily = models.MediaViewDaily
+        media_col, views = daily.media_id, func.sum(daily.views)
+        conditions = _day_range(daily.day, start, end)
+    query = (
+        select(media_col, bucket, views)
+        .where(media_col.in_(media_ids), *conditions)
+        .group_by(media_col, bucket)
+        .order_by(bucket)
+    )
+    result: Dict[int, Dict[str, int]] = {media_id: {} for media_id in media_ids}
+    for media_id, key, views in db.execute(query):
+        if isinstance(key, datetime):
+            key = key.date()
+        result[media_id][key if isinstance(key, str) else key.isoformat()] = int(views)
+    return result
+
+def active_days(db: Session, media_ids: List[int], start: Optional[date] = None, end: Optional[date] = None) -> Dict[int, List[date]]:
+    """Days with at least one view per media within [start, end], from the daily rollup."""
+    daily = models.MediaViewDaily
+    result: Dict[int, List[date]] = {media_id: [] for media_id in media_ids}
+    for media_id, day in db.execute(
+        select(daily.media_id, daily.day).where(daily.media_id.in_(media_ids), *_day_range(daily.day, start, end))
+    ):
+        result[media_id].append(day)
+    return result
+
+def count_unique_ips_many(db: Session, media_ids: List[int], start: Optional[date] = None, end: Optional[date] = None) -> Dict[int, int]:
+    """Exact unique IPs per media over [start, end] with one grouped DISTINCT over the raw and compacted views."""
+    if start is None and end is None:
+        totals = models.MediaViewTotal
+        rows = db.execute(select(totals.media_id, totals.unique_ips).where(totals.media_id.in_(media_ids)))
+    else:
+        src = _viewer_ips(db, media_ids, start, end)
+        rows = db.execute(
+            select(src.c.media_id, func.count(src.c.viewed_by_ip.distinct())).group_by(src.c.media_id)
+        )
+    counts = dict.fromkeys(media_ids, 0)
+    counts.update({media_id: n for media_id, n in rows})
+    return counts
+
+def rebuild(db: Session, media_id: Optional[int] = None) -> None:
+    """
+    Recompute the rollups from the raw log and the compacted rows in one transaction.
+    Run it with ingestion paused (or accept that views landing mid-rebuild may be missed).
+    """
+    src = viewer_days(db, [media_id] if media_id is not None else None)
+    for model in (models.MediaViewTotal, models.MediaViewDaily, models.MediaViewerIP):
+        stmt = delete(model)
+        if media_id is not None:
+            stmt = stmt.where(model.media_id == media_id)
+        db.execute(stmt)
+
+    db.execute(sa_insert(models.MediaViewerIP).from_select(
+        ["media_id", "viewed_by_ip"],
+        select(src.c.media_id, src.c.viewed_by_ip).distinct(),
+    ))
+    db.execute(sa_insert(models.MediaViewDaily).from_select(
+        ["media_id", "day", "views"],
+        select(src.c.media_id, src.c.day, func.sum(src.c.views)).group_by(src.c.media_id, src.c.day),
+    ))
+    db.execute(sa_insert(models.MediaViewTotal).from_select(
+        ["media_id", "total_views", "unique_ips"],
+        select(src.c.media_id, func.sum(src.c.views), func.count(src.c.viewed_by_ip.distinct())).group_by(src.c.media_id),
+    ))
+    db.commit()
+
+def compact(db: Session, before: date, batch_size: int = VIEW_LOG_COMPACT_BATCH) -> Dict:
+    """
+    Retention: fold raw views from before `before` into media_view_daily_ips and remove
+    them from the log. Works through each table in ranges of `batch_size` ids; a batch
+    is folded and deleted in one short transaction, so on SQLite the writer lock is held
+    per batch and ingestion interleaves with it instead of waiting out the whole run.
+    A partition that lies entirely before the cutoff is dropped once it has been
+    emptied. media_view_daily and media_view_totals already count these views, so
+    analytics read the same before and after; only hour buckets for the compacted days
+    are gone. Safe to interrupt and re-run: every batch commits its fold and delete together.
+
+    The day's view count is already in media_view_daily; what compaction keeps is the
+    per-IP detail that exact unique-IP ranges, sketch hydration and `rebuild` cannot be
+    answered without. A compacted row drops the id, the timestamp and the log's indexes,
+    so even when every view comes from a different IP the days take about a quarter of
+    the space, and repeat viewers collapse into one row per media, day and IP.
+
+    Returns {"views": rows removed from the log, "dropped": partition names}.
+    """
+    boundary = datetime.combine(before, time.min)
+    compacted = models.MediaViewDailyIP
+    result = {"views": 0, "dropped": []}
+    for table in viewlog.tables(db, end=before - timedelta(days=1)):
+        # Rows written after this point are newer than the cutoff (or land in a later run)
+        first, last = db.execute(select(func.min(table.c.id), func.max(table.c.id))).one()
+        db.commit()
+        for low in range(first, last + 1, batch_size) if first is not None else ():
+            batch = (table.c.id >= low, table.c.id < low + batch_size, table.c.timestamp < boundary)
+            day = func.date(table.c.timestamp)
+            upsert = _insert(db, compacted).from_select(
+                ["media_id", "day", "viewed_by_ip", "views"],
+                select(table.c.media_id, day, table.c.viewed_by_ip, func.count())
+                .where(*batch)
+                .group_by(table.c.media_id, day, table.c.viewed_by_ip),
+            )
+            db.execute(upsert.on_conflict_do_update(
+                index_elements=[compacted.media_id, compacted.day, compacted.viewed_by_ip],
+                set_={"views": compacted.views + upsert.excluded.views},
+            ))
+            result["views"] += db.execute(delete(table).where(*batch)).rowcount
+            db.commit()
+            # Let writers queued on the writer connection in before the next batch takes it
+            sleep(VIEW_LOG_COMPACT_PAUSE)
+        month = viewlog.partition_month(table.name)
+        # A backdated view may have landed in the partition meanwhile: keep it for the next run
+        if month is not None and viewlog.next_month(month) <= before and db.execute(select(table.c.id).limit(1)).first() is None:
+            db.execute(DropTable(table))
+            viewlog.forget_partition(db, table.name)
+            result["dropped"].append(table.name)
+            db.commit()
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain analytics rollup tables")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmd = sub.add_parser("rebuild", help="Repopulate rollups from media_view_logs")
+    cmd.add_argument("--media-id", type=int, default=None, help="Only rebuild this media")
+    cmd = sub.add_parser("compact", help="Compact and drop raw views past the retention window")
+    cmd.add_argument("--days", type=int, default=VIEW_LOG_RETENTION_DAYS, help="Keep this many days of raw views")
+    args = parser.parse_args(argv)
+
+    if args.command == "compact" and args.days <= 0:
+        parser.error("set VIEW_LOG_RETENTION_DAYS or pass --days N (N > 0)")
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        if args.command == "compact":
+            before = datetime.utcnow().date() - timedelta(days=args.days)
+            result = compact(db, before)
+            print(f"Compacted {result['views']} views from before {before}, dropped {len(result['dropped'])} partitions")
+            return
+        rebuild(db, args.media_id)
+    finally:
+        db.close()
+    print(f"Rebuilt rollups for {'media ' + str(args.media_id) if args.media_id is not None else 'all media'}")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 # app/schemas.py
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
-from typing import Dict
+from pydantic import BaseModel, EmailStr, Field
+from datetime import date, datetime
+from typing import Dict, List, Optional
 
 # Admin User Schemas
 class AdminUserCreate(BaseModel):
@@ -33,3 +33,33 @@ class MediaAnalyticsResponse(BaseModel):
     total_views: int
     unique_ips: int
     views_per_day: Dict[str, int]
+
+class MediaBucketedAnalytics(BaseModel):
+    media_id: int
+    total_views: int
+    unique_ips: int
+    views: Dict[str, int]
+
+class BatchAnalyticsResponse(BaseModel):
+    model_config = {"populate_by_name": True}
+
+    granularity: str
+    start: Optional[date] = Field(None, alias="from")
+    end: Optional[date] = Field(None, alias="to")
+    media: List[MediaBucketedAnalytics]
+
+# Bulk view ingestion: one ViewRecord per NDJSON line
+class ViewRecord(BaseModel):
+    media_id: int
+    ip: str = Field(min_length=1)
+    timestamp: Optional[datetime] = None
+
+class ViewRecordResult(BaseModel):
+    line: int
+    status: str  # "accepted", "invalid", "unknown_media" or "rate_limited"
+    detail: Optional[str] = None
+
+class ViewBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[ViewRecordResult]
@@ -0,0 +1,164 @@
+# app/viewlog.py
+"""
+Where raw view rows live.
+
+With VIEW_LOG_PARTITIONING=monthly every view is written to the table for its
+calendar month, media_view_logs_YYYY_MM (same columns and indexes as
+media_view_logs), created on first write. media_view_logs itself keeps whatever
+was written before partitioning was switched on. Retention then drops whole
+months with DROP TABLE instead of deleting rows one by one (see
+`rollups.compact`).
+
+Readers never name a table: `tables` lists the ones that can hold views in a day
+range (media_view_logs plus the overlapping partitions) and `raw_views` unions
+them, so partitions from an earlier monthly run are read even after switching
+back to "none". Past a few hundred tables the union is nested, since SQLite
+caps a compound SELECT at 500 terms.
+"""
+import os
+import re
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, insert, select, text, union_all
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from . import models
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "none" writes every view to media_view_logs, "monthly" to one table per month
+VIEW_LOG_PARTITIONING = os.getenv("VIEW_LOG_PARTITIONING", "none")
+
+LEGACY_TABLE = models.MediaViewLog.__tablename__
+_PARTITION_RE = re.compile(rf"^{LEGACY_TABLE}_(\d{{4}})_(\d{{2}})$")
+
+_metadata = MetaData()
+_lock = threading.Lock()
+# Partitions this process has created, per database; only used to skip the DDL on writes
+_created: Dict[str, set] = {}
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+def next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+def partition_name(day: date) -> str:
+    return f"{LEGACY_TABLE}_{day.year:04d}_{day.month:02d}"
+
+def partition_month(name: str) -> Optional[date]:
+    """First day of the month a partition holds, or None for any other table name."""
+    match = _PARTITION_RE.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+def partition_table(name: str) -> Table:
+    """Table object for a partition, a copy of media_view_logs under another name."""
+    with _lock:
+        table = _metadata.tables.get(name)
+        if table is not None:
+            return table
+        table = Table(
+            name,
+            _metadata,
+            Column("id", Integer, primary_key=True),
+            Column("media_id", Integer, ForeignKey(models.MediaAsset.id), nullable=False),
+            Column("viewed_by_ip", String, nullable=False),
+            Column("timestamp", DateTime, default=datetime.utcnow),
+        )
+        for index in models.MediaViewLog.__table__.indexes:
+            Index(index.name.replace(LEGACY_TABLE, name, 1), *(table.c[c.name] for c in index.columns))
+        return table
+
+def _database_key(db: Session) -> str:
+    return str(db.get_bind().engine.url)
+
+def partitions(db: Session) -> List[str]:
+    """Names of the partitions that exist in the database, oldest first."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        query = "SELECT tablename FROM pg_tables WHERE schemaname = current_schema() AND tablename LIKE :prefix"
+    else:
+        query = "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :prefix"
+    names = db.execute(text(query), {"prefix": f"{LEGACY_TABLE}_%"}).scalars()
+    return sorted(name for name in names if _PARTITION_RE.match(name))
+
+def tables(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> List[Table]:
+    """
+    Every table that can hold views in the inclusive day range [start, end]:
+    media_view_logs, then the partitions whose month overlaps the range.
+    """
+    found = [models.MediaViewLog.__table__]
+    for name in partitions(db):
+        month = partition_month(name)
+        if start is not None and next_month(month) <= start:
+            continue
+        if end is not None and month > end:
+            continue
+        found.append(partition_table(name))
+    return found
+
+# SQLite rejects a compound SELECT of more than 500 terms (SQLITE_MAX_COMPOUND_SELECT)
+_MAX_UNION_TERMS = 400
+
+def _union_all(branches: list):
+    """UNION ALL of `branches`, nested in groups of subqueries so no single compound SELECT exceeds _MAX_UNION_TERMS."""
+    while len(branches) > _MAX_UNION_TERMS:
+        groups = [branches[i:i + _MAX_UNION_TERMS] for i in range(0, len(branches), _MAX_UNION_TERMS)]
+        branches = [select(*(union_all(*group) if len(group) > 1 else group[0]).subquery().c) for group in groups]
+    return branches[0] if len(branches) == 1 else union_all(*branches)
+
+def raw_views(
+    db: Session,
+    media_ids: Optional[List[int]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    sources: Optional[List[Table]] = None,
+):
+    """
+    Subquery over the raw views (id, media_id, viewed_by_ip, timestamp) of the given media
+    in [start, end], from `sources` or else every table that can hold them. The filters
+    are applied in every branch of the UNION ALL, so each one is served by its own
+    (media_id, timestamp) index.
+    """
+    branches = []
+    for table in sources if sources is not None else tables(db, start, end):
+        conditions = []
+        if media_ids is not None:
+            conditions.append(table.c.media_id.in_(media_ids))
+        if start is not None:
+            conditions.append(table.c.timestamp >= datetime.combine(start, time.min))
+        if end is not None:
+            conditions.append(table.c.timestamp < datetime.combine(end + timedelta(days=1), time.min))
+        branches.append(select(table.c.id, table.c.media_id, table.c.viewed_by_ip, table.c.timestamp).where(*conditions))
+    return _union_all(branches).subquery("views")
+
+def ensure_partition(db: Session, day: date) -> Table:
+    """Create the partition for `day`'s month if it does not exist yet (caller commits)."""
+    table = partition_table(partition_name(day))
+    created = _created.setdefault(_database_key(db), set())
+    # Past months may have been dropped by retention since we created them
+    if table.name in created and month_start(day) >= month_start(datetime.utcnow().date()):
+        return table
+    db.execute(CreateTable(table, if_not_exists=True))
+    for index in sorted(table.indexes, key=lambda ix: ix.name):
+        db.execute(CreateIndex(index, if_not_exists=True))
+    created.add(table.name)
+    return table
+
+def forget_partition(db: Session, name: str) -> None:
+    _created.get(_database_key(db), set()).discard(name)
+
+def insert_views(db: Session, rows: List[Dict]) -> None:
+    """Insert view rows into the table their timestamp belongs to (caller commits)."""
+    if VIEW_LOG_PARTITIONING != "monthly":
+        db.execute(insert(models.MediaViewLog), rows)
+        return
+    by_month: Dict[date, List[Dict]] = {}
+    for r in rows:
+        by_month.setdefault(month_start(r["timestamp"].date()), []).append(r)
+    for month, month_rows in sorted(by_month.items()):
+        db.execute(insert(ensure_partition(db, month)), month_rows)
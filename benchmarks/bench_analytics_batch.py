@@ -0,0 +1,105 @@
+# benchmarks/bench_analytics_batch.py
+"""
+One batch analytics call vs N single-media calls, the way a dashboard loads.
+
+    python -m benchmarks.bench_analytics_batch --media 50 --views 200000 --rounds 20 [--exact]
+
+Seeds views over 90 days for `--media` assets, then times a dashboard load as
+N x GET /media/{id}/analytics?from=&to= against one
+GET /media/analytics?ids=...&from=&to=&granularity=day, cold (response cache
+cleared) and warm. Runs against a throwaway SQLite file with the in-process cache,
+so unique_ips comes from pure-Python sketches unless --exact is given.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+_tmpdir = tempfile.mkdtemp(prefix="bench_batch_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ.setdefault("PASSWORD_WORKERS", "0")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import auth, database, ingest, media, models  # noqa: E402
+from app.main import app  # noqa: E402
+
+START = datetime(2025, 1, 1)
+
+def seed(media_count, views):
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    assets = [models.MediaAsset(title=f"bench {i}", type="video", file_url="http://example.com/x.mp4") for i in range(media_count)]
+    user = models.AdminUser(email="bench@example.com", hashed_password="x")
+    db.add_all(assets + [user])
+    db.commit()
+    ids = [a.id for a in assets]
+    rng = random.Random(42)
+    for offset in range(0, views, 20000):
+        ingest.write_views(db, [
+            {
+                "media_id": rng.choice(ids),
+                "viewed_by_ip": f"10.0.{rng.randrange(256)}.{rng.randrange(256)}",
+                "timestamp": START + timedelta(seconds=rng.randrange(90 * 86400)),
+            }
+            for _ in range(min(20000, views - offset))
+        ], notify=False)
+    token = auth.create_access_token({"id": user.id, "email": user.email})
+    db.close()
+    return ids, {"Authorization": f"Bearer {token}"}
+
+def clear_caches():
+    # Response caches only; the unique-viewer sketches stay hydrated as in a running server
+    media._inmemory_cache.clear()
+
+def time_round(fn, rounds, cold):
+    timings = []
+    for _ in range(rounds):
+        if cold:
+            clear_caches()
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--media", type=int, default=50)
+    parser.add_argument("--views", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--exact", action="store_true", help="Exact unique IPs instead of HyperLogLog")
+    args = parser.parse_args()
+
+    # In-process caches only, so "cold" rounds are really cold
+    media._USING_REDIS = False
+    ids, headers = seed(args.media, args.views)
+    client = TestClient(app)
+    params = {"from": date(2025, 2, 1).isoformat(), "to": date(2025, 2, 28).isoformat(), "exact": args.exact}
+
+    def singles():
+        for media_id in ids:
+            assert client.get(f"/media/{media_id}/analytics", params=params, headers=headers).status_code == 200
+
+    def batch():
+        r = client.get("/media/analytics", params={**params, "ids": ids, "granularity": "day"}, headers=headers)
+        assert r.status_code == 200
+
+    # Warm the principal cache and the sketches before timing
+    singles()
+    batch()
+    unique = "exact" if args.exact else "HyperLogLog"
+    print(f"Dashboard of {args.media} media, {args.views} views, 28-day range, {unique} uniques, median of {args.rounds} loads")
+    for name, fn, cold in (
+        (f"{args.media} single calls, cold", singles, True),
+        ("1 batch call, cold", batch, True),
+        (f"{args.media} single calls, warm", singles, False),
+        ("1 batch call, warm", batch, False),
+    ):
+        p50, worst = time_round(fn, args.rounds, cold)
+        print(f"  {name:<30} p50 {p50:>8.1f} ms  max {worst:>8.1f} ms")
+
+if __name__ == "__main__":
+    main()
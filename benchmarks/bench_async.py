@@ -0,0 +1,108 @@
+# benchmarks/bench_async.py
+"""
+p50/p99 latency of the media routes in sync vs async IO mode at high concurrency.
+
+    python -m benchmarks.bench_async --requests 4000 --concurrency 256 [--reads-only]
+
+Each mode runs in its own process (APP_IO_MODE is read at import) against a
+throwaway SQLite file, driving the ASGI app in-process with httpx. Sync routes
+share AnyIO's threadpool (40 threads), which is the cap async mode removes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def drive(requests, concurrency, reads_only):
+    import httpx
+    from app import auth, database, models
+    from app.main import app
+
+    # Startup (schema, Redis) and shutdown as under uvicorn
+    async with app.router.lifespan_context(app):
+        db = database.SessionLocal()
+        user = models.AdminUser(email="bench@example.com", hashed_password="x")
+        media_item = models.MediaAsset(title="bench", type="video", file_url="http://example.com/x.mp4")
+        db.add_all([user, media_item])
+        db.commit()
+        headers = {"Authorization": f"Bearer {auth.create_access_token({'id': user.id, 'email': user.email})}"}
+        paths = [
+            ("GET", f"/media/{media_item.id}/analytics"),
+            ("GET", f"/media/{media_item.id}/stream-url"),
+            ("POST", f"/media/{media_item.id}/view"),
+        ]
+        if reads_only:
+            paths = paths[:2]
+        db.close()
+
+        latencies, errors = [], 0
+        semaphore = asyncio.Semaphore(concurrency)
+        # Unhandled errors (e.g. SQLite "database is locked") count as failed requests
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def one(i):
+                nonlocal errors
+                method, path = paths[i % len(paths)]
+                async with semaphore:
+                    started = time.perf_counter()
+                    r = await client.request(method, path, headers=headers)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    errors += r.status_code != 200
+
+            await one(0)  # warm caches and pools
+            latencies.clear()
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests)))
+            elapsed = time.perf_counter() - started
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.5),
+        "p99_ms": percentile(latencies, 0.99),
+        "errors": errors,
+    }
+
+def run_mode(mode, args):
+    env = dict(
+        os.environ,
+        APP_IO_MODE=mode,
+        DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_async_'), 'bench.db')}",
+        RATE_LIMITS="media_view:ip=100000000/60",
+        PASSWORD_WORKERS="0",
+    )
+    command = [sys.executable, "-m", "benchmarks.bench_async", "--child",
+               "--requests", str(args.requests), "--concurrency", str(args.concurrency)]
+    if args.reads_only:
+        command.append("--reads-only")
+    proc = subprocess.run(command, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"{mode} run failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--reads-only", action="store_true", help="Skip POST /view (SQLite serializes writers)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(drive(args.requests, args.concurrency, args.reads_only))))
+        return
+
+    routes = "analytics / stream-url" + ("" if args.reads_only else " / view")
+    print(f"{args.requests} requests ({routes}), concurrency {args.concurrency}")
+    for mode in ("sync", "async"):
+        r = run_mode(mode, args)
+        print(f"  {mode:<6} {r['rps']:>8.0f} req/s  p50 {r['p50_ms']:>7.1f} ms  p99 {r['p99_ms']:>7.1f} ms  errors {r['errors']}")
+
+if __name__ == "__main__":
+    main()
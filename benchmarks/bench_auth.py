@@ -0,0 +1,65 @@
+# benchmarks/bench_auth.py
+"""
+Per-request auth overhead of the protected-route dependency.
+
+    python -m benchmarks.bench_auth --requests 5000
+
+Compares the original path (JWT decode + AdminUser query every request)
+with the cached principal lookup and with trusted claims for read-only routes.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="bench_auth_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+from jose import jwt  # noqa: E402
+
+from app import auth, database, models  # noqa: E402
+
+def original_get_current_user(credentials):
+    payload = jwt.decode(credentials.credentials, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    db = database.SessionLocal()
+    try:
+        return db.query(models.AdminUser).filter(models.AdminUser.id == payload["id"]).first()
+    finally:
+        db.close()
+
+def trusted_claims(credentials):
+    auth.AUTH_TRUST_CLAIMS_FOR_READS = True
+    return auth.get_current_user_readonly(credentials)
+
+def measure(fn, credentials, n):
+    fn(credentials)  # warm caches
+    start = time.perf_counter()
+    for _ in range(n):
+        fn(credentials)
+    return (time.perf_counter() - start) / n * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    user = models.AdminUser(email="bench@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    token = auth.create_access_token({"id": user.id, "email": user.email})
+    db.close()
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    results = {
+        "decode + DB lookup (before)": measure(original_get_current_user, credentials, args.requests),
+        "cached token + principal": measure(auth.get_current_user, credentials, args.requests),
+        "trusted claims (read-only)": measure(trusted_claims, credentials, args.requests),
+    }
+    for name, micros in results.items():
+        print(f"  {name:<30} {micros:>9.1f} us/request")
+
+if __name__ == "__main__":
+    main()
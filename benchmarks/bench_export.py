@@ -0,0 +1,88 @@
+# benchmarks/bench_export.py
+"""
+Throughput, output size and memory of the view export.
+
+    python -m benchmarks.bench_export --views 1000000 [--chunk-rows 50000]
+
+Seeds a throwaway SQLite file, then exports every view as CSV and as Parquet
+(if pyarrow is installed), each in its own process so the peak RSS reported is
+that export's alone. A constant peak across --views sizes is the point: rows
+are streamed in chunks of --chunk-rows.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def seed(url, views, media=1000, chunk=50000):
+    from sqlalchemy import create_engine, insert
+    from app import models
+
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(models.MediaAsset), [
+            {"title": f"bench {i}", "type": "video", "file_url": "http://example.com/x.mp4"} for i in range(media)
+        ])
+    for offset in range(0, views, chunk):
+        with engine.begin() as conn:
+            conn.execute(insert(models.MediaViewLog), [
+                {
+                    "media_id": 1 + rng.randrange(media),
+                    "viewed_by_ip": f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}",
+                    "timestamp": datetime(2025, 1, 1) + timedelta(seconds=rng.randrange(90 * 86400)),
+                }
+                for _ in range(min(chunk, views - offset))
+            ])
+
+def child(fmt, output, chunk_rows):
+    from app import export
+
+    started = time.perf_counter()
+    export.main(["--format", fmt, "-o", output, "--chunk-rows", str(chunk_rows)])
+    return {
+        "seconds": time.perf_counter() - started,
+        "bytes": os.path.getsize(output),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--views", type=int, default=1000000)
+    parser.add_argument("--chunk-rows", type=int, default=50000)
+    parser.add_argument("--child", nargs=2, metavar=("FORMAT", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(*args.child, args.chunk_rows)))
+        return
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_export_")
+    url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    seed(url, args.views)
+    # Mapped and cached database pages count towards RSS: no mmap and SQLite's default 2 MB
+    # page cache, so the peak is the exporter's own memory
+    env = dict(os.environ, DATABASE_URL=url, SQLITE_MMAP_SIZE="0", SQLITE_CACHE_SIZE_KB="2000")
+    print(f"Exporting {args.views} views in chunks of {args.chunk_rows}")
+    for fmt in ("csv", "parquet"):
+        command = [sys.executable, "-m", "benchmarks.bench_export", "--chunk-rows", str(args.chunk_rows),
+                   "--child", fmt, os.path.join(tmpdir, f"views.{fmt}")]
+        proc = subprocess.run(command, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"  {fmt:<8} skipped: {proc.stderr.strip().splitlines()[-1]}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(
+            f"  {fmt:<8} {args.views / r['seconds']:>9.0f} rows/s  {r['bytes'] / 1e6:>7.1f} MB"
+            f"  peak RSS {r['peak_rss_mb']:>6.0f} MB"
+        )
+
+if __name__ == "__main__":
+    main()
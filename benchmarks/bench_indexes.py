@@ -0,0 +1,112 @@
+# benchmarks/bench_indexes.py
+"""
+Latency of the raw media_view_logs queries before and after the composite indexes.
+
+    python -m benchmarks.bench_indexes --rows 2000000 --media 1000 [--database-url URL]
+
+Seeds synthetic views into a table without the indexes, times each query for a
+sample of media, applies the migration (python -m app.migrations upgrade) and
+times them again, printing the query plan for both runs. Defaults to a
+throwaway SQLite file so media.db is never touched.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select
+
+from app import migrations, models
+
+DAYS = 90
+
+def seed(engine, rows, media, chunk=100000):
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for index in models.MediaViewLog.__table__.indexes:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+        conn.execute(insert(models.MediaAsset), [
+            {"title": f"bench {i}", "type": "video", "file_url": "http://example.com/x.mp4"} for i in range(media)
+        ])
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    for offset in range(0, rows, chunk):
+        batch = [
+            {
+                # Skewed popularity, like real traffic: a few media get most views
+                "media_id": 1 + min(media - 1, int(rng.paretovariate(1.2)) - 1),
+                "viewed_by_ip": f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}",
+                "timestamp": start + timedelta(seconds=rng.randrange(DAYS * 86400)),
+            }
+            for _ in range(min(chunk, rows - offset))
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(models.MediaViewLog), batch)
+
+def statements(media_id):
+    """The raw-log reads behind analytics: rollup rebuilds, exact ranges (rollups.count_unique_ips), HLL hydration."""
+    log = models.MediaViewLog
+    scoped = log.media_id == media_id
+    return {
+        "views per day (GROUP BY date)": select(func.date(log.timestamp), func.count())
+        .where(scoped).group_by(func.date(log.timestamp)),
+        "lifetime unique IPs (DISTINCT)": select(func.count(log.viewed_by_ip.distinct())).where(scoped),
+        "7-day exact unique IPs": select(func.count(log.viewed_by_ip.distinct()))
+        .where(scoped, log.timestamp >= datetime(2025, 2, 1), log.timestamp < datetime(2025, 2, 8)),
+        "sketch hydration scan": select(log.viewed_by_ip, log.timestamp).where(scoped),
+    }
+
+def plan(conn, stmt):
+    sql = str(stmt.compile(conn.engine, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    return "; ".join(str(row[-1]) for row in conn.exec_driver_sql(prefix + sql))
+
+def measure(engine, sample, repeat):
+    results = {}
+    with engine.connect() as conn:
+        for name in statements(sample[0]):
+            timings = []
+            for _ in range(repeat):
+                for media_id in sample:
+                    started = time.perf_counter()
+                    conn.execute(statements(media_id)[name]).all()
+                    timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (statistics.median(timings), max(timings), plan(conn, statements(sample[0])[name]))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--media", type=int, default=1000)
+    parser.add_argument("--sample", type=int, default=20, help="Media queried per run (most and least viewed mixed)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_indexes_'), 'bench.db')}"
+    engine = create_engine(url)
+    started = time.perf_counter()
+    seed(engine, args.rows, args.media)
+    print(f"Seeded {args.rows} views over {args.media} media in {time.perf_counter() - started:.1f}s")
+
+    # Media 1 is the most viewed; the rest of the sample is spread across the tail
+    sample = [1] + random.Random(7).sample(range(2, args.media + 1), min(args.sample, args.media) - 1)
+    before = measure(engine, sample, args.repeat)
+
+    started = time.perf_counter()
+    migrations.upgrade(engine)
+    print(f"Applied migrations in {time.perf_counter() - started:.1f}s")
+
+    after = measure(engine, sample, args.repeat)
+
+    for name in before:
+        (b50, bmax, bplan), (a50, amax, aplan) = before[name], after[name]
+        print(f"\n{name}")
+        print(f"  without indexes  p50 {b50:>9.2f} ms  max {bmax:>9.2f} ms  plan: {bplan}")
+        print(f"  with indexes     p50 {a50:>9.2f} ms  max {amax:>9.2f} ms  plan: {aplan}")
+
+if __name__ == "__main__":
+    main()
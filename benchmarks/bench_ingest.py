@@ -0,0 +1,93 @@
+# benchmarks/bench_ingest.py
+"""
+Views/sec for the per-request commit path vs the buffered writer.
+
+    python -m benchmarks.bench_ingest --views 5000 --threads 16
+
+Runs against a throwaway SQLite file so media.db is never touched.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+_tmpdir = tempfile.mkdtemp(prefix="bench_ingest_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from app import database, models, ingest  # noqa: E402
+
+def _rows(n):
+    now = datetime.utcnow()
+    return [{"media_id": 1 + i % 10, "viewed_by_ip": f"10.0.{i % 250}.{i % 200}", "timestamp": now} for i in range(n)]
+
+def _drive(rows, threads, handle):
+    chunks = [rows[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        for row in chunk:
+            handle(row)
+
+    pool = [threading.Thread(target=worker, args=(c,)) for c in chunks]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - start
+
+def bench_per_request(rows, threads):
+    lock = threading.Lock()  # SQLite allows one writer; the API serializes the same way through its writer connection
+
+    def handle(row):
+        with lock:
+            db = database.SessionLocal()
+            try:
+                ingest.write_views(db, [row])
+            finally:
+                db.close()
+
+    return _drive(rows, threads, handle)
+
+def bench_buffered(rows, threads, ack):
+    buffer = ingest.ViewBuffer()
+    buffer.start()
+
+    def handle(row):
+        fut = buffer.submit(row, wait=ack == "flush")
+        if ack == "flush":
+            fut.result()
+
+    start = time.perf_counter()
+    _drive(rows, threads, handle)
+    # Include the drain so "enqueue" is charged for the writes it deferred
+    buffer.stop()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--views", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    for i in range(10):
+        db.add(models.MediaAsset(title=f"bench {i}", type="video", file_url="http://example.com/x.mp4"))
+    db.commit()
+    db.close()
+
+    rows = _rows(args.views)
+    results = {
+        "per-request commit": bench_per_request(rows, args.threads),
+        "buffered (ack=flush)": bench_buffered(rows, args.threads, "flush"),
+        "buffered (ack=enqueue, incl. drain)": bench_buffered(rows, args.threads, "enqueue"),
+    }
+
+    print(f"{args.views} views, {args.threads} threads, batch={ingest.VIEW_INGEST_BATCH_SIZE}, flush={ingest.VIEW_INGEST_FLUSH_MS}ms")
+    for name, elapsed in results.items():
+        print(f"  {name:<38} {args.views / elapsed:>10.0f} views/sec  ({elapsed:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/bench_metrics.py
+"""
+Overhead of the built-in instrumentation (app/metrics.py).
+
+    python -m benchmarks.bench_metrics --requests 1000 [--rounds 5]
+
+Runs the same request mix in-process (httpx ASGITransport, one request at a
+time) in child processes that alternate between METRICS_ENABLED=false and
+true, one round each, every one against its own throwaway SQLite file, and
+reports the median per-request time of each route and the difference.
+Alternating keeps drift on a busy machine out of the comparison. Also times
+the recording primitives on their own.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROUTES = (
+    ("GET", "/media/{id}/stream-url"),
+    ("GET", "/media/{id}/analytics"),
+    ("POST", "/media/{id}/view"),
+)
+
+async def drive(requests):
+    import httpx
+    from app import auth, database, models
+    from app.main import app
+
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    media = models.MediaAsset(title="bench", type="video", file_url="http://example.com/x.mp4")
+    user = models.AdminUser(email="bench@example.com", hashed_password="x")
+    db.add_all([media, user])
+    db.commit()
+    headers = {"Authorization": "Bearer " + auth.create_access_token({"id": user.id, "email": user.email})}
+    media_id = media.id
+    db.close()
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for method, route in ROUTES:
+            url = route.format(id=media_id)
+            await client.request(method, url, headers=headers)  # warm caches
+            started = time.perf_counter()
+            for _ in range(requests):
+                await client.request(method, url, headers=headers)
+            results[f"{method} {route}"] = (time.perf_counter() - started) / requests * 1e6
+    return results
+
+def per_call_ns(fn, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e9
+
+def primitives(n=200000):
+    from sqlalchemy import create_engine, text
+    from app import metrics
+
+    metrics.METRICS_ENABLED = True
+    h = metrics.Histogram("bench_seconds", "Bench.", ("route", "phase"))
+    c = metrics.Counter("bench_total", "Bench.", ("route",))
+    out = {
+        "Histogram.observe": per_call_ns(lambda: h.observe(0.003, "/media/{id}/analytics", "db"), n),
+        "Counter.inc": per_call_ns(lambda: c.inc("/media/{id}/analytics"), n),
+    }
+    for i in range(50):
+        h.observe(0.003, f"/route/{i}", "db")
+    out["render 51 histogram series"] = per_call_ns(h.render, 20)
+
+    # The same statement on a plain and an instrumented in-memory engine
+    statement = text("SELECT 1")
+    for name, instrument in (("SELECT 1, plain engine", False), ("SELECT 1, instrumented", True)):
+        engine = create_engine("sqlite://")
+        if instrument:
+            metrics.instrument_engine(engine, "bench")
+        with engine.connect() as conn:
+            out[name] = min(per_call_ns(lambda: conn.execute(statement), n // 20) for _ in range(5))
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        import asyncio
+        print(json.dumps(asyncio.run(drive(args.requests))))
+        return
+
+    runs = {"false": [], "true": []}
+    for enabled in ("false", "true") * args.rounds:
+        tmpdir = tempfile.mkdtemp(prefix="bench_metrics_")
+        env = dict(
+            os.environ,
+            METRICS_ENABLED=enabled,
+            DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+            RATE_LIMITS="media_view:ip=1000000000/60",
+            # In-memory cache and limiter in both runs: Redis latency would drown the difference
+            REDIS_HOST="127.0.0.1", REDIS_PORT="1",
+        )
+        command = [sys.executable, "-m", "benchmarks.bench_metrics", "--child", "--requests", str(args.requests)]
+        proc = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+        runs[enabled].append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"Median of {args.rounds} rounds of {args.requests} sequential requests per route")
+    print(f"  {'route':<30} {'off us':>9} {'on us':>9} {'overhead':>10}")
+    for name in runs["false"][0]:
+        off = statistics.median(run[name] for run in runs["false"])
+        on = statistics.median(run[name] for run in runs["true"])
+        print(f"  {name:<30} {off:>9.1f} {on:>9.1f} {on - off:>+7.1f} us ({(on - off) / off:+.1%})")
+    print("Recording primitives")
+    for name, nanos in primitives().items():
+        print(f"  {name:<30} {nanos / 1000:>9.2f} us")
+
+if __name__ == "__main__":
+    main()
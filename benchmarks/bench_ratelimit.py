@@ -0,0 +1,73 @@
+# benchmarks/bench_ratelimit.py
+"""
+Rate-limit checks/sec.
+
+    python -m benchmarks.bench_ratelimit --checks 200000 --threads 8
+    python -m benchmarks.bench_ratelimit --redis-url redis://localhost:6379/15
+
+Without --redis-url only the in-memory limiter is measured. With it, the
+sliding-window Lua script (one round trip) is compared with the previous
+INCR + EXPIRE fixed window (two round trips on a key's first hit).
+"""
+import argparse
+import threading
+import time
+
+from app import memstore, ratelimit
+
+def _drive(threads, per_thread, check):
+    def worker(n):
+        for i in range(per_thread):
+            check(f"rl:bench:{n}:{i % 1000}")
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return threads * per_thread / (time.perf_counter() - start)
+
+def _legacy_fixed_window(client):
+    def check(key):
+        current = client.incr(key)
+        if current == 1:
+            client.expire(key, 60)
+        return current <= 1_000_000
+    return check
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--checks", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    results = {}
+    for threads in (1, args.threads):
+        limiter = memstore.SlidingWindowLimiter(sweep_interval=0)
+        results[f"memory, {threads} thread(s)"] = _drive(
+            threads, args.checks // threads, lambda key: limiter.hit(key, 1_000_000, 60)
+        )
+
+    if args.redis_url:
+        import redis as redis_py
+        client = redis_py.Redis.from_url(args.redis_url, decode_responses=True)
+        client.flushdb()
+        redis_checks = max(1, args.checks // 10)
+        for threads in (1, args.threads):
+            results[f"redis INCR+EXPIRE, {threads} thread(s)"] = _drive(
+                threads, redis_checks // threads, _legacy_fixed_window(client)
+            )
+            client.flushdb()
+            results[f"redis Lua sliding window, {threads} thread(s)"] = _drive(
+                threads, redis_checks // threads,
+                lambda key: ratelimit.check_rules(client, [(key, 1_000_000, 60)]),
+            )
+            client.flushdb()
+
+    for name, rate in results.items():
+        print(f"  {name:<42} {rate:>12,.0f} checks/sec")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/bench_retention.py
+"""
+Retention cost with one media_view_logs table vs monthly partitions.
+
+    python -m benchmarks.bench_retention --views 2000000 --days 180 --keep 30 [--viewers 20000]
+
+Seeds `--views` views from `--viewers` IPs spread over `--days` days into a
+throwaway SQLite file per layout, then times `rollups.compact` keeping the last
+`--keep` days and reports the raw and compacted rows left, the file size (after
+VACUUM) and the latency of an exact unique-IP count over the last week, before
+and after.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import ingest, models, rollups, viewlog
+
+def seed(db, views, days, media, viewers, now, chunk=50000):
+    db.add_all([models.MediaAsset(title=f"bench {i}", type="video", file_url="http://example.com/x.mp4") for i in range(media)])
+    db.commit()
+    rng = random.Random(42)
+    for offset in range(0, views, chunk):
+        ingest.write_views(db, [
+            {
+                "media_id": 1 + min(media - 1, int(rng.paretovariate(1.2)) - 1),
+                "viewed_by_ip": f"10.0.{(ip := rng.randrange(viewers)) // 256}.{ip % 256}",
+                "timestamp": now - timedelta(seconds=rng.randrange(days * 86400)),
+            }
+            for _ in range(min(chunk, views - offset))
+        ], notify=False)
+
+def raw_rows(db):
+    return db.execute(select(func.count()).select_from(viewlog.raw_views(db))).scalar()
+
+def time_exact_count(db, now, repeat=5):
+    start, end = (now - timedelta(days=7)).date(), now.date()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rollups.count_unique_ips(db, 1, start, end)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def vacuumed_size(engine, path):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+    return os.path.getsize(path) / 1e6
+
+def run(layout, args, now):
+    viewlog.VIEW_LOG_PARTITIONING = layout
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_retention_"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    seed(db, args.views, args.days, args.media, args.viewers, now)
+    before_rows, before_ms = raw_rows(db), time_exact_count(db, now)
+    db.close()
+    before_mb = vacuumed_size(engine, path)
+
+    started = time.perf_counter()
+    result = rollups.compact(db, (now - timedelta(days=args.keep)).date())
+    elapsed = time.perf_counter() - started
+
+    after_rows, after_ms = raw_rows(db), time_exact_count(db, now)
+    compacted = db.query(func.count()).select_from(models.MediaViewDailyIP).scalar()
+    db.close()
+    after_mb = vacuumed_size(engine, path)
+    engine.dispose()
+    print(
+        f"  {layout:<8} compact {elapsed:>6.2f}s ({len(result['dropped'])} partitions dropped)"
+        f"  raw rows {before_rows} -> {after_rows}, compacted rows {compacted}"
+        f"  file {before_mb:.0f} -> {after_mb:.0f} MB"
+        f"  7-day exact uniques {before_ms:.1f} -> {after_ms:.1f} ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--views", type=int, default=2000000)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--keep", type=int, default=30, help="Retention window in days")
+    parser.add_argument("--media", type=int, default=1000)
+    parser.add_argument("--viewers", type=int, default=20000, help="Distinct IPs the views come from")
+    args = parser.parse_args()
+
+    ingest._listeners.clear()  # measure the database, not the cache write-through
+    now = datetime.utcnow()
+    print(f"{args.views} views over {args.days} days, keeping {args.keep} days")
+    for layout in ("none", "monthly"):
+        run(layout, args, now)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# benchmarks/bench_sqlite.py
+"""
+Concurrent view writes and analytics reads on SQLite, default vs tuned profile.
+
+    python -m benchmarks.bench_sqlite --writers 16 --readers 16 --seconds 10
+
+Writers commit one view per transaction, as POST /media/{id}/view does in sync
+ingest mode; readers run the analytics reads. Each profile runs in its own
+process (SQLITE_TUNING is read at import) on a fresh SQLite file:
+"default" is a rollback journal with a connection per session, "tuned" is WAL,
+synchronous=NORMAL, busy_timeout, mmap, a larger page cache and one serialized
+writer connection.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def run(writers, readers, seconds, think_seconds, media_count=20):
+    from app import database, ingest, models, rollups
+
+    ingest._listeners.clear()  # measure the database, not the cache write-through
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    db.add_all([models.MediaAsset(title=f"bench {i}", type="video", file_url="http://example.com/x.mp4") for i in range(media_count)])
+    db.commit()
+    db.close()
+
+    stop = threading.Event()
+    stats = {"write": [], "read": [], "write_errors": 0, "read_errors": 0}
+    lock = threading.Lock()
+
+    def loop(kind, worker_id, op):
+        n = 0
+        while not stop.is_set():
+            n += 1
+            started = time.perf_counter()
+            db = database.SessionLocal()
+            try:
+                op(db, worker_id, n)
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    stats[kind].append(elapsed)
+            except Exception:
+                db.rollback()
+                with lock:
+                    stats[f"{kind}_errors"] += 1
+            finally:
+                db.close()
+            # The rest of a request (auth, serialization); without it a thread that just
+            # released the writer connection takes it straight back ahead of queued threads
+            time.sleep(think_seconds)
+
+    def write(db, worker_id, n):
+        ingest.write_views(db, [{
+            "media_id": 1 + (worker_id + n) % media_count,
+            "viewed_by_ip": f"10.0.{worker_id}.{n % 250}",
+            "timestamp": datetime.utcnow(),
+        }])
+
+    def read(db, worker_id, n):
+        today = datetime.utcnow().date()
+        rollups.read_analytics(db, 1 + (worker_id + n) % media_count, today, today)
+
+    threads = [threading.Thread(target=loop, args=("write", i, write)) for i in range(writers)]
+    threads += [threading.Thread(target=loop, args=("read", i, read)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return {
+        "writes_per_sec": len(stats["write"]) / seconds,
+        "reads_per_sec": len(stats["read"]) / seconds,
+        "write_p99_ms": percentile(stats["write"], 0.99),
+        "read_p99_ms": percentile(stats["read"], 0.99),
+        "write_errors": stats["write_errors"],
+        "read_errors": stats["read_errors"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--think-ms", type=float, default=1, help="Pause between a thread's operations")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run(args.writers, args.readers, args.seconds, args.think_ms / 1000)))
+        return
+
+    print(f"{args.writers} writers + {args.readers} readers for {args.seconds:.0f}s")
+    for profile, tuning in (("default", "false"), ("tuned", "true")):
+        env = dict(
+            os.environ,
+            SQLITE_TUNING=tuning,
+            DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_sqlite_'), 'bench.db')}",
+        )
+        command = [sys.executable, "-m", "benchmarks.bench_sqlite", "--child", "--writers", str(args.writers),
+                   "--readers", str(args.readers), "--seconds", str(args.seconds), "--think-ms", str(args.think_ms)]
+        proc = subprocess.run(command, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.exit(f"{profile} run failed:\n{proc.stderr}")
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(
+            f"  {profile:<8} writes {r['writes_per_sec']:>7.0f}/s (p99 {r['write_p99_ms']:>7.1f} ms, {r['write_errors']} errors)"
+            f"  reads {r['reads_per_sec']:>7.0f}/s (p99 {r['read_p99_ms']:>7.1f} ms, {r['read_errors']} errors)"
+        )
+
+if __name__ == "__main__":
+    main()
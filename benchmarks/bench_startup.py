@@ -0,0 +1,99 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start time of the app: `import app.main`, then lifespan startup and a first request.
+
+    python -m benchmarks.bench_startup [--runs 5] [--timeout 60] [--repo PATH]
+
+Every run is a fresh interpreter with a fresh SQLite file, so schema creation
+is part of the cost. Runs are made with Redis unusable in two ways: a closed
+port (connection refused at once) and a hung server, a local socket that
+accepts connections and never answers, so only a timeout ends the wait. With
+a reachable Redis, pass --redis HOST:PORT to time that case too. --repo points
+at another checkout (e.g. a `git worktree` of an older commit) to compare
+before/after.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Runs in the child with the checkout under test as cwd
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def first_request():
+    import httpx
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            r = await client.get("/")
+            r.raise_for_status()
+        answered = time.perf_counter()
+    return ready, answered
+
+ready, answered = asyncio.run(first_request())
+print(json.dumps({"import": imported - started, "ready": ready - started, "first_response": answered - started}))
+"""
+
+def hung_server():
+    """A listening socket nobody reads from: connects succeed (into the backlog), replies never come."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(128)
+    return sock
+
+def one_run(repo, host, port, timeout):
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_startup_'), 'bench.db')}",
+        REDIS_HOST=host,
+        REDIS_PORT=port,
+        PASSWORD_WORKERS="0",
+    )
+    started = time.perf_counter()
+    try:
+        proc = subprocess.run([sys.executable, "-c", CHILD], cwd=repo, env=env, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        sys.exit(f"startup run failed:\n{proc.stderr}")
+    return {"process": wall, **json.loads(proc.stdout.strip().splitlines()[-1])}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60, help="Give up on a run after this many seconds")
+    parser.add_argument("--repo", default=os.getcwd(), help="Checkout to measure")
+    parser.add_argument("--redis", default=None, metavar="HOST:PORT", help="Also time a reachable Redis")
+    args = parser.parse_args()
+
+    hung = hung_server()
+    targets = {"refused": ("127.0.0.1", "1"), "hung": ("127.0.0.1", str(hung.getsockname()[1]))}
+    if args.redis:
+        host, _, port = args.redis.partition(":")
+        targets["reachable"] = (host, port or "6379")
+
+    print(f"Cold start of {args.repo}, median of {args.runs} runs (seconds from interpreter start)")
+    print(f"  {'redis':<10} {'import':>8} {'ready':>8} {'1st resp':>9} {'process':>8}")
+    for name, (host, port) in targets.items():
+        runs = [one_run(args.repo, host, port, args.timeout) for _ in range(args.runs)]
+        done = [r for r in runs if r is not None]
+        if not done:
+            print(f"  {name:<10} timed out after {args.timeout:.0f}s")
+            continue
+        m = {key: statistics.median(r[key] for r in done) for key in ("import", "ready", "first_response", "process")}
+        note = f"  ({len(runs) - len(done)} timed out)" if len(done) < len(runs) else ""
+        print(f"  {name:<10} {m['import']:>8.2f} {m['ready']:>8.2f} {m['first_response']:>9.2f} {m['process']:>8.2f}{note}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# benchmarks/replay_views.py
+"""
+Replay a JSONL file of view records against POST /media/views/batch at a
+controlled rate, for load testing.
+
+    python -m benchmarks.replay_views views.jsonl --url http://localhost:8000 --token $TOKEN \\
+        --rate 5000 --batch-size 1000 --concurrency 4
+    python -m benchmarks.replay_views views.jsonl --email admin@example.com --password pass123
+    python -m benchmarks.replay_views views.jsonl --in-process      # drive app.main without a server
+
+Each line is one {"media_id", "ip", "timestamp"} object and is sent as is, so
+logs shipped from the edge replay verbatim. The file is read lazily,
+`--batch-size` lines per request with at most `--concurrency` requests in
+flight. `--rate` caps records per second (0 sends as fast as the server
+accepts). The report gives the per-record statuses the server returned, HTTP
+errors, the achieved rate and request latency percentiles.
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import sys
+import time
+from collections import Counter
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def read_batches(path, batch_size, limit=None):
+    f = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        lines = (line.rstrip(b"\r\n") for line in f if line.strip())
+        if limit is not None:
+            lines = itertools.islice(lines, limit)
+        while True:
+            batch = list(itertools.islice(lines, batch_size))
+            if not batch:
+                return
+            yield batch
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+async def replay(client, headers, batches, rate, concurrency):
+    statuses, http_errors, latencies = Counter(), Counter(), []
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def send(batch):
+        try:
+            started = time.perf_counter()
+            r = await client.post(
+                "/media/views/batch", content=b"\n".join(batch),
+                headers={**headers, "Content-Type": "application/x-ndjson"},
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            if r.status_code != 200:
+                http_errors[r.status_code] += len(batch)
+                return
+            statuses.update(result["status"] for result in r.json()["results"])
+        except Exception as exc:
+            http_errors[type(exc).__name__] += len(batch)
+        finally:
+            semaphore.release()
+
+    started, scheduled, tasks = loop.time(), 0, set()
+    for batch in batches:
+        if rate:
+            # Open-loop pacing: batch n leaves at the time its first record is due
+            delay = started + scheduled / rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await semaphore.acquire()
+        task = asyncio.ensure_future(send(batch))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        scheduled += len(batch)
+    await asyncio.gather(*tasks)
+    return statuses, http_errors, latencies, loop.time() - started
+
+async def main_async(args):
+    import httpx
+
+    lifespan = contextlib.nullcontext()
+    if args.in_process:
+        from app.main import app
+        lifespan = app.router.lifespan_context(app)
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        client = httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    async with lifespan, client:
+        token = args.token
+        if token is None:
+            r = await client.post("/auth/login", json={"email": args.email, "password": args.password})
+            r.raise_for_status()
+            token = r.json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        return await replay(client, headers, read_batches(args.path, args.batch_size, args.limit), args.rate, args.concurrency)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="JSONL file of view records, or - for stdin")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--in-process", action="store_true", help="Send to app.main through an ASGI transport")
+    parser.add_argument("--token", default=None, help="Bearer token (or log in with --email/--password)")
+    parser.add_argument("--email", default=None)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--rate", type=float, default=0, help="Records per second, 0 for unthrottled")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many records")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+    if args.token is None and (args.email is None or args.password is None):
+        parser.error("pass --token, or --email and --password")
+
+    statuses, http_errors, latencies, elapsed = asyncio.run(main_async(args))
+    sent = sum(statuses.values()) + sum(http_errors.values())
+    print(f"Replayed {sent} records in {len(latencies)} requests over {elapsed:.1f}s ({sent / elapsed if elapsed else 0:.0f} records/s)")
+    for name, n in sorted(statuses.items()):
+        print(f"  {name:<14} {n:>9}")
+    for name, n in sorted(http_errors.items(), key=str):
+        print(f"  HTTP {name!s:<9} {n:>9}")
+    print(
+        f"  request latency p50 {percentile(latencies, 0.5):.1f} ms  p95 {percentile(latencies, 0.95):.1f} ms"
+        f"  p99 {percentile(latencies, 0.99):.1f} ms"
+    )
+
+if __name__ == "__main__":
+    main()
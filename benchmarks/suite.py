@@ -0,0 +1,332 @@
+# benchmarks/suite.py
+"""
+Reproducible load test of the whole API, with a JSON report and regression checks.
+
+    python -m benchmarks.suite run -o results.json [--users 100 --media 200 --views 200000]
+        [--requests 2000 --auth-requests 100 --concurrency 32] [--scenarios view,analytics]
+    python -m benchmarks.suite run -o results.json --baseline baseline.json
+    python -m benchmarks.suite compare baseline.json results.json [--tolerance 0.15]
+
+`run` seeds a throwaway SQLite file with --users users, --media media and
+--views view logs spread over the last --days days (through the normal ingest
+path, so rollups and sketches are populated), then drives each scenario
+in-process through httpx's ASGI transport with --concurrency requests in
+flight, after --warmup untimed requests:
+
+    signup           POST /auth/signup, a new user each time (bcrypt hash)
+    login            POST /auth/login as a seeded user (bcrypt verify)
+    view             POST /media/{id}/view on a random media
+    analytics        GET /media/{id}/analytics on a random media (cached path)
+    analytics_range  GET /media/{id}/analytics over a random 7-day range (rollups)
+    analytics_batch  GET /media/analytics for 10 random media by day
+
+The app runs in a child process with the current environment (APP_IO_MODE,
+REDIS_HOST, ...) except DATABASE_URL, and with rate limits raised out of the
+way. Requests are generated from --seed, so two runs send the same workload.
+
+The report has per-scenario throughput, error count and p50/p95/p99 latency.
+`compare` (or `run --baseline`) flags a scenario whose throughput fell, or
+whose p50/p95/p99 grew, by more than --tolerance, and exits with status 1.
+Compare reports from the same machine and settings; `meta` records both.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+SCENARIOS = ("signup", "login", "view", "analytics", "analytics_range", "analytics_batch")
+AUTH_SCENARIOS = ("signup", "login")
+PASSWORD = "bench-pass"
+FORMAT_VERSION = 1
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def seed(users, media, views, days, rng):
+    from sqlalchemy import insert
+    from app import database, ingest, models, passwords
+
+    models.Base.metadata.create_all(bind=database.engine)
+    hashed = passwords.pwd_context.hash(PASSWORD)
+    db = database.SessionLocal()
+    try:
+        db.execute(insert(models.AdminUser), [{"email": f"user{i}@bench.example.com", "hashed_password": hashed} for i in range(users)])
+        db.execute(insert(models.MediaAsset), [
+            {"title": f"bench {i}", "type": "video", "file_url": "http://example.com/x.mp4"} for i in range(media)
+        ])
+        db.commit()
+        user_ids = [row.id for row in db.query(models.AdminUser.id).order_by(models.AdminUser.id)]
+        media_ids = [row.id for row in db.query(models.MediaAsset.id).order_by(models.MediaAsset.id)]
+        now = datetime.utcnow()
+        for offset in range(0, views, 20000):
+            ingest.write_views(db, [
+                {
+                    "media_id": rng.choice(media_ids),
+                    "viewed_by_ip": f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}",
+                    "timestamp": now - timedelta(seconds=rng.randrange(days * 86400)),
+                }
+                for _ in range(min(20000, views - offset))
+            ])
+    finally:
+        db.close()
+    return user_ids, media_ids
+
+def requests_for(scenario, n, user_ids, media_ids, days, rng):
+    """n (method, path, params, json body, token user id or None) tuples for a scenario."""
+    today = datetime.utcnow().date()
+    out = []
+    for i in range(n):
+        if scenario == "signup":
+            out.append(("POST", "/auth/signup", None, {"email": f"new{i}@bench.example.com", "password": PASSWORD}, None))
+        elif scenario == "login":
+            out.append(("POST", "/auth/login", None, {"email": f"user{rng.randrange(len(user_ids))}@bench.example.com", "password": PASSWORD}, None))
+        elif scenario == "view":
+            out.append(("POST", f"/media/{rng.choice(media_ids)}/view", None, None, rng.choice(user_ids)))
+        elif scenario == "analytics":
+            out.append(("GET", f"/media/{rng.choice(media_ids)}/analytics", None, None, rng.choice(user_ids)))
+        elif scenario == "analytics_range":
+            start = today - timedelta(days=rng.randrange(max(1, days - 6)) + 6)
+            params = {"from": start.isoformat(), "to": (start + timedelta(days=6)).isoformat()}
+            out.append(("GET", f"/media/{rng.choice(media_ids)}/analytics", params, None, rng.choice(user_ids)))
+        elif scenario == "analytics_batch":
+            params = {
+                "ids": rng.sample(media_ids, min(10, len(media_ids))),
+                "from": (today - timedelta(days=days - 1)).isoformat(), "to": today.isoformat(), "granularity": "day",
+            }
+            out.append(("GET", "/media/analytics", params, None, rng.choice(user_ids)))
+        else:
+            raise ValueError(f"Unknown scenario {scenario!r}")
+    return out
+
+async def drive(client, requests, concurrency, tokens):
+    """Send `requests` with `concurrency` in flight; returns (latencies ms, {status: count}, seconds)."""
+    latencies, statuses = [], Counter()
+    pending = iter(requests)
+
+    async def worker():
+        for method, path, params, body, user_id in pending:
+            headers = {"Authorization": f"Bearer {tokens[user_id]}"} if user_id is not None else {}
+            started = time.perf_counter()
+            try:
+                r = await client.request(method, path, params=params, json=body, headers=headers)
+                statuses[str(r.status_code)] += 1
+            except Exception as exc:
+                statuses[type(exc).__name__] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+def summarize(latencies, statuses, seconds):
+    return {
+        "requests": len(latencies),
+        # Anything but a 2xx/3xx, e.g. 503 when the bcrypt pool is saturated
+        "errors": sum(n for status, n in statuses.items() if not status.isdigit() or int(status) >= 400),
+        "statuses": dict(sorted(statuses.items())),
+        "seconds": round(seconds, 4),
+        "throughput_rps": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "max_ms": round(max(latencies), 3),
+    }
+
+async def child(args):
+    import httpx
+    from app import auth
+    from app.main import app
+
+    # Startup (schema, Redis) and shutdown as under uvicorn
+    async with app.router.lifespan_context(app):
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        user_ids, media_ids = seed(args.users, args.media, args.views, args.days, rng)
+        seed_seconds = time.perf_counter() - started
+        tokens = {
+            user_id: auth.create_access_token({"id": user_id, "email": f"user{i}@bench.example.com"})
+            for i, user_id in enumerate(user_ids)
+        }
+
+        results = {}
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for scenario in args.scenarios:
+                n = args.auth_requests if scenario in AUTH_SCENARIOS else args.requests
+                warmup = min(args.warmup, n)
+                plan = requests_for(scenario, warmup + n, user_ids, media_ids, args.days, random.Random(f"{args.seed}:{scenario}"))
+                await drive(client, plan[:warmup], args.concurrency, tokens)
+                results[scenario] = summarize(*await drive(client, plan[warmup:], args.concurrency, tokens))
+    return {"seed_seconds": round(seed_seconds, 3), "scenarios": results}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run(args):
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_suite_'), 'bench.db')}",
+        RATE_LIMITS="media_view:ip=1000000000/60",
+    )
+    command = [sys.executable, "-m", "benchmarks.suite", "run", "--child"] + [
+        f"--{name.replace('_', '-')}={getattr(args, name)}"
+        for name in ("users", "media", "views", "days", "requests", "auth_requests", "concurrency", "warmup", "seed")
+    ] + ["--scenarios", ",".join(args.scenarios)]
+    proc = subprocess.run(command, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"benchmark run failed:\n{proc.stderr}")
+    measured = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "format": FORMAT_VERSION,
+        "meta": {
+            "created": datetime.utcnow().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "io_mode": os.getenv("APP_IO_MODE", "sync"),
+            "config": {
+                name: getattr(args, name)
+                for name in ("users", "media", "views", "days", "requests", "auth_requests", "concurrency", "warmup", "seed")
+            },
+        },
+        **measured,
+    }
+
+# metric -> +1 if higher is worse, -1 if lower is worse
+COMPARED = {"throughput_rps": -1, "p50_ms": 1, "p95_ms": 1, "p99_ms": 1}
+
+def compare(baseline, current, tolerance):
+    """Per-scenario relative changes and the regressions beyond `tolerance`."""
+    rows, regressions = [], []
+    for scenario, now in current["scenarios"].items():
+        before = baseline["scenarios"].get(scenario)
+        if before is None:
+            continue
+        changes = {}
+        for metric, direction in COMPARED.items():
+            change = (now[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            changes[metric] = round(change, 4)
+            if direction * change > tolerance:
+                regressions.append({"scenario": scenario, "metric": metric, "baseline": before[metric], "current": now[metric], "change": round(change, 4)})
+        if now["errors"] > before["errors"]:
+            regressions.append({"scenario": scenario, "metric": "errors", "baseline": before["errors"], "current": now["errors"], "change": None})
+        rows.append({"scenario": scenario, **changes})
+    mismatched = sorted(
+        key for key in set(baseline["meta"]["config"]) | set(current["meta"]["config"])
+        if baseline["meta"]["config"].get(key) != current["meta"]["config"].get(key)
+    )
+    return {"tolerance": tolerance, "config_mismatch": mismatched, "changes": rows, "regressions": regressions}
+
+def print_report(report, out=sys.stderr):
+    config = report["meta"]["config"]
+    print(
+        f"{config['users']} users, {config['media']} media, {config['views']} views (seeded in {report['seed_seconds']:.1f}s); "
+        f"concurrency {config['concurrency']}, {report['meta']['io_mode']} mode",
+        file=out,
+    )
+    print(f"  {'scenario':<16} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}", file=out)
+    for scenario, r in report["scenarios"].items():
+        print(
+            f"  {scenario:<16} {r['throughput_rps']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['errors']:>7}",
+            file=out,
+        )
+
+def print_comparison(comparison, out=sys.stderr):
+    if comparison["config_mismatch"]:
+        print(f"warning: settings differ from the baseline: {', '.join(comparison['config_mismatch'])}", file=out)
+    print(f"  {'vs baseline':<16} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}", file=out)
+    for row in comparison["changes"]:
+        print(
+            f"  {row['scenario']:<16} {row['throughput_rps']:>+9.1%} {row['p50_ms']:>+9.1%} {row['p95_ms']:>+9.1%} {row['p99_ms']:>+9.1%}",
+            file=out,
+        )
+    for r in comparison["regressions"]:
+        change = f" ({r['change']:+.1%})" if r["change"] is not None else ""
+        print(f"REGRESSION {r['scenario']} {r['metric']}: {r['baseline']} -> {r['current']}{change}", file=out)
+    if not comparison["regressions"]:
+        print(f"No regressions beyond {comparison['tolerance']:.0%}", file=out)
+
+def _load(path):
+    with open(path) as f:
+        report = json.load(f)
+    if report.get("format") != FORMAT_VERSION:
+        sys.exit(f"{path}: not a benchmark report of format {FORMAT_VERSION}")
+    return report
+
+def _write(data, path):
+    text = json.dumps(data, indent=2) + "\n"
+    if path in (None, "-"):
+        sys.stdout.write(text)
+    else:
+        with open(path, "w") as f:
+            f.write(text)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Seed, run the scenarios and write a JSON report")
+    run_parser.add_argument("--users", type=int, default=100)
+    run_parser.add_argument("--media", type=int, default=200)
+    run_parser.add_argument("--views", type=int, default=200000)
+    run_parser.add_argument("--days", type=int, default=30, help="Seeded views are spread over this many days")
+    run_parser.add_argument("--requests", type=int, default=2000, help="Timed requests per scenario")
+    run_parser.add_argument("--auth-requests", type=int, default=100, help="Timed requests for signup and login (bcrypt)")
+    run_parser.add_argument("--concurrency", type=int, default=32)
+    run_parser.add_argument("--warmup", type=int, default=20, help="Untimed requests before each scenario")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument(
+        "--scenarios", type=lambda v: [s for s in v.split(",") if s], default=list(SCENARIOS),
+        help=f"Comma-separated subset of {','.join(SCENARIOS)}",
+    )
+    run_parser.add_argument("-o", "--output", default=None, help="Report path (default stdout)")
+    run_parser.add_argument("--baseline", default=None, help="Report to compare against")
+    run_parser.add_argument("--tolerance", type=float, default=0.15)
+    run_parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+
+    compare_parser = commands.add_parser("compare", help="Compare two reports and flag regressions")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.15)
+    compare_parser.add_argument("-o", "--output", default=None, help="Comparison JSON path (default stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        comparison = compare(_load(args.baseline), _load(args.current), args.tolerance)
+        print_comparison(comparison)
+        _write(comparison, args.output)
+        sys.exit(1 if comparison["regressions"] else 0)
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.child:
+        print(json.dumps(asyncio.run(child(args))))
+        return
+
+    report = run(args)
+    print_report(report)
+    if args.baseline:
+        report["comparison"] = compare(_load(args.baseline), report, args.tolerance)
+        print_comparison(report["comparison"])
+    _write(report, args.output)
+    if args.baseline and report["comparison"]["regressions"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import uuid
+
+# Before anything imports app.database: the suite runs on a throwaway file and never touches media.db
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='media_tests_'), 'test.db')}"
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import database, ingest, models  # noqa: E402
+from app.main import app  # noqa: E402
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    # The app creates its tables in the lifespan, which a bare TestClient(app) does not run
+    models.Base.metadata.create_all(bind=database.engine)
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(app)
+
+@pytest.fixture()
+def login(client):
+    """login() signs up a fresh admin through `client` and returns (email, Authorization headers)."""
+    def login():
+        email = f"user_{uuid.uuid4().hex[:8]}@example.com"
+        client.post("/auth/signup", json={"email": email, "password": "pass1234"})
+        token = client.post("/auth/login", json={"email": email, "password": "pass1234"}).json()["token"]
+        return email, {"Authorization": f"Bearer {token}"}
+    return login
+
+@pytest.fixture()
+def auth_headers(login):
+    return login()[1]
+
+@pytest.fixture()
+def session_factory(tmp_path, monkeypatch):
+    """Sessions on a throwaway SQLite file holding the schema and media 1 and 2, with view listeners off."""
+    monkeypatch.setattr(ingest, "_listeners", [])
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = factory()
+    db.add_all([models.MediaAsset(title=f"Sample {i}", type="video", file_url="http://example.com/file.mp4") for i in range(2)])
+    db.commit()
+    db.close()
+    yield factory
+    engine.dispose()
+
+@pytest.fixture()
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
@@ -0,0 +1,101 @@
+# tests/test_analytics_cache.py
+import threading
+import time
+
+import pytest
+
+from app import media
+from test_media import create_media
+
+def test_views_update_cached_analytics_in_place(client, auth_headers):
+    headers = auth_headers
+    media_id = create_media(headers)
+    client.post(f"/media/{media_id}/view", headers=headers)
+    first = client.get(f"/media/{media_id}/analytics", headers=headers).json()
+    assert first["total_views"] == 1
+
+    client.post(f"/media/{media_id}/view", headers=headers)
+    cached = media._cache_get(f"media_analytics:{media_id}")
+    assert cached is not None, "a view must not evict the cached entry"
+    assert cached["total_views"] == 2
+    assert sum(cached["views_per_day"].values()) == 2
+    assert client.get(f"/media/{media_id}/analytics", headers=headers).json() == cached
+
+def test_write_during_recompute_gets_retry_ttl():
+    media_id = 10**9
+    version = media._analytics_version(media_id)
+    media._cache_apply_views(media_id, {"total_views": 1, "views_per_day": {"2025-08-01": 1}})
+    media._cache_set_analytics(media_id, {"total_views": 0, "unique_ips": 0, "views_per_day": {}}, version)
+    assert 0 < media._inmemory_cache.ttl(f"media_analytics:{media_id}") <= media.ANALYTICS_CACHE_RETRY_TTL
+
+def test_write_between_version_check_and_set_is_not_lost(monkeypatch):
+    media_id = 10**9 + 1
+    version = media._analytics_version(media_id)
+    versions = media._inmemory_versions
+    writer = threading.Thread(
+        target=media._cache_apply_views, args=(media_id, {"total_views": 1, "views_per_day": {"2025-08-01": 1}})
+    )
+
+    class RacingVersions:
+        # Commits a view right after the reader compares versions
+        def get(self, key, default=None):
+            current = versions.get(key, default)
+            if writer.ident is None:
+                writer.start()
+                writer.join(0.2)
+            return current
+
+        def __getattr__(self, name):
+            return getattr(versions, name)
+
+    monkeypatch.setattr(media, "_inmemory_versions", RacingVersions())
+    media._cache_set_analytics(media_id, {"total_views": 0, "unique_ips": 0, "views_per_day": {}}, version)
+    writer.join()
+    key = f"media_analytics:{media_id}"
+    assert media._cache_get(key)["total_views"] == 1 or media._inmemory_cache.ttl(key) <= media.ANALYTICS_CACHE_RETRY_TTL
+
+def test_single_flight_runs_one_computation():
+    calls = []
+    gate = threading.Event()
+
+    def compute():
+        calls.append(1)
+        gate.wait(5)
+        return {"ok": True}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(media._single_flight("sf-test", compute))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == [{"ok": True}] * 8
+
+def test_redis_write_through(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    r = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(media, "redis_client", r)
+    monkeypatch.setattr(media, "_USING_REDIS", True)
+
+    version = media._analytics_version(7)
+    media._cache_set_analytics(7, {"total_views": 3, "unique_ips": 2, "views_per_day": {"2025-08-01": 3}}, version)
+    assert r.ttl("media_analytics:7") > media.ANALYTICS_CACHE_RETRY_TTL
+
+    r.pfadd("hll:media:7", "a", "b", "c")
+    media._cache_apply_views(7, {"total_views": 5, "views_per_day": {"2025-08-01": 4, "2025-08-02": 1}})
+    # Stale counters arriving late must not move the entry backwards
+    media._cache_apply_views(7, {"total_views": 4, "views_per_day": {"2025-08-01": 3}})
+    assert media._cache_get("media_analytics:7") == {
+        "total_views": 5,
+        "unique_ips": 3,
+        "views_per_day": {"2025-08-01": 4, "2025-08-02": 1},
+    }
+    assert r.ttl("media_analytics:7") > media.ANALYTICS_CACHE_RETRY_TTL
+
+    stale_version = media._analytics_version(8)
+    media._cache_apply_views(8, {"total_views": 1, "views_per_day": {}})
+    media._cache_set_analytics(8, {"total_views": 0, "unique_ips": 0, "views_per_day": {}}, stale_version)
+    assert r.ttl("media_analytics:8") <= media.ANALYTICS_CACHE_RETRY_TTL
@@ -1,5 +1,4 @@
 # tests/auth_test.py
-import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 
@@ -18,3 +17,34 @@ def test_signup_and_login():
     assert r2.status_code == 200
     token = r2.json().get("token")
     assert token
+
+def login_headers():
+    import uuid
+    email = f"user_test_{uuid.uuid4().hex[:6]}@example.com"
+    client.post("/auth/signup", json={"email": email, "password": "pass1234"})
+    token = client.post("/auth/login", json={"email": email, "password": "pass1234"}).json()["token"]
+    return email, {"Authorization": f"Bearer {token}"}
+
+def test_cached_principal_is_invalidated_on_delete(monkeypatch):
+    from app import auth, database, models
+    email, headers = login_headers()
+    payload = {"title": "Sample", "type": "video", "file_url": "http://example.com/file.mp4"}
+    assert client.post("/media/", json=payload, headers=headers).status_code == 200
+
+    db = database.SessionLocal()
+    user = db.query(models.AdminUser).filter(models.AdminUser.email == email).first()
+    db.delete(user)
+    db.commit()
+    db.close()
+
+    assert client.post("/media/", json=payload, headers=headers).status_code == 401
+
+    # Read-only routes can be told to trust the signed claims without a lookup
+    monkeypatch.setattr(auth, "AUTH_TRUST_CLAIMS_FOR_READS", True)
+    assert client.get("/media/cache/stats", headers=headers).status_code == 200
+    monkeypatch.setattr(auth, "AUTH_TRUST_CLAIMS_FOR_READS", False)
+    assert client.get("/media/cache/stats", headers=headers).status_code == 401
+
+def test_invalid_token_rejected():
+    r = client.get("/media/cache/stats", headers={"Authorization": "Bearer not-a-token"})
+    assert r.status_code == 401
@@ -0,0 +1,40 @@
+# tests/test_database.py
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import database, models
+
+def test_sqlite_profile_and_write_routing(tmp_path):
+    url = f"sqlite:///{tmp_path / 'tuned.db'}"
+    reader = create_engine(url)
+    writer = create_engine(url, pool_size=1, max_overflow=0)
+    for engine in (reader, writer):
+        event.listen(engine, "connect", database._apply_sqlite_pragmas)
+    models.Base.metadata.create_all(bind=writer)
+
+    with reader.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+
+    used = []
+    for name, engine in (("reader", reader), ("writer", writer)):
+        event.listen(engine, "before_cursor_execute", lambda *args, name=name: used.append((name, args[2].split()[0])))
+
+    Session = sessionmaker(bind=reader, class_=database._routing_session_class(reader, writer))
+    db = Session()
+    db.query(models.MediaAsset).count()
+    db.add(models.MediaAsset(title="t", type="video", file_url="http://example.com/x.mp4"))
+    db.flush()
+    # Reads after a write in the same transaction stay on the writer so they see it
+    assert db.query(models.MediaAsset).count() == 1
+    db.commit()
+    assert db.query(models.MediaAsset).count() == 1
+    db.close()
+
+    assert used == [("reader", "SELECT"), ("writer", "INSERT"), ("writer", "SELECT"), ("reader", "SELECT")]
+
+def test_unsupported_database_is_refused_up_front():
+    assert database.check_dialect("postgresql+psycopg2://user@host/db") == "postgresql"
+    with pytest.raises(ValueError, match="mysql"):
+        database.check_dialect("mysql+pymysql://user@host/db")
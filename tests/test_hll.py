@@ -0,0 +1,100 @@
+# tests/test_hll.py
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import hll, ingest
+
+@pytest.mark.parametrize("n", [10, 1000, 20000, 200000])
+def test_estimate_error_is_bounded(n):
+    sketch = hll.HyperLogLog()
+    for i in range(n):
+        sketch.add(f"192.168.{i // 256}.{i % 256}-{i}")
+    # Standard error is 1.04/sqrt(2^14) ~ 0.81%; allow ~3 sigma
+    assert abs(sketch.count() - n) <= max(1, 0.025 * n)
+
+def test_merge_counts_union():
+    a, b = hll.HyperLogLog(), hll.HyperLogLog()
+    for i in range(6000):
+        a.add(f"ip-{i}")
+    for i in range(3000, 9000):
+        b.add(f"ip-{i}")
+    a.merge(b)
+    assert abs(a.count() - 9000) <= 0.025 * 9000
+    assert hll.HyperLogLog.from_bytes(a.to_bytes()).count() == a.count()
+
+@pytest.fixture(autouse=True)
+def fresh_sketches(monkeypatch):
+    # The fixed dates below stay inside the day-sketch window
+    monkeypatch.setattr(hll, "HLL_DAY_RETENTION_DAYS", 3650)
+    hll.reset_local()
+    yield
+    hll.reset_local()
+
+def seed(db):
+    rows = []
+    for day in range(3):
+        ts = datetime(2025, 8, 1) + timedelta(days=day)
+        rows += [{"media_id": 1, "viewed_by_ip": f"10.0.{day}.{i}", "timestamp": ts} for i in range(100)]
+        rows += [{"media_id": 1, "viewed_by_ip": "shared", "timestamp": ts}]
+    ingest.write_views(db, rows)
+    return rows
+
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_counts_hydrate_and_merge_days(db, backend):
+    client = None
+    if backend == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeRedis(decode_responses=True)
+    seed(db)
+
+    # First read hydrates from media_view_logs
+    assert abs(hll.count(client, db, 1) - 301) <= 8
+    assert abs(hll.count(client, db, 1, [date(2025, 8, 1), date(2025, 8, 2)]) - 201) <= 6
+    assert hll.count(client, db, 1, []) == 0
+
+    # Live adds after hydration land in both the lifetime and the day sketch
+    hll.add_views(client, [{"media_id": 1, "viewed_by_ip": "late", "timestamp": datetime(2025, 8, 3)}])
+    assert abs(hll.count(client, db, 1, [date(2025, 8, 3)]) - 102) <= 4
+
+def test_day_sketches_expire_with_the_window(db, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(hll, "HLL_DAY_RETENTION_DAYS", 30)
+    today = datetime.utcnow().date()
+    old = today - timedelta(days=40)
+    rows = [{"media_id": 1, "viewed_by_ip": f"10.0.0.{i}", "timestamp": datetime.combine(d, datetime.min.time())}
+            for d in (old, today) for i in range(3)]
+    ingest.write_views(db, rows)
+    hll.add_views(client, rows)
+
+    assert 0 < client.ttl(hll.sketch_key(1, today)) <= 31 * 86400
+    assert not client.exists(hll.sketch_key(1, old))
+    assert client.ttl(hll.sketch_key(1)) == -1
+    # Days that fell out of the window are counted from the log
+    assert hll.count(client, db, 1, [old]) == 3
+    assert hll.count(None, db, 1, [old, today]) == 3
+
+def test_sparse_sketch_matches_dense_and_switches_at_threshold():
+    sparse, dense = hll.HyperLogLog(), hll.HyperLogLog(registers=bytes(1 << hll.PRECISION))
+    for i in range(1500):
+        sparse.add(f"ip-{i}")
+        dense.add(f"ip-{i}")
+    assert sparse.sparse and sparse.nbytes < dense.nbytes / 2
+    assert sparse.count() == dense.count()
+    assert sparse.to_bytes() == dense.to_bytes()
+    assert hll.union([sparse, dense]).count() == dense.count()
+
+    sparse.add_positions([hll.position(f"more-{i}") for i in range(3000)])
+    assert not sparse.sparse
+    assert abs(sparse.count() - 4500) <= 0.025 * 4500
+
+def test_local_sketches_are_bounded_by_bytes(monkeypatch):
+    monkeypatch.setattr(hll, "_sketches", hll._SketchStore(max_bytes=8000))
+    day = datetime(2025, 8, 1)
+    for media_id in range(1, 11):
+        hll.add_views(None, [{"media_id": media_id, "viewed_by_ip": f"10.0.0.{i}", "timestamp": day} for i in range(200)])
+    stats = hll.local_stats()
+    assert stats["bytes"] <= 8000 and stats["evictions"] > 0
+    # Most recently used media survive
+    assert hll._sketches.get(10) is not None and hll._sketches.get(1) is None
@@ -0,0 +1,96 @@
+# tests/test_ingest.py
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func
+
+from app import models, ingest
+
+def count_views(factory):
+    db = factory()
+    try:
+        return db.query(func.count(models.MediaViewLog.id)).scalar()
+    finally:
+        db.close()
+
+def row(i=0):
+    return {"media_id": 1, "viewed_by_ip": f"10.0.0.{i}", "timestamp": datetime.utcnow()}
+
+def test_flushes_on_batch_size(session_factory):
+    buffer = ingest.ViewBuffer(session_factory, batch_size=10, flush_interval=60)
+    futures = [buffer.submit(row(i)) for i in range(10)]
+    for fut in futures:
+        fut.result(timeout=5)
+    assert count_views(session_factory) == 10
+    assert buffer.flushed_batches == 1
+    buffer.stop()
+
+def test_flushes_on_interval(session_factory):
+    buffer = ingest.ViewBuffer(session_factory, batch_size=1000, flush_interval=0.05)
+    start = time.monotonic()
+    buffer.submit(row()).result(timeout=5)
+    assert time.monotonic() - start >= 0.04
+    assert count_views(session_factory) == 1
+    buffer.stop()
+
+def test_awaited_rows_do_not_linger(session_factory):
+    buffer = ingest.ViewBuffer(session_factory, batch_size=1000, flush_interval=60)
+    buffer.submit(row(), wait=True).result(timeout=5)
+    assert count_views(session_factory) == 1
+    buffer.stop()
+
+def test_stop_drains_queue(session_factory):
+    buffer = ingest.ViewBuffer(session_factory, batch_size=7, flush_interval=60)
+    for i in range(50):
+        buffer.submit(row(i))
+    buffer.stop()
+    assert count_views(session_factory) == 50
+    with pytest.raises(ingest.BufferFull):
+        buffer.submit(row())
+
+def test_every_accepted_row_is_flushed_when_stop_races_submit(session_factory):
+    buffer = ingest.ViewBuffer(session_factory, batch_size=7, flush_interval=60)
+    accepted = []
+
+    def produce():
+        while True:
+            try:
+                accepted.append(buffer.submit(row()))
+            except ingest.BufferFull:
+                return
+
+    producers = [threading.Thread(target=produce) for _ in range(4)]
+    for t in producers:
+        t.start()
+    time.sleep(0.05)
+    buffer.stop()
+    for t in producers:
+        t.join()
+    for fut in accepted:
+        fut.result(timeout=5)
+    assert count_views(session_factory) == len(accepted)
+
+def test_rejects_when_full(session_factory):
+    buffer = ingest.ViewBuffer(session_factory, batch_size=1000, flush_interval=60, max_queue=2)
+    buffer._thread = object()  # keep the writer from draining so the queue stays full
+    buffer.submit(row())
+    buffer.submit(row())
+    with pytest.raises(ingest.BufferFull):
+        buffer.submit(row())
+
+def test_no_new_buffer_after_shutdown(session_factory, monkeypatch):
+    buffer = ingest.ViewBuffer(session_factory, batch_size=1000, flush_interval=60)
+    monkeypatch.setattr(ingest, "_view_buffer", buffer)
+    monkeypatch.setattr(ingest, "_accepting", True)
+    pending = ingest.get_view_buffer().submit(row())
+
+    ingest.shutdown()
+    pending.result(timeout=5)
+    assert count_views(session_factory) == 1
+    # A request arriving after the final drain must not start a writer nobody stops
+    with pytest.raises(ingest.BufferFull):
+        ingest.get_view_buffer()
+    ingest.start()
+    assert ingest._accepting
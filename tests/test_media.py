@@ -1,8 +1,9 @@
 # tests/test_media.py
-import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+import json
 import uuid
+from datetime import datetime, timedelta
 
 client = TestClient(app)
 
@@ -54,3 +55,118 @@ def test_rate_limit_view():
     # 6th should be rate-limited (429)
     r6 = client.post(f"/media/{media_id}/view", headers=headers)
     assert r6.status_code == 429
+
+def test_analytics_exact_and_date_range():
+    headers = auth_headers()
+    media_id = create_media(headers)
+    client.post(f"/media/{media_id}/view", headers=headers)
+
+    today = datetime.utcnow().date().isoformat()
+    r1 = client.get(f"/media/{media_id}/analytics", params={"exact": "true"}, headers=headers)
+    assert r1.status_code == 200
+    assert r1.json() == {"total_views": 1, "unique_ips": 1, "views_per_day": {today: 1}}
+
+    r2 = client.get(f"/media/{media_id}/analytics", params={"from": today, "to": today}, headers=headers)
+    assert r2.json()["total_views"] == 1
+    assert r2.json()["unique_ips"] == 1
+
+    r3 = client.get(f"/media/{media_id}/analytics", params={"to": "2000-01-01"}, headers=headers)
+    assert r3.json() == {"total_views": 0, "unique_ips": 0, "views_per_day": {}}
+
+def test_cache_stats():
+    headers = auth_headers()
+    r = client.get("/media/cache/stats", headers=headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["backend"] in ("memory", "redis")
+    assert "hits" in body["cache"] and "evictions" in body["cache"]
+
+def test_batch_analytics():
+    headers = auth_headers()
+    first, second = create_media(headers), create_media(headers)
+    client.post(f"/media/{first}/view", headers=headers)
+    today = datetime.utcnow().date().isoformat()
+
+    r = client.get("/media/analytics", params={"ids": [second, first], "from": today, "to": today}, headers=headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["granularity"] == "day" and body["from"] == today
+    # Returned in id order, one entry per media even without views
+    assert body["media"] == [
+        {"media_id": first, "total_views": 1, "unique_ips": 1, "views": {today: 1}},
+        {"media_id": second, "total_views": 0, "unique_ips": 0, "views": {}},
+    ]
+
+    hourly = client.get("/media/analytics", params={"ids": [first], "granularity": "hour", "exact": True}, headers=headers)
+    assert list(hourly.json()["media"][0]["views"].values()) == [1]
+
+    assert client.get("/media/analytics", params={"ids": [first], "granularity": "month"}, headers=headers).status_code == 422
+    assert client.get("/media/analytics", params={"ids": [first, 10**9]}, headers=headers).status_code == 404
+
+def test_view_batch():
+    headers = auth_headers()
+    media_id = create_media(headers)
+    backdated = (datetime.utcnow() - timedelta(days=30)).date()
+    lines = [
+        json.dumps({"media_id": media_id, "ip": "198.51.100.1", "timestamp": f"{backdated}T10:00:00Z"}),
+        "",
+        json.dumps({"media_id": media_id, "ip": "198.51.100.2"}),
+        "{not json",
+        json.dumps({"media_id": 999999999, "ip": "198.51.100.1"}),
+        json.dumps({"media_id": media_id}),
+    ] + [json.dumps({"media_id": media_id, "ip": "198.51.100.3"})] * 6
+    r = client.post(
+        "/media/views/batch", content="\n".join(lines), headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert r.status_code == 200
+    body = r.json()
+    statuses = [(result["line"], result["status"]) for result in body["results"]]
+    # Blank line 2 is skipped; the sixth view from 198.51.100.3 trips the default 5/min limit
+    assert statuses == [(1, "accepted"), (3, "accepted"), (4, "invalid"), (5, "unknown_media"), (6, "invalid")] + [
+        (n, "accepted") for n in range(7, 12)
+    ] + [(12, "rate_limited")]
+    assert (body["accepted"], body["rejected"]) == (7, 4)
+
+    analytics = client.get(f"/media/{media_id}/analytics", params={"exact": True}, headers=headers).json()
+    assert analytics["total_views"] == 7
+    assert analytics["unique_ips"] == 3
+    assert analytics["views_per_day"][str(backdated)] == 1
+
+def test_view_batch_rejects_out_of_range_timestamps():
+    headers = auth_headers()
+    media_id = create_media(headers)
+    now = datetime.utcnow()
+    timestamps = [
+        "1000-01-01T00:00:00",
+        "9999-12-31T00:00:00",
+        (now - timedelta(days=400)).isoformat(),
+        (now + timedelta(hours=1)).isoformat(),
+        (now + timedelta(seconds=60)).isoformat(),  # within the clock-skew allowance
+    ]
+    lines = [json.dumps({"media_id": media_id, "ip": "198.51.100.9", "timestamp": ts}) for ts in timestamps]
+    r = client.post(
+        "/media/views/batch", content="\n".join(lines), headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    body = r.json()
+    assert [result["status"] for result in body["results"]] == ["invalid"] * 4 + ["accepted"]
+    assert body["results"][0]["detail"] == "timestamp: older than 365 days"
+    assert body["results"][1]["detail"] == "timestamp: more than 300s in the future"
+    assert client.get(f"/media/{media_id}/analytics", headers=headers).json()["total_views"] == 1
+
+def test_buffered_view_not_committed_is_retryable(monkeypatch):
+    from concurrent.futures import Future
+    from app import ingest
+
+    class FailingBuffer:
+        def submit(self, row, wait=False):
+            pending = Future()
+            pending.set_exception(RuntimeError("disk I/O error"))
+            return pending
+
+    headers = auth_headers()
+    media_id = create_media(headers)
+    monkeypatch.setattr(ingest, "VIEW_INGEST_MODE", "buffered")
+    monkeypatch.setattr(ingest, "VIEW_INGEST_ACK", "flush")
+    monkeypatch.setattr(ingest, "get_view_buffer", lambda: FailingBuffer())
+    r = client.post(f"/media/{media_id}/view", headers=headers)
+    assert r.status_code == 503 and r.headers["Retry-After"] == "1"
@@ -0,0 +1,122 @@
+# tests/test_media_async.py
+from datetime import datetime, timedelta
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+pytest.importorskip("aiosqlite")
+
+from app import auth, database, hll, media_async, models  # noqa: E402
+
+app = FastAPI()
+app.include_router(auth.router, prefix="/auth")
+app.include_router(media_async.router, prefix="/media")
+
+@pytest.fixture(scope="module")
+def client():
+    # One event loop for the whole module so pooled async connections stay on it
+    with TestClient(app) as c:
+        yield c
+        c.portal.call(database.dispose_async_engine)
+
+def test_async_view_analytics_and_rate_limit(client, auth_headers):
+    headers = auth_headers
+    media_id = client.post(
+        "/media/", json={"title": "Sample", "type": "video", "file_url": "http://example.com/file.mp4"}, headers=headers
+    ).json()["id"]
+    assert "stream_url" in client.get(f"/media/{media_id}/stream-url", headers=headers).json()
+
+    assert client.post(f"/media/{media_id}/view", headers=headers).status_code == 200
+    first = client.get(f"/media/{media_id}/analytics", headers=headers).json()
+    assert first["total_views"] == 1
+    assert first["unique_ips"] == 1
+
+    # Written through to the cached entry by the async listener
+    client.post(f"/media/{media_id}/view", headers=headers)
+    assert client.get(f"/media/{media_id}/analytics", headers=headers).json()["total_views"] == 2
+
+    exact = client.get(f"/media/{media_id}/analytics", params={"exact": True}, headers=headers).json()
+    assert exact["unique_ips"] == 1
+
+    for _ in range(3):
+        assert client.post(f"/media/{media_id}/view", headers=headers).status_code == 200
+    assert client.post(f"/media/{media_id}/view", headers=headers).status_code == 429
+
+def test_async_missing_media_and_bad_token(client, auth_headers):
+    headers = auth_headers
+    assert client.get("/media/999999999/analytics", headers=headers).status_code == 404
+    assert client.get("/media/1/stream-url", headers={"Authorization": "Bearer nope"}).status_code == 401
+
+def test_async_hll_against_redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    import asyncio
+    from datetime import datetime
+
+    async def run():
+        client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        now = datetime.utcnow()
+        await hll.add_views_async(client, [
+            {"media_id": 7, "viewed_by_ip": f"10.0.0.{i % 50}", "timestamp": now} for i in range(200)
+        ])
+        await client.set(f"{hll.sketch_key(7)}:hydrated", 1)
+        return await hll.count_async(client, None, 7), await hll.count_async(client, None, 7, [now.date()])
+
+    assert asyncio.run(run()) == (50, 50)
+
+def test_async_batch_analytics(client, auth_headers):
+    headers = auth_headers
+    media_id = client.post(
+        "/media/", json={"title": "Sample", "type": "video", "file_url": "http://example.com/file.mp4"}, headers=headers
+    ).json()["id"]
+    client.post(f"/media/{media_id}/view", headers=headers)
+    body = client.get("/media/analytics", params={"ids": [media_id], "granularity": "week"}, headers=headers).json()
+    assert body["media"][0]["total_views"] == 1
+    assert body["media"][0]["unique_ips"] == 1
+
+def test_async_view_batch(client, auth_headers):
+    headers = auth_headers
+    media_id = client.post(
+        "/media/", json={"title": "Sample", "type": "video", "file_url": "http://example.com/file.mp4"}, headers=headers
+    ).json()["id"]
+    backdated = (datetime.utcnow() - timedelta(days=30)).date()
+    body = "\n".join([
+        f'{{"media_id": {media_id}, "ip": "198.51.100.1"}}',
+        f'{{"media_id": {media_id}, "ip": "198.51.100.2", "timestamp": "{backdated}T10:00:00"}}',
+        '{"media_id": 999999999, "ip": "198.51.100.1"}',
+        f'{{"media_id": {media_id}, "ip": "198.51.100.3", "timestamp": "9999-01-01T00:00:00"}}',
+    ])
+    r = client.post("/media/views/batch", content=body, headers={**headers, "Content-Type": "application/x-ndjson"})
+    assert [result["status"] for result in r.json()["results"]] == ["accepted", "accepted", "unknown_media", "invalid"]
+    assert client.get(f"/media/{media_id}/analytics", headers=headers).json()["total_views"] == 2
+
+def test_redis_failure_after_commit_still_acknowledges_view(client, auth_headers, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    from redis.exceptions import ConnectionError as RedisConnectionError
+    from app import media, redisconn
+
+    headers = auth_headers
+    media_id = client.post(
+        "/media/", json={"title": "Sample", "type": "video", "file_url": "http://example.com/file.mp4"}, headers=headers
+    ).json()["id"]
+
+    conn = redisconn.RedisConnection(client=object())
+    conn.started = conn.available = True
+    fake = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(conn, "async_client", lambda: fake)
+    monkeypatch.setattr(redisconn, "connection", conn)
+    monkeypatch.setattr(media, "_USING_REDIS", True)
+    monkeypatch.setattr(media, "_written_while_degraded", set())
+
+    async def lost(client, rows):
+        raise RedisConnectionError("gone")
+
+    monkeypatch.setattr(hll, "add_views_async", lost)
+    assert client.post(f"/media/{media_id}/view", headers=headers).status_code == 200
+    assert conn.degraded
+    assert media._written_while_degraded == {media_id}
+
+    db = database.SessionLocal()
+    try:
+        assert db.query(models.MediaViewLog).filter_by(media_id=media_id).count() == 1
+    finally:
+        db.close()
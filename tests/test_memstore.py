@@ -0,0 +1,87 @@
+# tests/test_memstore.py
+import threading
+import time
+
+from app.memstore import TTLCache, SlidingWindowLimiter
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, sweep_interval=0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+def test_cache_expiry_and_sweep():
+    cache = TTLCache(max_entries=10, sweep_interval=0)
+    cache.set("short", 1, ttl=0.01)
+    cache.set("forever", 2)
+    time.sleep(0.02)
+    assert cache.sweep() == 1
+    assert len(cache) == 1
+    assert cache.ttl("forever") is None
+    assert cache.ttl("short") == -1
+
+def test_background_sweeper_drops_expired_entries():
+    cache = TTLCache(max_entries=10, sweep_interval=0.01)
+    cache.set("k", 1, ttl=0.01)
+    deadline = time.time() + 2
+    while len(cache) and time.time() < deadline:
+        time.sleep(0.01)
+    cache.stop()
+    assert len(cache) == 0
+
+def test_cache_update_keeps_expiry():
+    cache = TTLCache(sweep_interval=0)
+    cache.set("k", {"n": 1}, ttl=100)
+    assert cache.update("k", lambda v: {"n": v["n"] + 1})
+    assert cache.get("k") == {"n": 2}
+    assert 99 < cache.ttl("k") <= 100
+    assert not cache.update("missing", lambda v: v)
+
+def test_limiter_allows_limit_per_window():
+    limiter = SlidingWindowLimiter(sweep_interval=0)
+    now = 1000.0
+    assert all(limiter.hit("ip", 5, 60, now) for _ in range(5))
+    assert not limiter.hit("ip", 5, 60, now)
+    assert limiter.hit("other", 5, 60, now)
+    assert limiter.stats()["rejected"] == 1
+
+def test_limiter_slides_instead_of_resetting_at_window_edge():
+    limiter = SlidingWindowLimiter(sweep_interval=0)
+    # Burst at the very end of one window...
+    assert all(limiter.hit("ip", 10, 60, 1019.0) for _ in range(10))
+    # ...still counts right after the boundary, unlike a fixed window
+    assert not limiter.hit("ip", 10, 60, 1021.0)
+    # Half a window later, half of the previous window's weight has slid out
+    assert sum(limiter.hit("ip", 10, 60, 1050.0) for _ in range(10)) == 5
+    # Two windows on, the key starts fresh
+    assert all(limiter.hit("ip", 10, 60, 1200.0) for _ in range(10))
+
+def test_limiter_is_bounded_and_sweeps_idle_keys():
+    limiter = SlidingWindowLimiter(stripes=4, max_keys=8, sweep_interval=0)
+    for i in range(100):
+        limiter.hit(f"ip-{i}", 5, 60, 1000.0)
+    assert len(limiter) <= 8
+    assert limiter.stats()["evictions"] >= 92
+    assert limiter.sweep(now=1000.0) == 0
+    limiter.sweep(now=1200.0)
+    assert len(limiter) == 0
+
+def test_limiter_is_thread_safe():
+    limiter = SlidingWindowLimiter(stripes=2, sweep_interval=0)
+    allowed = []
+
+    def worker():
+        allowed.append(sum(limiter.hit("shared", 500, 60, 1000.0) for _ in range(200)))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(allowed) == 500
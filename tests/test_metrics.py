@@ -0,0 +1,80 @@
+# tests/test_metrics.py
+import asyncio
+import re
+
+import pytest
+
+from app import metrics
+
+def sample(text, name, **labels):
+    """Value of the series `name` whose labels include `labels`, or None."""
+    for line in text.splitlines():
+        match = re.match(rf"^{re.escape(name)}(?:\{{(.*)\}})? (\S+)$", line)
+        if match and all(f'{k}="{v}"' in (match.group(1) or "") for k, v in labels.items()):
+            return float(match.group(2))
+    return None
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("test_seconds", "Test.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        h.observe(value, '/a"b')
+    text = "\n".join(h.render())
+    assert 'test_seconds_bucket{route="/a\\"b",le="0.1"} 2' in text
+    assert 'test_seconds_bucket{route="/a\\"b",le="1.0"} 3' in text
+    assert 'test_seconds_bucket{route="/a\\"b",le="+Inf"} 4' in text
+    assert 'test_seconds_count{route="/a\\"b"} 4' in text
+    assert h.sum('/a"b') == pytest.approx(3.65)
+
+def test_timed_phase_counts_nested_calls_once():
+    @metrics.timed_phase("work")
+    def inner():
+        return 1
+
+    @metrics.timed_phase("work")
+    def outer():
+        return inner() + inner()
+
+    @metrics.timed_phase("work")
+    async def in_loop():
+        return outer()
+
+    phases = {}
+    token = metrics._phases.set((phases, set()))
+    try:
+        assert outer() == 2
+        assert asyncio.run(in_loop()) == 2
+    finally:
+        metrics._phases.reset(token)
+    assert set(phases) == {"work"} and phases["work"] > 0
+    # Outside a request nothing is recorded
+    assert outer() == 2
+
+def test_metrics_endpoint(client, auth_headers):
+    headers = auth_headers
+    media_id = client.post(
+        "/media/", json={"title": "Sample", "type": "video", "file_url": "http://example.com/file.mp4"}, headers=headers
+    ).json()["id"]
+
+    route = "/media/{id}/analytics"
+    before = metrics.REQUEST_DURATION.count("GET", route, "200")
+    hits = metrics.CACHE_REQUESTS.value("memory", "hit") + metrics.CACHE_REQUESTS.value("redis", "hit")
+    rejections = metrics.RATE_LIMIT_REJECTIONS.value("media_view", "ip")
+    for _ in range(6):
+        client.post(f"/media/{media_id}/view", headers=headers)
+    client.get(f"/media/{media_id}/analytics", headers=headers)
+    client.get(f"/media/{media_id}/analytics", headers=headers)
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = r.text
+    # Labelled by route template, never by the raw path
+    assert sample(text, "http_request_duration_seconds_count", method="GET", route=route, status="200") == before + 2
+    assert f"/media/{media_id}/analytics" not in text
+    assert sample(text, "http_request_duration_seconds_count", method="POST", route="/media/{id}/view", status="429") >= 1
+    assert sample(text, "rate_limit_rejections_total", route="media_view", scope="ip") == rejections + 1
+    assert sample(text, "db_query_duration_seconds_count", engine="reader", operation="select") > 0
+    assert sample(text, "http_request_phase_seconds_count", route=route, phase="auth") >= 2
+    assert sample(text, "http_request_phase_seconds_count", route="/media/", phase="db") >= 1
+    cache_hits = sum(sample(text, "cache_requests_total", backend=b, result="hit") or 0 for b in ("memory", "redis"))
+    assert cache_hits >= hits + 1
@@ -0,0 +1,46 @@
+# tests/test_migrations.py
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert, inspect
+from sqlalchemy.orm import Session
+
+from app import migrations, models, rollups
+
+def test_upgrade_adds_view_log_indexes_to_existing_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    # Simulate a database created before the indexes existed
+    with engine.begin() as conn:
+        for index in models.MediaViewLog.__table__.indexes:
+            conn.exec_driver_sql(f"DROP INDEX {index.name}")
+
+    assert [m[0] for m in migrations.pending(engine)] == [1, 2]
+    assert migrations.upgrade(engine) == [1, 2]
+
+    names = {ix["name"] for ix in inspect(engine).get_indexes("media_view_logs")}
+    assert {"ix_media_view_logs_media_id_timestamp", "ix_media_view_logs_media_id_viewed_by_ip"} <= names
+    assert migrations.pending(engine) == []
+    assert migrations.upgrade(engine) == []
+
+def test_upgrade_on_fresh_database_is_a_no_op(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert migrations.upgrade(engine) == [1, 2]
+    assert migrations.applied(engine) == {1, 2}
+
+def test_upgrade_backfills_rollups_for_views_logged_before_them(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    # A database from before the rollup tables: only media and raw views
+    models.Base.metadata.create_all(bind=engine, tables=[models.MediaAsset.__table__, models.MediaViewLog.__table__])
+    with engine.begin() as conn:
+        conn.execute(insert(models.MediaAsset), [{"title": "Sample", "type": "video", "file_url": "http://example.com/file.mp4"}])
+        conn.execute(insert(models.MediaViewLog), [
+            {"media_id": 1, "viewed_by_ip": ip, "timestamp": datetime(2025, 8, day)} for day, ip in ((1, "a"), (1, "b"), (2, "a"))
+        ])
+
+    migrations.upgrade(engine)
+    with Session(bind=engine) as db:
+        assert rollups.read_analytics(db, 1) == {
+            "total_views": 3,
+            "unique_ips": 2,
+            "views_per_day": {"2025-08-01": 2, "2025-08-02": 1},
+        }
@@ -0,0 +1,47 @@
+# tests/test_passwords.py
+import asyncio
+import os
+import signal
+import uuid
+
+from app import passwords
+
+def test_hash_and_verify_in_process_pool():
+    pool = passwords.PasswordPool(workers=1, max_pending=4)
+    try:
+        hashed = asyncio.run(pool.hash("pass1234"))
+        assert asyncio.run(pool.verify("pass1234", hashed))
+        assert not asyncio.run(pool.verify("wrong", hashed))
+        stats = pool.stats()
+        assert stats["completed"] == 3 and stats["pending"] == 0
+        assert stats["run_ms_p50"] > 0
+    finally:
+        pool.shutdown()
+
+def test_admission_control_rejects_when_saturated():
+    pool = passwords.PasswordPool(workers=0, max_pending=2)
+
+    async def burst():
+        return await asyncio.gather(*(pool.hash("pass1234") for _ in range(5)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert sum(isinstance(r, passwords.PoolSaturated) for r in results) == 3
+    assert pool.stats()["rejected"] == 3
+
+def test_signup_returns_503_when_pool_is_saturated(client, monkeypatch):
+    monkeypatch.setattr(passwords, "pool", passwords.PasswordPool(workers=0, max_pending=0))
+    email = f"pool_{uuid.uuid4().hex[:6]}@example.com"
+    r = client.post("/auth/signup", json={"email": email, "password": "pass1234"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+def test_pool_recovers_after_a_worker_dies():
+    pool = passwords.PasswordPool(workers=1, max_pending=4)
+    try:
+        hashed = asyncio.run(pool.hash("pass1234"))
+        for pid in list(pool._executor._processes):
+            os.kill(pid, signal.SIGKILL)
+        assert asyncio.run(pool.verify("pass1234", hashed))
+        assert pool.stats()["restarts"] == 1
+    finally:
+        pool.shutdown()
@@ -0,0 +1,85 @@
+# tests/test_ratelimit.py
+import time
+import uuid
+
+import pytest
+
+from app import ratelimit
+
+@pytest.fixture(params=["memory", "redis"])
+def redis_client(request):
+    if request.param == "memory":
+        return None
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+@pytest.fixture()
+def rules(monkeypatch):
+    rules = ratelimit.parse_rules("view:ip=3/60; view:user=5/60; view:user:vip=100/60")
+    monkeypatch.setattr(ratelimit, "RULES", rules)
+    return rules
+
+def test_parse_rules():
+    rules = ratelimit.parse_rules("media_view:ip=5/60;media_view:user:7=1000/3600")
+    assert rules[("media_view", "ip", None)] == ratelimit.RateLimitRule("media_view", "ip", 5, 60)
+    assert rules[("media_view", "user", "7")].limit == 1000
+    with pytest.raises(ValueError):
+        ratelimit.parse_rules("media_view=5/60")
+
+def test_single_key_limit(redis_client):
+    key = f"rl:test:{uuid.uuid4().hex}"
+    results = [ratelimit.check_rules(redis_client, [(key, 5, 60)]) for _ in range(7)]
+    assert results == [None] * 5 + [0, 0]
+
+def test_every_rule_of_a_route_applies(redis_client, rules):
+    user = uuid.uuid4().hex
+    # Per-IP limit (3) trips first for a single IP...
+    outcomes = [ratelimit.check(redis_client, "view", {"ip": "1.1.1.1", "user": user}, resource=1) for _ in range(4)]
+    assert outcomes[:3] == [None] * 3
+    assert outcomes[3] == rules[("view", "ip", None)]
+    # ...rejected requests were not counted against the user, who has 2 of 5 left
+    assert ratelimit.check(redis_client, "view", {"ip": "2.2.2.2", "user": user}, resource=1) is None
+    assert ratelimit.check(redis_client, "view", {"ip": "3.3.3.3", "user": user}, resource=1) is None
+    assert ratelimit.check(redis_client, "view", {"ip": "4.4.4.4", "user": user}, resource=1) == rules[("view", "user", None)]
+
+def test_identity_override(redis_client, rules):
+    resource = uuid.uuid4().hex
+    for i in range(10):
+        assert ratelimit.check(redis_client, "view", {"ip": f"10.0.0.{i}", "user": "vip"}, resource=resource) is None
+
+def test_unknown_route_is_unlimited(redis_client, rules):
+    assert all(ratelimit.check(redis_client, "other", {"ip": "1.1.1.1"}) is None for _ in range(50))
+
+def test_check_many_matches_sequential_checks(redis_client, rules):
+    user, resource = uuid.uuid4().hex, uuid.uuid4().hex
+    requests = [({"ip": "1.1.1.1", "user": user}, resource)] * 4 + [({"ip": "2.2.2.2", "user": user}, resource)] * 3
+    outcomes = ratelimit.check_many(redis_client, "view", requests + [({"ip": uuid.uuid4().hex}, None)])
+    ip, per_user = rules[("view", "ip", None)], rules[("view", "user", None)]
+    assert outcomes == [None, None, None, ip, None, None, per_user, None]
+    assert ratelimit.check_many(redis_client, "view", []) == []
+
+def test_user_rules_span_resources(redis_client, rules):
+    user = uuid.uuid4().hex
+    # A different media each time: the per-IP limit never trips, the per-user one does
+    outcomes = [ratelimit.check(redis_client, "view", {"ip": "5.5.5.5", "user": user}, resource=uuid.uuid4().hex) for _ in range(6)]
+    assert outcomes == [None] * 5 + [rules[("view", "user", None)]]
+
+def test_script_touches_only_declared_keys_and_rolls_windows():
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    key = ratelimit._key(ratelimit.RateLimitRule("view", "ip", 2, 1), "1.1.1.1", resource=7)
+    assert key == "rl:{view}:7:ip:1.1.1.1"
+
+    assert [ratelimit.check_rules(redis_client, [(key, 2, 0.2)]) for _ in range(3)] == [None, None, 0]
+    # Only the hash named in KEYS exists, so the script is safe on Redis Cluster
+    assert redis_client.keys("*") == [key]
+    time.sleep(0.45)
+    # Two windows later both counters are stale
+    assert ratelimit.check_rules(redis_client, [(key, 2, 0.2)]) is None
+
+def test_script_is_registered_per_client():
+    fakeredis = pytest.importorskip("fakeredis")
+    first, second = fakeredis.FakeRedis(), fakeredis.FakeRedis()
+    assert ratelimit._script(first) is ratelimit._script(first)
+    assert ratelimit._script(second) is not ratelimit._script(first)
+    assert ratelimit._script(second).registered_client is second
@@ -0,0 +1,111 @@
+# tests/test_redisconn.py
+import socket
+import time
+
+import pytest
+
+from app import hll, media, redisconn
+
+class FlakyRedis:
+    def __init__(self):
+        self.up = False
+
+    def ping(self):
+        if not self.up:
+            raise ConnectionError("down")
+        return True
+
+def test_start_falls_back_at_once_when_redis_refuses():
+    conn = redisconn.RedisConnection(host="127.0.0.1", port=1)
+    try:
+        started = time.perf_counter()
+        assert conn.start(wait=5) is None
+        assert time.perf_counter() - started < 2
+        assert conn.degraded and "ConnectionError" in conn.last_error
+    finally:
+        conn.stop()
+
+def test_start_is_bounded_when_redis_hangs():
+    # Accepts connections into the backlog and never answers
+    hung = socket.socket()
+    hung.bind(("127.0.0.1", 0))
+    hung.listen(16)
+    conn = redisconn.RedisConnection(host="127.0.0.1", port=hung.getsockname()[1])
+    try:
+        started = time.perf_counter()
+        assert conn.start(wait=0.2) is None
+        assert time.perf_counter() - started < 1
+        assert conn.degraded
+    finally:
+        conn.stop()
+        hung.close()
+
+def test_probe_switches_backends_both_ways():
+    fake = FlakyRedis()
+    conn = redisconn.RedisConnection(client=fake)
+    seen = []
+    conn.on_change(seen.append)
+    try:
+        assert conn.start() is None
+        assert seen == [] and conn.degraded
+
+        fake.up = True
+        assert conn.probe()
+        assert seen == [fake] and not conn.degraded
+
+        conn.mark_down("request failed")
+        assert seen == [fake, None] and conn.last_error == "request failed"
+        assert conn.status()["switches"] == 2
+    finally:
+        conn.stop()
+
+def test_failed_recovery_is_retried_on_next_probe():
+    fake = FlakyRedis()
+    conn = redisconn.RedisConnection(client=fake)
+    calls = []
+
+    def switch(redis_client):
+        calls.append(redis_client)
+        if redis_client is not None and len(calls) == 1:
+            raise ConnectionError("flapped")
+
+    conn.on_change(switch)
+    try:
+        conn.start()
+        fake.up = True
+        assert not conn.probe()
+        assert calls == [fake, None]
+        assert conn.probe()
+        assert calls == [fake, None, fake]
+    finally:
+        conn.stop()
+
+def test_recovery_drops_entries_written_while_degraded(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    r = fakeredis.FakeRedis(decode_responses=True)
+    r.set("media_analytics:5", "{}")
+    r.set(f"{hll.sketch_key(5)}:hydrated", 1)
+    r.set("media_analytics:6", "{}")
+    r.set("media_analytics_batch:day::::abc", "{}")
+    monkeypatch.setattr(media, "redis_client", None)
+    monkeypatch.setattr(media, "_USING_REDIS", False)
+    monkeypatch.setattr(media, "_written_while_degraded", {5})
+
+    media._use_redis(r)
+    assert media._USING_REDIS and media.redis_client is r
+    assert not r.exists("media_analytics:5", f"{hll.sketch_key(5)}:hydrated", "media_analytics_batch:day::::abc")
+    assert r.exists("media_analytics:6")
+    assert media._written_while_degraded == set()
+
+def test_request_hitting_dead_redis_switches_to_memory(client, auth_headers, monkeypatch):
+    redis_py = pytest.importorskip("redis")
+
+    conn = redisconn.RedisConnection(client=FlakyRedis())
+    conn.started = conn.available = True
+    monkeypatch.setattr(redisconn, "connection", conn)
+    monkeypatch.setattr(media, "redis_client", redis_py.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.2))
+    monkeypatch.setattr(media, "_USING_REDIS", True)
+
+    r = client.get("/media/cache/stats", headers=auth_headers)
+    assert r.status_code == 503 and r.headers["Retry-After"] == "1"
+    assert conn.degraded
@@ -0,0 +1,106 @@
+# tests/test_rollups.py
+from datetime import date, datetime, timedelta
+
+import pytest
+from app import models, hll, ingest, rollups, viewlog
+
+def views(media_id, day, ips):
+    ts = datetime(2025, 8, 1) + timedelta(days=day)
+    return [{"media_id": media_id, "viewed_by_ip": ip, "timestamp": ts} for ip in ips]
+
+def test_rollups_track_ingested_views(db):
+    ingest.write_views(db, views(1, 0, ["a", "b", "a"]) + views(2, 0, ["a"]))
+    ingest.write_views(db, views(1, 1, ["b", "c"]))
+
+    assert rollups.read_analytics(db, 1) == {
+        "total_views": 5,
+        "unique_ips": 3,
+        "views_per_day": {"2025-08-01": 3, "2025-08-02": 2},
+    }
+    assert rollups.read_analytics(db, 2)["unique_ips"] == 1
+
+def test_read_analytics_without_views(db):
+    assert rollups.read_analytics(db, 2) == {"total_views": 0, "unique_ips": 0, "views_per_day": {}}
+
+def test_rebuild_matches_incremental(db):
+    ingest.write_views(db, views(1, 0, ["a", "b"]) + views(1, 3, ["a"]) + views(2, 1, ["x", "y"]))
+    expected = {m: rollups.read_analytics(db, m) for m in (1, 2)}
+
+    db.query(models.MediaViewTotal).delete()
+    db.query(models.MediaViewDaily).delete()
+    db.query(models.MediaViewerIP).delete()
+    db.commit()
+    rollups.rebuild(db)
+    assert {m: rollups.read_analytics(db, m) for m in (1, 2)} == expected
+
+    rollups.rebuild(db, media_id=2)
+    assert {m: rollups.read_analytics(db, m) for m in (1, 2)} == expected
+
+def test_read_buckets_groups_by_granularity(db):
+    ts = datetime(2025, 8, 4, 9, 30)  # a Monday
+    ingest.write_views(db, [
+        {"media_id": 1, "viewed_by_ip": "a", "timestamp": ts},
+        {"media_id": 1, "viewed_by_ip": "b", "timestamp": ts + timedelta(minutes=10)},
+        {"media_id": 1, "viewed_by_ip": "a", "timestamp": ts + timedelta(hours=1)},
+        {"media_id": 1, "viewed_by_ip": "c", "timestamp": ts + timedelta(days=6)},
+        {"media_id": 1, "viewed_by_ip": "c", "timestamp": ts + timedelta(days=7)},
+        {"media_id": 2, "viewed_by_ip": "a", "timestamp": ts},
+    ])
+
+    assert rollups.read_buckets(db, [1, 2], granularity="hour", end=date(2025, 8, 4)) == {
+        1: {"2025-08-04T09:00": 2, "2025-08-04T10:00": 1},
+        2: {"2025-08-04T09:00": 1},
+    }
+    assert rollups.read_buckets(db, [1], granularity="day")[1] == {"2025-08-04": 3, "2025-08-10": 1, "2025-08-11": 1}
+    assert rollups.read_buckets(db, [1, 2], granularity="week") == {
+        1: {"2025-08-04": 4, "2025-08-11": 1},
+        2: {"2025-08-04": 1},
+    }
+    assert rollups.read_buckets(db, [1], date(2025, 8, 10), date(2025, 8, 10), "week")[1] == {"2025-08-04": 1}
+    assert rollups.count_unique_ips_many(db, [1, 2], end=date(2025, 8, 4)) == {1: 2, 2: 1}
+    assert rollups.count_unique_ips_many(db, [1, 2]) == {1: 3, 2: 1}
+
+def test_reads_span_more_partitions_than_one_union_allows(db, monkeypatch):
+    monkeypatch.setattr(viewlog, "VIEW_LOG_PARTITIONING", "monthly")
+    ingest.write_views(db, [
+        {"media_id": 1, "viewed_by_ip": f"10.0.0.{month % 3}", "timestamp": datetime(2025, month, 1, 9)} for month in range(1, 8)
+    ])
+    assert len(viewlog.partitions(db)) == 7
+    # Eight tables with media_view_logs: nested as unions of at most three
+    monkeypatch.setattr(viewlog, "_MAX_UNION_TERMS", 3)
+
+    assert rollups.count_unique_ips(db, 1, date(2025, 1, 1), date(2025, 12, 31)) == 3
+    assert len(rollups.read_buckets(db, [1], granularity="hour")[1]) == 7
+    assert hll.count(None, db, 1) == 3
+    hll.reset_local()
+
+@pytest.mark.parametrize("partitioning", ["none", "monthly"])
+def test_compact_keeps_analytics(db, monkeypatch, partitioning):
+    monkeypatch.setattr(viewlog, "VIEW_LOG_PARTITIONING", partitioning)
+    ingest.write_views(db, views(1, -1, ["a", "b", "a"]) + views(1, 0, ["a", "c"]) + views(1, 31, ["d"]) + views(2, 0, ["x"]))
+    if partitioning == "monthly":
+        assert viewlog.partitions(db) == ["media_view_logs_2025_07", "media_view_logs_2025_08", "media_view_logs_2025_09"]
+        assert db.query(models.MediaViewLog).count() == 0
+
+    ranges = [(None, None), (date(2025, 7, 31), date(2025, 8, 1)), (date(2025, 8, 1), date(2025, 9, 1))]
+    expected = {(m, r): rollups.read_analytics(db, m, *r) for m in (1, 2) for r in ranges}
+    assert expected[(1, ranges[1])]["unique_ips"] == 3
+
+    # Everything before Aug 2: July (a whole partition) and Aug 1, a couple of log rows per batch
+    result = rollups.compact(db, date(2025, 8, 2), batch_size=2)
+    assert result == {"views": 6, "dropped": ["media_view_logs_2025_07"] if partitioning == "monthly" else []}
+    assert rollups.compact(db, date(2025, 8, 2)) == {"views": 0, "dropped": []}
+    assert {(m, r): rollups.read_analytics(db, m, *r) for m in (1, 2) for r in ranges} == expected
+    assert rollups.count_unique_ips_many(db, [1, 2], date(2025, 7, 1), date(2025, 8, 31)) == {1: 3, 2: 1}
+
+    # Hour detail is only kept for raw rows
+    assert rollups.read_buckets(db, [1], granularity="hour")[1] == {"2025-09-01T00:00": 1}
+
+    hll.reset_local()
+    assert hll.count(None, db, 1) == 4
+    assert hll.count(None, db, 1, [date(2025, 7, 31)]) == 2
+
+    hll.reset_local()
+
+    rollups.rebuild(db)
+    assert {(m, r): rollups.read_analytics(db, m, *r) for m in (1, 2) for r in ranges} == expected